@@ -24,7 +24,9 @@ from core.forms import EmailAuthenticationForm
 from core.views import (
     schedule_week,
     exchange_create,
+    exchange_queue,
     get_agent_shifts_for_month,
+    get_exchange_candidates,
     signup,
     logout_view,
     tools,
@@ -36,6 +38,9 @@ from core.views import (
     add_shift_hours_ajax,
     delete_shift_ajax,
     create_shift_ajax,
+    batch_edit_shifts_ajax,
+    bulk_shifts_ajax,
+    clone_week_ajax,
 )
 
 
@@ -65,11 +70,16 @@ urlpatterns = [
     path("dashboard/", dashboard, name="dashboard"),
     path("tools/", tools, name="tools"),
     path("exchange/", exchange_create, name="exchange_create"),
+    path("exchange/queue/", exchange_queue, name="exchange_queue"),
     path("ajax/get-agent-shifts/", get_agent_shifts_for_month, name="ajax_get_agent_shifts"),
+    path("ajax/exchange-candidates/", get_exchange_candidates, name="ajax_exchange_candidates"),
     path("ajax/shift/<int:shift_id>/edit/", edit_shift_ajax, name="ajax_edit_shift"),
     path("ajax/shift/<int:shift_id>/add-hours/", add_shift_hours_ajax, name="ajax_add_shift_hours"),
     path("ajax/shift/<int:shift_id>/delete/", delete_shift_ajax, name="ajax_delete_shift"),
     path("ajax/shift/create/", create_shift_ajax, name="ajax_create_shift"),
+    path("ajax/shift/batch-edit/", batch_edit_shifts_ajax, name="ajax_batch_edit_shifts"),
+    path("ajax/shift/bulk/", bulk_shifts_ajax, name="ajax_bulk_shifts"),
+    path("ajax/schedule/clone-week/", clone_week_ajax, name="ajax_clone_week"),
 ]
 
 if settings.DEBUG:
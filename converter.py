@@ -1,11 +1,20 @@
 # -*- coding: utf-8 -*-
 import csv
+import os
 import re
-from datetime import datetime, time, timedelta
-from typing import Tuple, Optional, List
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional
 
 import openpyxl
 from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from core import normalization, schedule_grid
+from core.normalization import GRID_STATUS_ALIASES
+from core.usernames import UsernameAllocator
 # Видалено unidecode, оскільки імена залишаються українською
 # from unidecode import unidecode
 
@@ -20,37 +29,31 @@ INPUT_FILE = "november.xlsx" # Припустимо, новий файл наз
 SHEET_NAME = None
 
 # Формат вихідного файлу: 'xlsx' або 'csv'
-OUTPUT_FORMAT = "xlsx"   # 'xlsx' або 'csv'
+OUTPUT_FORMAT = "xlsx"   # 'xlsx', 'csv' або 'parquet' (потрібен pyarrow)
 
 # Ім'я вихідного файлу (без розширення, ми додамо самі)
 OUTPUT_BASENAME = "import_for_wfm_ukr_names_tl" # Змінено ім'я для ясності
 
+# Пакетний режим: якщо список не порожній, конвертуються ВСІ аркуші всіх файлів
+# паралельно (convert_batch) в один вихідний файл, INPUT_FILE/SHEET_NAME ігноруються
+INPUT_FILES = [] # напр. ["october.xlsx", "november.xlsx", "december.xlsx"]
+
+# Кількість процесів для пакетного режиму (None = кількість ядер)
+WORKERS = None
+
+# Скільки помилок клітинок показувати в підсумку пакетного режиму
+MAX_REPORTED_ERRORS = 50
+
 # Для CSV: щоб Excel в українській локалі не склеював колонки
 CSV_DELIMITER = ";"
 CSV_ENCODING = "utf-8" # utf-8-sig може бути краще для Excel з кирилицею
 
-# Мапа статусів
-STATUS_MAP = {
-    "Відпустка": "vacation",
-    "OFF": "day_off",
-    "вихідний": "day_off",
-    "Лікарняний": "sick",
-    "Mentor": "mentor",
-    "MENTOR": "mentor",
-    "mentor": "mentor",
-    "Ментор": "mentor",
-    "Менторство": "mentor",
-    "ментор": "mentor",
-    "менторство": "mentor",
-    # додай інші за потреби
-}
-
-# Спеціальні текстові мітки для статусу/активності
-SPECIAL_ACTIVITY_MAP = {
-    "ментор": ("mentor", "Ментор"),
-    "менторство": ("mentor", "Ментор"),
-    "mentor": ("mentor", "Ментор"),
-}
+# Мапа статусів на весь день — спільна з імпортом у core/normalization.py
+# (порівняння без урахування регістру: "OFF", "Off", "off" -> day_off)
+STATUS_MAP = GRID_STATUS_ALIASES
+
+# Спеціальні текстові мітки для статусу/активності — див. core/schedule_grid.py
+SPECIAL_ACTIVITY_MAP = schedule_grid.SPECIAL_ACTIVITY_MAP
 
 # Назви колонок - ДОДАНО 'team_lead' і 'activity' для узгодженості з виводом
 HEADERS = [
@@ -69,10 +72,11 @@ HEADERS = [
 # =========================
 # 2) ГЕНЕРАЦІЯ USERNAME (Залишаємо для потенційного використання, але не для колонки 'agent')
 # =========================
-def generate_username(full_name: str) -> str:
+def generate_username(full_name: str, allocator: Optional[UsernameAllocator] = None) -> str:
     """
     Генерує ЛАТИНСЬКИЙ username з повного імені для Django User model.
     Приклад: "Ступак Максим" -> "mstupak"
+    З allocator повертає унікальне ім'я (mstupak_1, ...) серед уже виданих.
     """
     # Використовуємо unidecode тут, ЛОКАЛЬНО для генерації логіну
     from unidecode import unidecode # Імпортуємо тут, щоб не було глобальної залежності
@@ -85,10 +89,12 @@ def generate_username(full_name: str) -> str:
     elif len(parts) == 1:
         username_raw = parts[0]
     else:
-        return f"user_{int(datetime.now().timestamp())}"
+        username_raw = ""
 
     username_clean = re.sub(r"[^a-zA-Z0-9]", "", username_raw).lower()
-    return username_clean
+    if allocator is not None:
+        return allocator.allocate(username_clean)
+    return username_clean or f"user_{int(datetime.now().timestamp())}"
 
 
 # =========================
@@ -96,24 +102,29 @@ def generate_username(full_name: str) -> str:
 # =========================
 class OutputWriter:
     """
-    Єдиний інтерфейс на два вихідних формати.
+    Єдиний інтерфейс на три вихідних формати (xlsx, csv, parquet).
     Викликати .write_row(dict) для запису рядка
     і .close() після завершення.
+
+    Усі формати пишуться потоково: рядки не накопичуються в пам'яті,
+    а ширини колонок для xlsx рахуються одразу в write_row.
     """
 
+    # Скільки рядків тримати в буфері перед записом row group у Parquet
+    PARQUET_BATCH_ROWS = 50_000
+    MAX_COLUMN_WIDTH = 50
+
     def __init__(self, format_: str, basename: str):
         self.format_ = format_.lower().strip()
         self.rows_written = 0
         self.filepath = None
+        self.is_csv = False
+        # Ширина колонок: довжина заголовка, далі оновлюється з кожним рядком
+        self._widths = [len(str(header)) for header in HEADERS]
 
         if self.format_ == "xlsx":
             self.filepath = f"{basename}.xlsx"
-            self.wb: Workbook = Workbook()
-            self.ws = self.wb.active
-            self.ws.title = "export"
-            self.ws.append(HEADERS) # <-- Використовує оновлені HEADERS
-            self.is_csv = False
-
+            self._open_xlsx()
         elif self.format_ == "csv":
             self.filepath = f"{basename}.csv"
             try:
@@ -126,8 +137,55 @@ class OutputWriter:
                 print(f"!!! ПОМИЛКА: Не вдалося відкрити CSV файл '{self.filepath}' для запису. {e}")
                 self.filepath = None
                 raise
+        elif self.format_ == "parquet":
+            self.filepath = f"{basename}.parquet"
+            try:
+                import pyarrow as pa # Необов'язкова залежність — лише для Parquet
+                import pyarrow.parquet as pq
+            except ImportError:
+                print("!!! ПОМИЛКА: Для формату 'parquet' потрібен пакет pyarrow (pip install pyarrow).")
+                self.filepath = None
+                raise
+            self._pa = pa
+            self._schema = pa.schema([(header, pa.string()) for header in HEADERS])
+            self._parquet = pq.ParquetWriter(self.filepath, self._schema)
+            self._buffer = [[] for _ in HEADERS]
+        else:
+            raise ValueError("OUTPUT_FORMAT має бути 'xlsx', 'csv' або 'parquet'.")
+
+    def _open_xlsx(self):
+        try:
+            import xlsxwriter
+        except ImportError:
+            xlsxwriter = None
+
+        if xlsxwriter is not None:
+            # constant_memory: кожен рядок скидається на диск одразу після запису
+            self._xlsx = xlsxwriter.Workbook(self.filepath, {"constant_memory": True})
+            self.ws = self._xlsx.add_worksheet("export")
+            self.ws.write_row(0, 0, HEADERS)
+            self.wb = None
         else:
-            raise ValueError("OUTPUT_FORMAT має бути 'xlsx' або 'csv'.")
+            # Запасний варіант без xlsxwriter: write-only книга openpyxl (теж потокова)
+            self._xlsx = None
+            self.wb = Workbook(write_only=True)
+            self.ws = self.wb.create_sheet("export")
+            # У write-only режимі ширини задаються до першого рядка — беремо типові значення
+            for col_idx, width in enumerate(self._default_widths(), start=1):
+                column_letter = get_column_letter(col_idx)
+                self.ws.column_dimensions[column_letter].width = width
+            self.ws.append(HEADERS)
+
+    def _default_widths(self):
+        datetime_width = len("YYYY-MM-DD HH:MM")
+        widths = []
+        for header, width in zip(HEADERS, self._widths):
+            if header in ("start", "end"):
+                width = max(width, datetime_width)
+            elif header in ("agent", "team_lead"):
+                width = max(width, 30)
+            widths.append(min(width + 3, self.MAX_COLUMN_WIDTH))
+        return widths
 
     @staticmethod
     def _fmt_dt(dt: datetime) -> str:
@@ -151,10 +209,31 @@ class OutputWriter:
         ]
         if self.is_csv:
             self._writer.writerow(values)
+        elif self.format_ == "parquet":
+            for column, value in zip(self._buffer, values):
+                column.append("" if value is None else str(value))
+            if len(self._buffer[0]) >= self.PARQUET_BATCH_ROWS:
+                self._flush_parquet()
         else:
-            self.ws.append(values)
+            widths = self._widths
+            for idx, value in enumerate(values):
+                if value is not None:
+                    length = len(str(value))
+                    if length > widths[idx]:
+                        widths[idx] = length
+            if self._xlsx is not None:
+                self.ws.write_row(self.rows_written + 1, 0, values)
+            else:
+                self.ws.append(values)
         self.rows_written += 1
 
+    def _flush_parquet(self):
+        if not self._buffer[0]:
+            return
+        arrays = [self._pa.array(column, type=self._pa.string()) for column in self._buffer]
+        self._parquet.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._buffer = [[] for _ in HEADERS]
+
     def close(self):
         if self.filepath is None:
             return
@@ -162,26 +241,18 @@ class OutputWriter:
         if self.is_csv:
             if hasattr(self, '_csv_file') and self._csv_file:
                 self._csv_file.close()
+        elif self.format_ == "parquet":
+            self._flush_parquet()
+            self._parquet.close()
         else:
-            for col_idx, header in enumerate(HEADERS, start=1):
-                try:
-                    column_letter = openpyxl.utils.get_column_letter(col_idx)
-                    max_len = len(str(header))
-                    # Обережно використовуємо str() для всіх значень
-                    for cell in self.ws[column_letter]:
-                         if cell.row > 1 and cell.value is not None:
-                             try:
-                                 cell_str = str(cell.value)
-                                 # Обмежуємо довжину, щоб уникнути занадто широких стовпців
-                                 max_len = max(max_len, len(cell_str))
-                             except Exception:
-                                 pass # Ігноруємо помилки перетворення в рядок для довжини
-                    # Обмежуємо максимальну ширину
-                    self.ws.column_dimensions[column_letter].width = min(max_len + 3, 50) # +3 для невеликого запасу
-                except Exception as e:
-                    print(f"Помилка при налаштуванні ширини колонки {col_idx}: {e}")
             try:
-                self.wb.save(self.filepath)
+                if self._xlsx is not None:
+                    # Ширини вже пораховані в write_row — жодного повторного проходу по клітинках
+                    for col_idx, width in enumerate(self._widths):
+                        self.ws.set_column(col_idx, col_idx, min(width + 3, self.MAX_COLUMN_WIDTH)) # +3 для невеликого запасу
+                    self._xlsx.close()
+                else:
+                    self.wb.save(self.filepath)
             except Exception as e:
                  print(f"!!! ПОМИЛКА: Не вдалося зберегти XLSX файл '{self.filepath}'. Перевірте, чи він не відкритий іншою програмою. {e}")
                  self.filepath = None
@@ -190,37 +261,20 @@ class OutputWriter:
 # =========================
 # 4) ОСНОВНА ЛОГІКА
 # =========================
-TIME_RANGE_RE = re.compile(r"^\s*(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2}|24:00)\s*$")
-
-
-def _parse_time_range_on_date(range_str: str, date_obj) -> Tuple[datetime, datetime]:
-    """Парсить один інтервал часу 'HH:MM - HH:MM|24:00' в рамках конкретної дати.
-
-    Повертає (start_dt, end_dt) з урахуванням переходу через північ.
-    """
-    m = TIME_RANGE_RE.match(range_str)
-    if not m:
-        raise ValueError(f"Невірний формат часу '{range_str}'. Очікується 'HH:MM-HH:MM'.")
+# Правила розбору клітинок живуть у core/schedule_grid.py — спільні з командою import_schedule_grid
+TIME_RANGE_RE = schedule_grid.TIME_RANGE_RE
+_parse_time_range_on_date = schedule_grid.parse_time_range_on_date
 
-    start_str, end_str = m.groups()
-    h_start, m_start = map(int, start_str.split(":"))
-    start_dt = datetime.combine(date_obj, time(h_start, m_start))
 
-    if end_str == "24:00":
-        end_dt = datetime.combine(date_obj + timedelta(days=1), time(0, 0))
-    else:
-        h_end, m_end = map(int, end_str.split(":"))
-        end_dt = datetime.combine(date_obj, time(h_end, m_end))
-
-    if end_dt <= start_dt:
-        end_dt += timedelta(days=1)
-    return start_dt, end_dt
 def convert_schedule_xlsx(input_path, output_basename, sheet_name=None, output_format="xlsx"):
     print(f"Відкриваю XLSX файл: {input_path}...")
 
     try:
-        workbook = openpyxl.load_workbook(input_path, data_only=True)
+        # read_only: аркуш читається потоково, без побудови всіх клітинок у пам'яті
+        workbook = openpyxl.load_workbook(input_path, read_only=True, data_only=True)
         sheet = workbook[sheet_name] if sheet_name else workbook.active
+        # Розміри з метаданих файлу бувають хибними — читаємо до фактичного кінця аркуша
+        sheet.reset_dimensions()
         print(f"Читаю аркуш: '{sheet.title}'")
     except FileNotFoundError:
         print(f"!!! ПОМИЛКА: Файл не знайдено за шляхом '{input_path}'")
@@ -232,170 +286,233 @@ def convert_schedule_xlsx(input_path, output_basename, sheet_name=None, output_f
     try:
         writer = OutputWriter(output_format, output_basename)
     except Exception:
+        workbook.close()
         return
 
+    normalization.warnings.drain()
+
     # Залишаємо кеш для username, хоча він не йде прямо в вихідний файл
     generated_usernames_cache = {}
+    usernames = UsernameAllocator()
 
-    header_row = sheet[1]
-    dates = []
-    # Коректно читаємо дати з D1 і далі
-    for col_idx, cell in enumerate(header_row, start=1):
-         if col_idx <= 3:
-            continue
-         date_val = cell.value
-         parsed_date = None
-         if isinstance(date_val, datetime):
-             parsed_date = date_val.date()
-         elif isinstance(date_val, (int, float)) and date_val > 0:
-             try:
-                 if 1 < date_val < 2958466:
-                     excel_epoch = datetime(1899, 12, 30)
-                     delta = timedelta(days=date_val)
-                     parsed_datetime = excel_epoch + delta
-                     parsed_date = parsed_datetime.date()
-                 else:
-                    print(f" [Warning] Значення '{date_val}' в колонці {col_idx} ({cell.coordinate}) схоже на число, але поза межами типових дат Excel. Ігнорується.")
-             except Exception as e:
-                  print(f" [Warning] Не вдалося конвертувати число '{date_val}' з Excel дати в колонці {col_idx} ({cell.coordinate}). {e}")
-         elif date_val:
-             date_str = str(date_val).split(" ")[0]
-             for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%m/%d/%y", "%d.%m.%y"):
-                 try:
-                     parsed_date = datetime.strptime(date_str, fmt).date()
-                     break
-                 except (ValueError, TypeError):
-                     continue
-             if not parsed_date:
-                 print(f" [Warning] Не вдалося розпізнати дату '{date_val}' в колонці {col_idx} ({cell.coordinate}) заголовку.")
-         dates.append(parsed_date)
-
-    valid_dates_count = len([d for d in dates if d])
+    def report_error(error):
+        print(
+            f"!!! ПОМИЛКА в рядку {error.row} (Excel рядок): Не вдалося обробити клітинку "
+            f"{get_column_letter(error.column)}{error.row}: "
+            f"Агент='{error.agent}', ТЛ='{error.team_lead}', Дата='{error.date}', Значення='{error.value}'"
+        )
+        print(f"     Текст помилки: {error.message}")
+
+    grid = schedule_grid.GridReader(sheet.iter_rows(values_only=True), on_error=report_error)
+    for warning in grid.header_warnings:
+        print(f" [Warning] {warning} Ігнорується.")
+
+    valid_dates_count = grid.valid_dates
     if valid_dates_count == 0:
          print("!!! ПОМИЛКА: Не знайдено жодної коректної дати в заголовку (рядок 1, починаючи з колонки D). Перевірте формат дат (напр., DD.MM.YYYY).")
          writer.close()
+         workbook.close()
          return
     else:
         print(f"Знайдено {valid_dates_count} коректних дат в заголовку.")
 
     processed_shifts = 0
 
-    for row_idx, row in enumerate(sheet.iter_rows(min_row=2), start=2):
-        # Читаємо дані з нових колонок
-        team_lead_name_cell = row[0].value # Колонка A - TeamLead
-        direction_cell = row[1].value      # Колонка B - Direction
-        agent_full_name_cell = row[2].value # Колонка C - Agent
+    for shift in grid:
+        # Генеруємо username (для можливого використання в Django), але не використовуємо його в колонці 'agent'
+        if shift.agent not in generated_usernames_cache:
+            generated_usernames_cache[shift.agent] = generate_username(shift.agent, usernames)
+
+        # В `out` передаємо УКРАЇНСЬКЕ ім'я агента та ТЛ
+        writer.write_row({
+            "id": "",
+            "agent": shift.agent,
+            "team_lead": shift.team_lead,
+            "start": shift.start,
+            "end": shift.end,
+            "direction": shift.direction,
+            "status": shift.status,
+            "activity": shift.activity,
+            "comment": "",
+        })
+        processed_shifts += 1
+
+    writer.close()
+    workbook.close()
+
+    for line in normalization.NormalizationWarnings.format(normalization.warnings.drain()):
+        print(line)
+    print("-" * 30)
+    print(f"Готово! Оброблено {processed_shifts} змін.")
+    if writer.filepath:
+        print(f"Результат збережено у файл: {writer.filepath}")
+    else:
+        print("!!! Не вдалося зберегти вихідний файл через помилку.")
 
-        if not agent_full_name_cell:
+
+# =========================
+# 5) ПАКЕТНИЙ РЕЖИМ (кілька файлів / аркушів паралельно)
+# =========================
+class SheetResult(NamedTuple):
+    path: str
+    sheet: str
+    shifts_file: Optional[str]  # тимчасовий CSV зі змінами аркуша (None — змін немає)
+    shift_count: int
+    problems: List[str]  # проблеми рівня аркуша (не відкрився, немає дат, ...)
+    errors: List[schedule_grid.GridError]
+    warnings: Counter
+
+
+def _convert_sheet(job) -> SheetResult:
+    """
+    Робота одного процесу: розбирає один аркуш і потоково пише зміни в тимчасовий CSV.
+
+    Назад у головний процес повертаються лише шлях до файлу й підсумки, а не список
+    змін: інакше pool.map тримав би в пам'яті всі готові аркуші, поки не дійде їхня черга.
+    """
+    input_path, sheet_name, tmp_dir = job
+    normalization.warnings.drain()
+    errors = []
+    problems = []
+    shifts_file = None
+    count = 0
+    try:
+        workbook = openpyxl.load_workbook(input_path, read_only=True, data_only=True)
+    except Exception as e:
+        return SheetResult(input_path, sheet_name, None, 0, [f"не можу відкрити файл: {e}"], [], Counter())
+    try:
+        sheet = workbook[sheet_name]
+        sheet.reset_dimensions()
+        grid = schedule_grid.GridReader(sheet.iter_rows(values_only=True), on_error=errors.append)
+        problems.extend(grid.header_warnings)
+        if grid.valid_dates:
+            with tempfile.NamedTemporaryFile(
+                "w", dir=tmp_dir, suffix=".csv", delete=False, encoding="utf-8", newline=""
+            ) as fh:
+                shifts_file = fh.name
+                writer = csv.writer(fh)
+                for shift in grid:
+                    writer.writerow([
+                        shift.agent, shift.team_lead, shift.direction,
+                        shift.start.isoformat(), shift.end.isoformat(), shift.status, shift.activity,
+                    ])
+                    count += 1
+        else:
+            problems.append("не знайдено жодної коректної дати в заголовку (рядок 1, з колонки D)")
+    finally:
+        workbook.close()
+    return SheetResult(
+        input_path, sheet_name, shifts_file, count, problems, errors, normalization.warnings.drain()
+    )
+
+
+def _read_sheet_shifts(result: SheetResult) -> Iterator[schedule_grid.GridShift]:
+    """Читає зміни аркуша з тимчасового CSV по одній і видаляє файл після читання."""
+    if result.shifts_file is None:
+        return
+    try:
+        with open(result.shifts_file, encoding="utf-8", newline="") as fh:
+            for agent, team_lead, direction, start, end, status, activity in csv.reader(fh):
+                yield schedule_grid.GridShift(
+                    agent, team_lead, direction,
+                    datetime.fromisoformat(start), datetime.fromisoformat(end), status, activity,
+                )
+    finally:
+        os.remove(result.shifts_file)
+
+
+def _list_sheet_jobs(input_paths):
+    jobs = []
+    for input_path in input_paths:
+        try:
+            workbook = openpyxl.load_workbook(input_path, read_only=True)
+        except Exception as e:
+            print(f"!!! ПОМИЛКА: Не можу відкрити файл '{input_path}'. {e}")
             continue
+        jobs.extend((str(input_path), name) for name in workbook.sheetnames)
+        workbook.close()
+    return jobs
 
-        agent_full_name = str(agent_full_name_cell).strip()
-        team_lead_name = str(team_lead_name_cell).strip() if team_lead_name_cell else "" # Зберігаємо ім'я ТЛ
-        agent_direction = str(direction_cell).strip().lower() if direction_cell else "calls"
 
-        # Генеруємо username (для можливого використання в Django), але не використовуємо його в колонці 'agent'
-        if agent_full_name not in generated_usernames_cache:
-            agent_username_generated = generate_username(agent_full_name) # Генеруємо латинський логін
-            generated_usernames_cache[agent_full_name] = agent_username_generated # Зберігаємо його в кеш за повним ім'ям
+def convert_batch(input_paths, output_basename, output_format="xlsx", workers=None,
+                  max_errors=MAX_REPORTED_ERRORS):
+    """
+    Конвертує всі аркуші всіх файлів в один вихідний файл.
 
-        shifts_cells = row[3:]
+    Аркуші розбираються паралельно в пулі процесів, кожен — у свій тимчасовий CSV,
+    а результати дописуються у вихідний файл в порядку (файл, аркуш), тож вихід
+    збігається з послідовною конвертацією, а пам'ять не росте з кількістю аркушів.
+    Помилки клітинок не друкуються по одній, а збираються в один підсумок.
+    """
+    jobs = _list_sheet_jobs(input_paths)
+    if not jobs:
+        print("!!! ПОМИЛКА: Немає аркушів для конвертації.")
+        return
+    workers = workers or os.cpu_count() or 1
+    print(f"Конвертую {len(jobs)} аркушів з {len(input_paths)} файлів у {min(workers, len(jobs))} процесах...")
 
-        for date_obj, shift_cell in zip(dates, shifts_cells):
-            if not date_obj or shift_cell.value is None:
-                continue
+    try:
+        writer = OutputWriter(output_format, output_basename)
+    except Exception:
+        return
 
-            shift_raw = str(shift_cell.value).strip()
-            if not shift_raw:
-                continue
+    generated_usernames_cache = {}
+    usernames = UsernameAllocator()
+    errors = []
+    problems = []
+    warnings = Counter()
+    processed_shifts = 0
 
-            try:
-                # В `out` тепер передаємо УКРАЇНСЬКЕ ім'я агента та ТЛ
-                out = {
+    def run(results):
+        nonlocal processed_shifts
+        for result in results:
+            label = f"{result.path} / {result.sheet}"
+            print(f"  {label}: {result.shift_count} змін, {len(result.errors)} помилок")
+            problems.extend(f"{label}: {problem}" for problem in result.problems)
+            errors.extend((label, error) for error in result.errors)
+            warnings.update(result.warnings)
+            for shift in _read_sheet_shifts(result):
+                if shift.agent not in generated_usernames_cache:
+                    generated_usernames_cache[shift.agent] = generate_username(shift.agent, usernames)
+                writer.write_row({
                     "id": "",
-                    "agent": agent_full_name, # <-- Українське ім'я
-                    "team_lead": team_lead_name, # <-- Нове поле з ім'ям ТЛ
-                    "direction": agent_direction,
-                    "activity": "",
+                    "agent": shift.agent,
+                    "team_lead": shift.team_lead,
+                    "start": shift.start,
+                    "end": shift.end,
+                    "direction": shift.direction,
+                    "status": shift.status,
+                    "activity": shift.activity,
                     "comment": "",
-                    "status": "work"
-                }
-                start_dt = None
-                end_dt = None
-                special_status = None
-                special_activity_text = ""
-
-                # Спочатку перевіримо, чи це кілька часових інтервалів через кому
-                # Наприклад: "12:00 - 13:00, 22:00 - 23:00"
-                segments = [seg.strip() for seg in shift_raw.split(",") if seg.strip()]
-                time_segments = [seg for seg in segments if TIME_RANGE_RE.match(seg)]
-                multiple_pure_time_ranges = len(time_segments) >= 2 and len(time_segments) == len(segments)
-
-                if shift_raw in STATUS_MAP:
-                    out["status"] = STATUS_MAP[shift_raw]
-                    start_dt = datetime.combine(date_obj, time(0, 0))
-                    end_dt = start_dt + timedelta(days=1)
-                elif multiple_pure_time_ranges:
-                    # Кілька часових інтервалів у межах одного дня — створюємо кілька змін
-                    for seg in time_segments:
-                        try:
-                            start_dt, end_dt = _parse_time_range_on_date(seg, date_obj)
-                        except ValueError as e:
-                            raise
-                        row = dict(out)
-                        row["start"] = start_dt
-                        row["end"] = end_dt
-                        writer.write_row(row)
-                        processed_shifts += 1
-                    # Перейти до наступної клітинки
-                    continue
-                elif ',' in shift_raw:
-                    time_part, activity_part = shift_raw.split(',', 1)
-                    time_part = time_part.strip()
-                    activity_part = activity_part.strip()
-                    activity_key = activity_part.lower()
-
-                    if activity_key in SPECIAL_ACTIVITY_MAP:
-                        special_status, special_activity_text = SPECIAL_ACTIVITY_MAP[activity_key]
-                        if special_status:
-                            out["status"] = special_status
-                        out["activity"] = special_activity_text
-                    else:
-                        out["activity"] = activity_part
-
-                    try:
-                        start_dt, end_dt = _parse_time_range_on_date(time_part, date_obj)
-                    except ValueError:
-                        raise ValueError(f"Невірний формат часу '{time_part}' у записі з комою.")
-                else:
-                    # Окремий часовий інтервал без коми
-                    try:
-                        start_dt, end_dt = _parse_time_range_on_date(shift_raw, date_obj)
-                    except ValueError:
-                        raise ValueError(f"Невідомий формат значення '{shift_raw}'. Очікується статус, 'HH:MM-HH:MM' або 'HH:MM-HH:MM, Текст'.")
-
-
-                if start_dt and end_dt:
-                    out["start"] = start_dt
-                    out["end"] = end_dt
-                    writer.write_row(out)
-                    processed_shifts += 1
-                elif out["status"] != "work": # Запис статусів на весь день
-                     # Для статусів на весь день теж треба встановити start/end
-                     out["start"] = datetime.combine(date_obj, time(0, 0))
-                     out["end"] = out["start"] + timedelta(days=1)
-                     writer.write_row(out)
-                     processed_shifts += 1
-
-            except Exception as e:
-                print(
-                    f"!!! ПОМИЛКА в рядку {row_idx} (Excel рядок): Не вдалося обробити клітинку {shift_cell.coordinate}: "
-                    f"Агент='{agent_full_name}', ТЛ='{team_lead_name}', Дата='{date_obj}', Значення='{shift_raw}'"
-                )
-                print(f"     Текст помилки: {e}")
+                })
+                processed_shifts += 1
+
+    # Зміни аркушів чекають своєї черги в тимчасових CSV на диску, а не в пам'яті
+    with tempfile.TemporaryDirectory(prefix="wfm_convert_") as tmp_dir:
+        jobs = [(path, sheet, tmp_dir) for path, sheet in jobs]
+        if workers == 1 or len(jobs) == 1:
+            run(map(_convert_sheet, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                # pool.map повертає результати в порядку jobs
+                run(pool.map(_convert_sheet, jobs))
 
     writer.close()
 
     print("-" * 30)
+    for problem in problems:
+        print(f" [Warning] {problem}")
+    for line in normalization.NormalizationWarnings.format(warnings):
+        print(line)
+    if errors:
+        print(f"!!! Помилки в {len(errors)} клітинках:")
+        for label, error in errors[:max_errors]:
+            print(
+                f"   {label} {get_column_letter(error.column)}{error.row}: "
+                f"Агент='{error.agent}', Дата='{error.date}', Значення='{error.value}' — {error.message}"
+            )
+        if len(errors) > max_errors:
+            print(f"   ... і ще {len(errors) - max_errors}")
     print(f"Готово! Оброблено {processed_shifts} змін.")
     if writer.filepath:
         print(f"Результат збережено у файл: {writer.filepath}")
@@ -404,12 +521,15 @@ def convert_schedule_xlsx(input_path, output_basename, sheet_name=None, output_f
 
 
 # =========================
-# 5) ЗАПУСК
+# 6) ЗАПУСК
 # =========================
 if __name__ == "__main__":
-    convert_schedule_xlsx(
-        INPUT_FILE,
-        OUTPUT_BASENAME,
-        sheet_name=SHEET_NAME,
-        output_format=OUTPUT_FORMAT,
-    )
+    if INPUT_FILES:
+        convert_batch(INPUT_FILES, OUTPUT_BASENAME, output_format=OUTPUT_FORMAT, workers=WORKERS)
+    else:
+        convert_schedule_xlsx(
+            INPUT_FILE,
+            OUTPUT_BASENAME,
+            sheet_name=SHEET_NAME,
+            output_format=OUTPUT_FORMAT,
+        )
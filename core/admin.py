@@ -1,8 +1,20 @@
 # core/admin.py
-from django.contrib import admin
+import csv
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError
+from django.shortcuts import redirect
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
 from import_export.admin import ImportExportModelAdmin
-from .models import Agent, Shift, ShiftExchange, AuditLog
+from . import normalization
+from .forms import ShiftFastImportConfirmForm, ShiftFastImportForm
+from .models import Agent, Shift, ShiftExchange, AuditLog, ImportCheckpoint
 from .resources import ShiftResource, UsersFromScheduleResource  # додано імпорт ресурсу користувачів
+from .shift_import import ImportStats, apply_plan, build_agent_map, format_plan, plan_for_mode, rows_from_dataset
 
 
 @admin.register(Agent)
@@ -29,6 +41,13 @@ class AgentAdmin(ImportExportModelAdmin):
     agent_id_display.short_description = "Agent ID"
 
 
+class _Echo:
+    """Псевдобуфер для csv.writer: writerow повертає рядок замість запису у файл."""
+
+    def write(self, value):
+        return value
+
+
 @admin.register(Shift)
 class ShiftAdmin(ImportExportModelAdmin):
     resource_class = ShiftResource  # <--- 2. ДОДАЙТЕ ЦЕЙ РЯДОК
@@ -43,6 +62,159 @@ class ShiftAdmin(ImportExportModelAdmin):
     )
     date_hierarchy = "start"
 
+    # Кнопка "Швидкий імпорт" поруч зі стандартними Import/Export
+    import_export_change_list_template = "admin/core/shift/change_list.html"
+    fast_import_template_name = "admin/core/shift/fast_import.html"
+    fast_import_preview_limit = 50
+
+    def get_urls(self):
+        info = self.get_model_info()
+        urls = [
+            path(
+                "fast-import/",
+                self.admin_site.admin_view(self.fast_import_view),
+                name="%s_%s_fast_import" % info,
+            ),
+            path(
+                "export-csv/",
+                self.admin_site.admin_view(self.export_csv_view),
+                name="%s_%s_export_csv" % info,
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def get_export_queryset(self, request):
+        return ShiftResource.export_queryset(super().get_export_queryset(request))
+
+    def export_csv_view(self, request):
+        """
+        Потоковий CSV-експорт змін з урахуванням фільтрів списку.
+
+        Рядки формуються по одному з queryset.iterator, тож пам'ять не росте
+        з кількістю змін (на відміну від tablib.Dataset у стандартному експорті).
+        """
+        if not self.has_export_permission(request):
+            raise PermissionDenied
+
+        resource = ShiftResource()
+        queryset = resource.filter_export(self.get_export_queryset(request))
+        resource.before_export(queryset)
+        writer = csv.writer(_Echo())
+
+        def rows():
+            yield writer.writerow(resource.get_export_headers())
+            for shift in resource.iter_queryset(queryset):
+                yield writer.writerow(resource.export_resource(shift))
+
+        response = StreamingHttpResponse(rows(), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="shifts_{timezone.localdate():%Y%m%d}.csv"'
+        return response
+
+    def _fast_import_storage(self, input_format, name):
+        encoding = None if input_format.is_binary() else self.from_encoding
+        return self.get_tmp_storage_class()(
+            name=name,
+            encoding=encoding,
+            read_mode=input_format.get_read_mode(),
+            **self.get_tmp_storage_class_kwargs(),
+        )
+
+    @staticmethod
+    def _remove_tmp_storage(tmp_storage):
+        try:
+            tmp_storage.remove()
+        except OSError:
+            pass
+
+    def _fast_import_rows(self, input_format, tmp_storage, stats):
+        """Файл -> ShiftRow колонками (без per-row машинерії Resource)."""
+        dataset = input_format.create_dataset(tmp_storage.read())
+        normalization.warnings.drain()
+        rows = rows_from_dataset(dataset, build_agent_map(), timezone.get_current_timezone(), stats)
+        stats.warnings.update(normalization.warnings.drain())
+        return rows
+
+    def fast_import_view(self, request):
+        """
+        Швидкий імпорт змін: завантаження -> попередній перегляд різниці -> підтвердження.
+
+        Зміни зіставляються за (агент, початок), запис — кількома bulk-запитами
+        в одній транзакції (core.shift_import), тож великі файли не впираються в таймаут.
+        """
+        if not self.has_import_permission(request):
+            raise PermissionDenied
+
+        import_formats = self.get_import_formats()
+        tz = timezone.get_current_timezone()
+        context = self.admin_site.each_context(request)
+        context.update({"title": "Швидкий імпорт змін", "opts": self.model._meta})
+
+        if request.method == "POST" and "confirm" in request.POST:
+            confirm_form = ShiftFastImportConfirmForm(import_formats, request.POST)
+            fast_import_url = reverse("admin:%s_%s_fast_import" % self.get_model_info())
+            if not confirm_form.is_valid():
+                self.message_user(request, "Файл для підтвердження не знайдено, завантажте його ще раз.", messages.ERROR)
+                return redirect(fast_import_url)
+            data = confirm_form.cleaned_data
+            input_format = import_formats[data["format"]]()
+            if not input_format.is_binary():
+                input_format.encoding = self.from_encoding
+            tmp_storage = self._fast_import_storage(input_format, data["import_file_name"])
+            try:
+                rows = self._fast_import_rows(input_format, tmp_storage, ImportStats())
+                plan = plan_for_mode(rows, tz, data["mode"])
+                apply_plan(plan)
+            except OSError:
+                self.message_user(request, "Файл для підтвердження не знайдено, завантажте його ще раз.", messages.ERROR)
+                return redirect(fast_import_url)
+            except IntegrityError as exc:
+                self.message_user(request, f"Імпорт не виконано: конфлікт із наявними змінами ({exc}).", messages.ERROR)
+                return redirect(fast_import_url)
+            finally:
+                self._remove_tmp_storage(tmp_storage)
+            self.message_user(
+                request,
+                f"Імпорт з файлу {data['original_file_name']} завершено: "
+                f"додано {len(plan.inserts)}, оновлено {len(plan.updates)}, "
+                f"видалено {len(plan.deletes)}, без змін {plan.unchanged}.",
+                messages.SUCCESS,
+            )
+            return redirect(reverse("admin:%s_%s_changelist" % self.get_model_info()))
+
+        form = ShiftFastImportForm(import_formats, request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            input_format = import_formats[int(form.cleaned_data["format"])]()
+            if not input_format.is_binary():
+                input_format.encoding = self.from_encoding
+            import_file = form.cleaned_data["import_file"]
+            tmp_storage = self.write_to_tmp_storage(import_file, input_format)
+            stats = ImportStats(keep_rejects=True)
+            try:
+                rows = self._fast_import_rows(input_format, tmp_storage, stats)
+            except Exception as exc:
+                # До підтвердження не дійде — тимчасовий файл більше не потрібен
+                self._remove_tmp_storage(tmp_storage)
+                form.add_error("import_file", f"Не вдалося прочитати файл: {exc}")
+            else:
+                plan = plan_for_mode(rows, tz, form.cleaned_data["mode"])
+                limit = self.fast_import_preview_limit
+                context.update({
+                    "confirm_form": ShiftFastImportConfirmForm(import_formats, initial={
+                        "import_file_name": tmp_storage.name,
+                        "original_file_name": import_file.name,
+                        "format": form.cleaned_data["format"],
+                        "mode": form.cleaned_data["mode"],
+                    }),
+                    "plan": plan,
+                    "stats": stats,
+                    "preview_lines": format_plan(plan, tz, limit=limit),
+                    "rejects": stats.rejects[:limit],
+                    "warnings": normalization.NormalizationWarnings.format(stats.warnings),
+                })
+
+        context["form"] = form
+        return TemplateResponse(request, [self.fast_import_template_name], context)
+
 
 @admin.register(ShiftExchange)
 class ShiftExchangeAdmin(admin.ModelAdmin):
@@ -106,3 +278,29 @@ class AuditLogAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("file_name", "kind", "status", "rows_done", "batches_done", "byte_offset", "file_size", "updated_at")
+    list_filter = ("kind", "status")
+    search_fields = ("file_name", "file_hash")
+    readonly_fields = (
+        "kind",
+        "file_hash",
+        "file_name",
+        "file_size",
+        "byte_offset",
+        "rows_done",
+        "batches_done",
+        "status",
+        "error",
+        "started_at",
+        "updated_at",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
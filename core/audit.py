@@ -47,8 +47,7 @@ def _object_identity(instance):
     return meta.app_label, meta.model_name, str(getattr(instance, instance._meta.pk.attname, ""))
 
 
-def _log(action: str, instance, changes: dict | None):
-    app_label, model_name, pk = _object_identity(instance)
+def _request_context():
     req = get_current_request()
     user = get_current_user()
     ip = ""
@@ -56,24 +55,59 @@ def _log(action: str, instance, changes: dict | None):
     if req is not None:
         ip = req.META.get("REMOTE_ADDR", "") or req.META.get("HTTP_X_FORWARDED_FOR", "")
         ua = req.META.get("HTTP_USER_AGENT", "")
+    return {
+        "user": user if getattr(user, "is_authenticated", False) else None,
+        "ip_address": ip,
+        "user_agent": ua,
+    }
+
+
+def _entry(action: str, instance, changes: dict | None, context: dict) -> AuditLog:
+    app_label, model_name, pk = _object_identity(instance)
     try:
         obj_repr = str(instance)
     except Exception:
         obj_repr = f"{model_name}#{pk}"
-
-    AuditLog.objects.create(
-        user=user if getattr(user, "is_authenticated", False) else None,
+    return AuditLog(
         app_label=app_label,
         model=model_name,
         object_pk=pk,
         object_repr=obj_repr[:255],
         action=action,
         changes=changes or None,
-        ip_address=ip,
-        user_agent=ua,
+        **context,
     )
 
 
+def _log(action: str, instance, changes: dict | None):
+    _entry(action, instance, changes, _request_context()).save()
+
+
+def field_values(instance) -> dict:
+    """Знімок полів для аудиту — зробити до зміни об'єкта, щоб потім порахувати diff."""
+    return _field_value_map(instance)
+
+
+def diff_values(before: dict, instance) -> dict:
+    after = _field_value_map(instance)
+    return {k: {"old": before.get(k), "new": v} for k, v in after.items() if before.get(k) != v}
+
+
+def creation_changes(instance) -> dict:
+    return {k: {"old": None, "new": v} for k, v in _field_value_map(instance).items()}
+
+
+def log_bulk(action: str, entries) -> None:
+    """
+    Аудит для масових операцій (bulk_update/bulk_create не шлють сигналів):
+    entries — пари (instance, changes), записуються одним INSERT.
+    """
+    context = _request_context()
+    logs = [_entry(action, instance, changes, context) for instance, changes in entries if changes]
+    if logs:
+        AuditLog.objects.bulk_create(logs)
+
+
 @receiver(pre_save)
 def _capture_before(sender, instance, **kwargs):
     if not isinstance(instance, TRACKED_MODELS):
@@ -92,13 +126,9 @@ def _log_create_update(sender, instance, created, **kwargs):
     if not isinstance(instance, TRACKED_MODELS):
         return
     if created:
-        after = _field_value_map(instance)
-        changes = {k: {"old": None, "new": v} for k, v in after.items()}
-        _log(AuditAction.CREATE, instance, changes)
+        _log(AuditAction.CREATE, instance, creation_changes(instance))
     else:
         before = getattr(instance, "__audit_before", None)
-        after = _field_value_map(instance)
-        diff = {}
         if before is None:
             # Fallback: compare with DB now
             try:
@@ -106,10 +136,7 @@ def _log_create_update(sender, instance, created, **kwargs):
                 before = _field_value_map(persisted)
             except Exception:
                 before = {}
-        for k, newv in after.items():
-            oldv = before.get(k)
-            if oldv != newv:
-                diff[k] = {"old": oldv, "new": newv}
+        diff = diff_values(before, instance)
         if diff:
             _log(AuditAction.UPDATE, instance, diff)
 
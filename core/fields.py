@@ -0,0 +1,70 @@
+# core/fields.py
+from django.core import checks, exceptions
+from django.db import models
+
+
+class CodedChoiceField(models.Field):
+    """
+    Поле з рядковими choices у Python, але компактним smallint у БД.
+
+    codes — відображення значення -> код. Моделі, форми, фільтри й шаблони
+    працюють зі звичними рядками ("work", "calls"), а в таблиці та індексах
+    лежать 2-байтові коди. Коди стабільні: нові значення лише отримують нові
+    номери, наявні не змінюються і не перевикористовуються.
+    """
+
+    description = "Значення з choices, закодоване як smallint"
+    empty_strings_allowed = False
+
+    def __init__(self, *args, codes=None, **kwargs):
+        self.codes = dict(codes or {})
+        self.values_by_code = {code: value for value, code in self.codes.items()}
+        super().__init__(*args, **kwargs)
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        missing = [value for value, _label in self.flatchoices if value not in self.codes]
+        if missing:
+            errors.append(checks.Error(
+                f"Для значень {missing} немає коду в codes.",
+                obj=self,
+                id="core.E001",
+            ))
+        if len(self.values_by_code) != len(self.codes):
+            errors.append(checks.Error("Коди в codes мають бути унікальними.", obj=self, id="core.E002"))
+        return errors
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["codes"] = self.codes
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        return connection.data_types["SmallIntegerField"]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.values_by_code[value]
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        try:
+            return self.values_by_code[value]
+        except (KeyError, TypeError):
+            raise exceptions.ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice", params={"value": value}
+            )
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.codes[value]
+        except KeyError:
+            raise ValueError(f"Поле '{self.name}' не має коду для значення {value!r}.")
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
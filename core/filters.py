@@ -5,7 +5,7 @@ from django.utils import timezone  # якщо реально використа
 from django.contrib.auth.models import User  # ← додано
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column
-from .models import Shift, Direction, ShiftStatus, Agent
+from .models import Shift, Direction, ShiftStatus, Agent, Skill
 
 
 class ShiftFilter(django_filters.FilterSet):
@@ -36,6 +36,12 @@ class ShiftFilter(django_filters.FilterSet):
         label="Статус",
     )
 
+    skill = django_filters.ChoiceFilter(
+        choices=Skill.choices,
+        label="Скіл агента",
+        method="filter_skill",
+    )
+
     start__gte = django_filters.DateTimeFilter(
         field_name="start",
         lookup_expr="gte",
@@ -70,6 +76,11 @@ class ShiftFilter(django_filters.FilterSet):
         model = Shift
         fields = ["team_lead", "agent", "direction", "status"]
 
+    def filter_skill(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(agent__in=Agent.objects.with_any_skills([value]))
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # нормальний queryset для TL: тільки ті юзери, які реально є тімлідами у Agent
@@ -99,6 +110,7 @@ class ShiftFilter(django_filters.FilterSet):
             Row(
                 Column("start__gte", css_class="col-md-3 col-sm-6"),
                 Column("end__lte", css_class="col-md-3 col-sm-6"),
+                Column("skill", css_class="col-md-3 col-sm-6"),
             ),
         )
         self.form.helper = helper
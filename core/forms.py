@@ -1,4 +1,5 @@
 # core/forms.py
+import os
 from datetime import datetime, timedelta
 
 from pathlib import Path
@@ -593,3 +594,51 @@ class SickLeaveProofUploadForm(forms.ModelForm):
         raise ValidationError(_("Додайте файл підтвердження."))
 
 
+
+
+SHIFT_IMPORT_MODE_CHOICES = (
+    ("upsert", "Додати нові та оновити змінені зміни"),
+    ("append", "Лише додати нові зміни"),
+    ("sync", "Синхронізувати: видалити зміни агентів з файлу, яких у файлі немає"),
+)
+
+
+class ShiftFastImportForm(forms.Form):
+    """Завантаження файлу для швидкого імпорту змін в адмінці."""
+
+    import_file = forms.FileField(label="Файл")
+    format = forms.ChoiceField(label="Формат")
+    mode = forms.ChoiceField(label="Режим", choices=SHIFT_IMPORT_MODE_CHOICES, initial="upsert")
+
+    def __init__(self, import_formats, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["format"].choices = [
+            (str(idx), fmt().get_title()) for idx, fmt in enumerate(import_formats)
+        ]
+
+
+class ShiftFastImportConfirmForm(forms.Form):
+    """Приховані поля кроку підтвердження: файл уже збережено в тимчасовому сховищі."""
+
+    import_file_name = forms.CharField(widget=forms.HiddenInput())
+    original_file_name = forms.CharField(widget=forms.HiddenInput())
+    format = forms.CharField(widget=forms.HiddenInput())
+    mode = forms.ChoiceField(choices=SHIFT_IMPORT_MODE_CHOICES, widget=forms.HiddenInput())
+
+    def __init__(self, import_formats, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.import_formats = import_formats
+
+    def clean_import_file_name(self):
+        # Лише ім'я файлу в тимчасовому сховищі, як у ConfirmImportForm з import-export:
+        # шлях із прихованого поля не повинен вказувати на довільний файл на сервері
+        name = os.path.basename(self.cleaned_data["import_file_name"])
+        if not name or name in (".", ".."):
+            raise ValidationError("Некоректне ім'я файлу.")
+        return name
+
+    def clean_format(self):
+        raw = self.cleaned_data["format"]
+        if not raw.isdigit() or int(raw) >= len(self.import_formats):
+            raise ValidationError("Невідомий формат файлу.")
+        return int(raw)
@@ -0,0 +1,148 @@
+# core/import_progress.py
+"""
+Контрольні точки та прогрес для довгих імпортів з CSV.
+
+Файл читається пачками рядків у бінарному режимі, тож після кожної пачки
+відомий точний байтовий зсув. Команда записує пачку і ImportCheckpoint
+в одній транзакції: після збою --resume продовжує з першого незакоміченого
+рядка, не дублюючи і не пропускаючи дані.
+
+Як і паралельний імпорт (chunk_ranges), розбиття по рядках припускає,
+що значення в CSV не містять переносів рядка.
+"""
+import hashlib
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ImportCheckpoint
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_line_batches(path: Path, start_offset: int, batch_lines: int) -> Iterator[Tuple[List[bytes], int]]:
+    """(сирі рядки пачки, байтовий зсув одразу після пачки) від start_offset до кінця файлу."""
+    with path.open("rb") as fh:
+        fh.seek(start_offset)
+        batch: List[bytes] = []
+        for line in fh:
+            if line.strip():
+                batch.append(line)
+            if len(batch) >= batch_lines:
+                yield batch, fh.tell()
+                batch = []
+        if batch:
+            yield batch, fh.tell()
+
+
+class Checkpointer:
+    """Обгортка над ImportCheckpoint для одного запуску команди."""
+
+    def __init__(self, checkpoint: ImportCheckpoint):
+        self.checkpoint = checkpoint
+
+    @classmethod
+    def open(cls, kind: str, path: Path, data_start: int, resume: bool) -> "Checkpointer":
+        """
+        Знаходить або створює контрольну точку для файлу.
+
+        Без resume імпорт починається з початку даних (data_start), навіть якщо
+        для файлу вже є незавершена точка.
+        """
+        file_hash = file_sha256(path)
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            kind=kind,
+            file_hash=file_hash,
+            defaults={"file_name": path.name, "file_size": path.stat().st_size, "byte_offset": data_start},
+        )
+        if not created and not resume:
+            checkpoint.byte_offset = data_start
+            checkpoint.rows_done = 0
+            checkpoint.batches_done = 0
+            checkpoint.status = ImportCheckpoint.Status.RUNNING
+            checkpoint.error = ""
+            checkpoint.started_at = timezone.now()
+        checkpoint.file_name = path.name
+        checkpoint.save()
+        return cls(checkpoint)
+
+    @property
+    def is_done(self) -> bool:
+        return self.checkpoint.status == ImportCheckpoint.Status.DONE
+
+    def advance(self, rows: int, byte_offset: int) -> None:
+        """Викликати всередині транзакції пачки — зсув комітиться разом з даними."""
+        checkpoint = self.checkpoint
+        checkpoint.byte_offset = byte_offset
+        checkpoint.rows_done += rows
+        checkpoint.batches_done += 1
+        checkpoint.status = ImportCheckpoint.Status.RUNNING
+        checkpoint.save(update_fields=["byte_offset", "rows_done", "batches_done", "status", "updated_at"])
+
+    def finish(self) -> None:
+        self.checkpoint.status = ImportCheckpoint.Status.DONE
+        self.checkpoint.save(update_fields=["status", "updated_at"])
+
+    def fail(self, exc: BaseException) -> None:
+        # Окремо від транзакції пачки, яка вже відкотилась
+        with transaction.atomic():
+            ImportCheckpoint.objects.filter(pk=self.checkpoint.pk).update(
+                status=ImportCheckpoint.Status.FAILED, error=str(exc)[:2000], updated_at=timezone.now()
+            )
+
+
+class ProgressReporter:
+    """Пропускна здатність (рядків/с), кількість пачок і ETA за часткою прочитаних байтів."""
+
+    def __init__(self, write: Callable[[str], None], total_bytes: int, start_offset: int = 0,
+                 start_rows: int = 0, every: float = 5.0, label: str = "import"):
+        self.write = write
+        self.total_bytes = max(total_bytes, 1)
+        self.start_offset = start_offset
+        self.offset = start_offset
+        self.rows = start_rows
+        self.batches = 0
+        self.every = every
+        self.label = label
+        self._started = time.monotonic()
+        self._last_report = self._started
+        self._session_rows = 0
+
+    def update(self, rows: int, byte_offset: int) -> None:
+        self.rows += rows
+        self._session_rows += rows
+        self.batches += 1
+        self.offset = byte_offset
+        now = time.monotonic()
+        if now - self._last_report >= self.every:
+            self._last_report = now
+            self.write(self.line())
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self._started
+        return self._session_rows / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        elapsed = time.monotonic() - self._started
+        done = self.offset - self.start_offset
+        if done <= 0 or elapsed <= 0:
+            return None
+        return (self.total_bytes - self.offset) * elapsed / done
+
+    def line(self) -> str:
+        percent = 100.0 * self.offset / self.total_bytes
+        eta = self.eta()
+        eta_text = f"{eta:.0f}s" if eta is not None else "?"
+        return (
+            f"[{self.label}] rows={self.rows} batches={self.batches} "
+            f"{percent:.1f}% rate={self.rate():.0f} rows/s eta={eta_text}"
+        )
@@ -0,0 +1,124 @@
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import NON_WORKING_STATUSES, Direction, Shift, ShiftStatus
+
+# Indexes added for the query mix below (see migration 0014); the PostgreSQL-only ones may be absent
+TUNED_INDEXES = ("shift_week_cover_idx", "shift_working_end_idx", "shift_start_brin", "shift_period_gist")
+WEEK_COLUMNS = ("id", "agent_id", "start", "end", "status", "direction")
+
+
+def benchmark_cases(moment, agent_id):
+    """(name, query as written before the tuned indexes, query as written now) for each hot path."""
+    local = timezone.localtime(moment)
+    week_start = (local - timedelta(days=local.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    week = Shift.objects.filter(start__gte=week_start, start__lt=week_start + timedelta(days=7))
+    window_start, window_end = moment, moment + timedelta(hours=4)
+    history = Shift.objects.filter(
+        start__gte=moment - timedelta(days=365), start__lt=moment - timedelta(days=180)
+    ).values("agent_id", "start", "end")
+
+    legacy_now = Shift.objects.filter(start__lte=moment, end__gt=moment).exclude(status__in=NON_WORKING_STATUSES)
+    legacy_window = Shift.objects.filter(start__lt=window_end, end__gt=window_start).exclude(
+        status__in=NON_WORKING_STATUSES
+    )
+    agent_overlap = Shift.objects.filter(agent_id=agent_id, start__lt=window_end, end__gt=window_start)
+    return [
+        # schedule_week and its ShiftFilter status/direction filters
+        ("week", week.values(*WEEK_COLUMNS), week.values(*WEEK_COLUMNS)),
+        ("week_status", week.filter(status=ShiftStatus.WORK).values(*WEEK_COLUMNS),
+         week.filter(status=ShiftStatus.WORK).values(*WEEK_COLUMNS)),
+        ("week_direction", week.filter(direction=Direction.CALLS).values(*WEEK_COLUMNS),
+         week.filter(direction=Direction.CALLS).values(*WEEK_COLUMNS)),
+        # dashboard: who is working now / in a window
+        ("now", legacy_now, Shift.objects.working().active_at(moment)),
+        ("window", legacy_window, Shift.objects.working().overlapping(window_start, window_end)),
+        # AJAX edit/create overlap check for one agent
+        ("agent_overlap", agent_overlap, agent_overlap),
+        # wide history range (reports)
+        ("history", history, history),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot Shift queries (schedule week, dashboard, overlap checks, history) and print their plans. "
+        "With --compare the legacy queries are first run with the tuned indexes dropped inside a rolled-back "
+        "transaction; that holds an exclusive lock on the shift table, so run it against a copy of production"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the median is reported (default: 5)")
+        parser.add_argument(
+            "--at",
+            default=None,
+            help="Moment to benchmark around, 'YYYY-MM-DD HH:MM' in the current timezone (default: now)",
+        )
+        parser.add_argument("--compare", action="store_true", help="Also run the 'before' variant without tuned indexes")
+        parser.add_argument("--analyze", action="store_true", help="PostgreSQL: EXPLAIN (ANALYZE, BUFFERS)")
+        parser.add_argument("--no-plans", action="store_true", help="Print timings only")
+
+    def handle(self, *args, **opts):
+        repeat = max(int(opts["repeat"]), 1)
+        if opts["at"]:
+            try:
+                moment = timezone.make_aware(datetime.strptime(opts["at"], "%Y-%m-%d %H:%M"))
+            except ValueError:
+                raise CommandError("--at must look like 'YYYY-MM-DD HH:MM'")
+        else:
+            moment = timezone.now()
+
+        agent_id = Shift.objects.order_by().values_list("agent_id", flat=True).first()
+        if agent_id is None:
+            raise CommandError("No shifts to benchmark.")
+
+        self.explain_options = {}
+        if opts["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze requires PostgreSQL.")
+            self.explain_options = {"analyze": True, "buffers": True}
+        self.show_plans = not opts["no_plans"]
+
+        cases = benchmark_cases(moment, agent_id)
+        before = {}
+        if opts["compare"]:
+            with transaction.atomic():
+                self._drop_tuned_indexes()
+                before = self._run("before", [(name, legacy) for name, legacy, _tuned in cases], repeat)
+                transaction.set_rollback(True)
+        after = self._run("after", [(name, tuned) for name, _legacy, tuned in cases], repeat)
+
+        self.stdout.write(f"{'query':<16}{'rows':>8}{'before ms':>12}{'after ms':>12}")
+        for name, (rows, elapsed) in after.items():
+            previous = f"{before[name][1]:.2f}" if name in before else "-"
+            self.stdout.write(f"{name:<16}{rows:>8}{previous:>12}{elapsed:>12.2f}")
+
+    def _drop_tuned_indexes(self):
+        qn = connection.ops.quote_name
+        table = qn(Shift._meta.db_table)
+        with connection.cursor() as cur:
+            for name in TUNED_INDEXES:
+                cur.execute(f"DROP INDEX IF EXISTS {qn(name)}")
+            # Plain index on start existed before shift_week_cover_idx replaced it
+            cur.execute(f"CREATE INDEX {qn('shift_benchmark_start')} ON {table} ({qn('start')})")
+
+    def _run(self, label, cases, repeat):
+        results = {}
+        for name, queryset in cases:
+            timings = []
+            rows = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (rows, statistics.median(timings))
+            if self.show_plans:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"[{label}] {name}"))
+                for line in queryset.explain(**self.explain_options).splitlines():
+                    self.stdout.write(f"    {line}")
+        return results
@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.filters import ShiftFilter
+from core.models import Shift
+from core.shift_mutations import MAX_CLONE_WEEKS, ShiftBatchError, clone_week, week_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy one week's shifts to the following weeks. Local (wall-clock) times are kept across DST changes; "
+        "copies that would overlap an agent's existing working shift are skipped (or abort with --fail-on-conflict)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Any date (YYYY-MM-DD) inside the week to copy")
+        parser.add_argument("--weeks", type=int, default=1, help=f"Number of target weeks, 1..{MAX_CLONE_WEEKS} (default: 1)")
+        parser.add_argument(
+            "--first-week",
+            default=None,
+            help="Any date inside the first target week (default: the week after the source)",
+        )
+        parser.add_argument("--team-lead", default=None, help="Only agents of this team lead (user id)")
+        parser.add_argument("--agent", default=None, help="Only this agent (agent id)")
+        parser.add_argument("--direction", default=None, help="Only shifts with this direction")
+        parser.add_argument("--status", default=None, help="Only shifts with this status")
+        parser.add_argument("--fail-on-conflict", action="store_true", help="Write nothing if any copy conflicts")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be copied without writing")
+
+    def handle(self, *args, **opts):
+        source = self._parse_date(opts["source"], "source")
+        weeks = opts["weeks"]
+        if not 1 <= weeks <= MAX_CLONE_WEEKS:
+            raise CommandError(f"--weeks must be between 1 and {MAX_CLONE_WEEKS}.")
+        if opts["first_week"]:
+            first = week_start(self._parse_date(opts["first_week"], "--first-week"))
+        else:
+            first = week_start(source) + timedelta(days=7)
+        if first == week_start(source):
+            raise CommandError("Target weeks must differ from the source week.")
+
+        # Same filters as the schedule page (ShiftFilter), by id/value
+        data = {
+            name: opts[option]
+            for name, option in (("team_lead", "team_lead"), ("agent", "agent"),
+                                 ("direction", "direction"), ("status", "status"))
+            if opts[option]
+        }
+        shift_filter = ShiftFilter(data, queryset=Shift.objects.all())
+        if not shift_filter.is_valid():
+            raise CommandError(shift_filter.errors.as_text())
+
+        tz = timezone.get_current_timezone()
+        try:
+            result = clone_week(
+                source,
+                [first + timedelta(days=7 * offset) for offset in range(weeks)],
+                shifts=shift_filter.qs,
+                tz=tz,
+                skip_conflicts=not opts["fail_on_conflict"],
+                dry_run=opts["dry_run"],
+            )
+        except ShiftBatchError as exc:
+            for key, error in exc.errors.items():
+                self.stderr.write(f"  ! agent:start={key} {error.message}")
+            raise CommandError(f"{len(exc.errors)} copies conflict with existing shifts; nothing was written.")
+
+        for clone, _other in result.skipped:
+            start = timezone.localtime(clone.start, tz)
+            self.stdout.write(f"  - skipped agent={clone.agent_id} {start:%Y-%m-%d %H:%M} (conflict)")
+        verb = "would create" if opts["dry_run"] else "created"
+        self.stdout.write(self.style.SUCCESS(
+            f"[clone] source week {week_start(source)} -> {', '.join(str(week) for week in result.weeks)}: "
+            f"{verb} {len(result.created)}, skipped {len(result.skipped)}"
+        ))
+
+    @staticmethod
+    def _parse_date(value, label) -> date:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"{label} must look like YYYY-MM-DD")
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count, Min
+
+REPORT_CHUNK = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "List shifts that share an (agent, start) pair. Such pairs stop migration 0010 and block the "
+        "uniq_shift_agent_start constraint. With --delete, keep the oldest record (lowest id) of each pair "
+        "and delete the rest, including their cascaded exchanges"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Delete the duplicates (default: report only)")
+
+    def handle(self, *args, **opts):
+        Shift = self._shift_model()
+        duplicates = list(
+            Shift.objects.values("agent_id", "start")
+            .annotate(keep_id=Min("id"), total=Count("id"))
+            .filter(total__gt=1)
+            .order_by("agent_id", "start")
+        )
+        if not duplicates:
+            self.stdout.write(self.style.SUCCESS("[dedupe] no duplicate shifts found"))
+            return
+
+        to_delete = []
+        for group in duplicates:
+            extra = list(
+                Shift.objects.filter(agent_id=group["agent_id"], start=group["start"])
+                .exclude(pk=group["keep_id"])
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            to_delete.extend(extra)
+            self.stdout.write(
+                f"  agent_id={group['agent_id']} start={group['start'].isoformat()} "
+                f"keep={group['keep_id']} duplicates={extra}"
+            )
+
+        if not opts["delete"]:
+            self.stdout.write(self.style.WARNING(
+                f"[dedupe] {len(duplicates)} pairs, {len(to_delete)} duplicate shifts; run with --delete to remove them"
+            ))
+            return
+
+        deleted = {}
+        with transaction.atomic():
+            for offset in range(0, len(to_delete), REPORT_CHUNK):
+                _total, per_model = Shift.objects.filter(pk__in=to_delete[offset:offset + REPORT_CHUNK]).delete()
+                for label, count in per_model.items():
+                    deleted[label] = deleted.get(label, 0) + count
+        summary = ", ".join(f"{label}={count}" for label, count in sorted(deleted.items()))
+        self.stdout.write(self.style.SUCCESS(f"[dedupe] deleted: {summary}"))
+
+    @staticmethod
+    def _shift_model():
+        # The command runs before the later core migrations, so use the model as of the last applied one:
+        # the live model would select columns the database does not have yet
+        loader = MigrationLoader(connection)
+        applied = sorted(name for app, name in loader.applied_migrations if app == "core")
+        if not applied:
+            raise CommandError("core migrations have not been applied yet.")
+        return loader.project_state(("core", applied[-1])).apps.get_model("core", "Shift")
@@ -0,0 +1,146 @@
+import itertools
+from pathlib import Path
+
+import openpyxl
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from zoneinfo import ZoneInfo
+
+from core import normalization
+from core.schedule_grid import GridReader, column_letter
+from core.shift_import import (
+    DateTimeParser,
+    IMPORT_MODES,
+    ImportStats,
+    ShiftRow,
+    apply_plan,
+    build_agent_map,
+    format_plan,
+    plan_for_mode,
+    write_rows,
+)
+
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a planner's Excel schedule grid (team lead / direction / agent columns, one column per date) "
+        "straight into shifts, without converting it to CSV first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("xlsx_path", type=str, help="Path to the grid workbook (.xlsx)")
+        parser.add_argument("--sheet", default=None, help="Sheet name (defaults to the active sheet)")
+        parser.add_argument("--tz", default=None, help="Timezone of the grid times (defaults to Django current)")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Bulk write batch size (default: 5000)")
+        parser.add_argument(
+            "--mode",
+            choices=IMPORT_MODES,
+            default="append",
+            help="Same as import_shifts_from_csv: append, upsert or sync (default: append)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Do not write; print the diff against stored shifts instead",
+        )
+        parser.add_argument(
+            "--preview",
+            type=int,
+            default=20,
+            help="How many planned changes / cell errors of each kind to print (default: 20)",
+        )
+
+    def handle(self, *args, **opts):
+        xlsx_path = Path(opts["xlsx_path"]).expanduser()
+        if not xlsx_path.exists():
+            raise CommandError(f"File not found: {xlsx_path}")
+
+        batch_size = int(opts["batch_size"]) or 5000
+        dry_run = bool(opts["dry_run"])
+        mode = opts["mode"]
+        limit = int(opts["preview"])
+        tz = timezone.get_current_timezone() if not opts["tz"] else ZoneInfo(opts["tz"])
+
+        try:
+            workbook = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+        except Exception as exc:
+            raise CommandError(f"Cannot open workbook {xlsx_path}: {exc}")
+
+        try:
+            if opts["sheet"] and opts["sheet"] not in workbook.sheetnames:
+                raise CommandError(f"Sheet not found: {opts['sheet']}")
+            sheet = workbook[opts["sheet"]] if opts["sheet"] else workbook.active
+            sheet.reset_dimensions()
+            errors = []
+            grid = GridReader(sheet.iter_rows(values_only=True), on_error=errors.append)
+            for warning in grid.header_warnings:
+                self.stdout.write(self.style.WARNING(f"[grid] header {warning}"))
+            if not grid.valid_dates:
+                raise CommandError("No valid dates found in the header row (row 1, from column D).")
+
+            agent_map = build_agent_map()
+            normalization.warnings.drain()
+            stats = ImportStats()
+            rows = self._iter_rows(grid, agent_map, DateTimeParser(tz), stats)
+
+            if dry_run or mode == "sync":
+                # Preview only what this mode would write
+                plan = plan_for_mode(rows, tz, mode)
+                for line in format_plan(plan, tz, limit=limit):
+                    self.stdout.write(line)
+                if not dry_run:
+                    apply_plan(plan, batch_size=batch_size)
+                summary = (
+                    f"{'planned' if dry_run else 'applied'}: inserts={len(plan.inserts)} "
+                    f"updates={len(plan.updates)} deletes={len(plan.deletes)} unchanged={plan.unchanged}"
+                )
+            else:
+                stats.merge(write_rows(_batched(rows, batch_size), batch_size=batch_size, mode=mode))
+                summary = f"created={stats.created} skipped_duplicate={stats.skipped_duplicate}"
+                if mode == "upsert":
+                    summary += f" updated={stats.updated} unchanged={stats.unchanged}"
+        finally:
+            workbook.close()
+
+        for error in errors[:limit]:
+            self.stdout.write(self.style.WARNING(
+                f"[grid] {column_letter(error.column)}{error.row} agent='{error.agent}' "
+                f"date={error.date} value='{error.value}': {error.message}"
+            ))
+        if len(errors) > limit:
+            self.stdout.write(self.style.WARNING(f"[grid] ... and {len(errors) - limit} more cell errors"))
+        for line in normalization.NormalizationWarnings.format(normalization.warnings.drain()):
+            self.stdout.write(self.style.WARNING(line))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[grid] processed={stats.processed} {summary} "
+            f"skipped_no_agent={stats.skipped_no_agent} bad_cells={len(errors)}"
+        ))
+
+    @staticmethod
+    def _iter_rows(grid, agent_map, parser, stats):
+        for shift in grid:
+            stats.processed += 1
+            agent_id = agent_map.get(normalization.normalize_name(shift.agent))
+            if not agent_id:
+                stats.skipped_no_agent += 1
+                normalization.warnings.add("agent", shift.agent)
+                continue
+            yield ShiftRow(
+                agent_id=agent_id,
+                start=parser.localize(shift.start),
+                end=parser.localize(shift.end),
+                direction=shift.direction,
+                status=shift.status,
+                activity=shift.activity,
+                comment=None,
+            )
@@ -1,45 +1,29 @@
-import csv
 from pathlib import Path
-from typing import Dict, List
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, connection
 from django.utils import timezone
-from django.db import transaction, connection
 from zoneinfo import ZoneInfo
 
-from core.models import Shift, Agent
-from core.resources import ShiftResource
-
-
-def parse_dt(value: str, tz):
-    if not value:
-        return None
-    s = str(value).strip()
-    # Try a few common formats quickly (no heavy parsers)
-    fmts = [
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%dT%H:%M",
-        "%d.%m.%Y %H:%M:%S",
-        "%d.%m.%Y %H:%M",
-    ]
-    for fmt in fmts:
-        try:
-            dt = timezone.datetime.strptime(s, fmt)
-            if timezone.is_naive(dt):
-                return timezone.make_aware(dt, tz)
-            return timezone.localtime(dt, tz)
-        except ValueError:
-            continue
-    # As last resort, try fromisoformat (Python 3.11 tolerant)
-    try:
-        dt = timezone.datetime.fromisoformat(s)
-        if timezone.is_naive(dt):
-            return timezone.make_aware(dt, tz)
-        return timezone.localtime(dt, tz)
-    except Exception:
-        return None
+from core import normalization
+from core.import_progress import Checkpointer, ProgressReporter
+from core.shift_import import (
+    DateTimeParser,
+    IMPORT_MODES,
+    ImportStats,
+    apply_plan,
+    build_agent_map,
+    copy_rows,
+    format_plan,
+    iter_checkpointed,
+    iter_parallel,
+    iter_serial,
+    plan_diff,
+    read_header,
+    write_checkpointed,
+    write_rejects,
+    write_rows,
+)
 
 
 class Command(BaseCommand):
@@ -51,6 +35,53 @@ class Command(BaseCommand):
         parser.add_argument("--batch-size", type=int, default=5000, help="Bulk insert batch size (default: 5000)")
         parser.add_argument("--tz", default=None, help="Timezone name (defaults to Django current)")
         parser.add_argument("--dry-run", action="store_true", help="Parse only, do not write shifts")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Parse byte-range chunks in N processes (0 = CPU count, default: 1 = serial)",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="PostgreSQL only: load via COPY into a staging table and resolve conflicts in one INSERT",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=IMPORT_MODES,
+            default="append",
+            help="append: skip shifts whose (agent, start) already exists; "
+                 "upsert: also rewrite existing shifts whose values differ; "
+                 "sync: make the file's agents and date range match the file exactly, "
+                 "deleting shifts missing from it (default: append)",
+        )
+        parser.add_argument(
+            "--reject-file",
+            default=None,
+            help="Write rows that could not be imported (unknown agent, bad time) to this CSV with a reason column",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            action="store_true",
+            help="Commit every batch and record the last committed byte offset, so an interrupted run can --resume",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue this file (matched by SHA-256) from its last checkpoint; implies --checkpoint",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=float,
+            default=5.0,
+            help="With --checkpoint: print rows/s, batches and ETA every N seconds (default: 5)",
+        )
+        parser.add_argument(
+            "--preview",
+            type=int,
+            default=20,
+            help="In sync mode, how many planned changes of each kind to print (default: 20)",
+        )
 
     def handle(self, *args, **opts):
         csv_path = Path(opts["csv_path"]).expanduser()
@@ -59,83 +90,129 @@ class Command(BaseCommand):
 
         delimiter = opts["delimiter"]
         batch_size = int(opts["batch_size"]) or 5000
-        dry_run = bool(opts["dry_run"]) 
+        dry_run = bool(opts["dry_run"])
+        workers = int(opts["workers"])
+        use_copy = bool(opts["copy"])
+        mode = opts["mode"]
         tz = timezone.get_current_timezone() if not opts["tz"] else ZoneInfo(opts["tz"])
 
-        # Build agent cache (normalized display -> id) using streaming to keep memory low
-        agent_map: Dict[str, int] = {}
-        for a in Agent.objects.select_related("user").only("id", "user__first_name", "user__last_name", "user__username").iterator(chunk_size=5000):
-            disp = ShiftResource._clean_display_name(a.user.get_full_name() or a.user.username)
-            agent_map[ShiftResource._normalize_name(disp)] = a.pk
-
-        created = 0
-        processed = 0
-        skipped_no_agent = 0
-        skipped_bad_time = 0
-
-        # Stream rows and build Shifts in chunks
-        def flush_batch(batch: List[Shift]):
-            nonlocal created
-            if not batch or dry_run:
-                return
-            # bulk_create avoids signals/history overhead => much faster and less memory
-            Shift.objects.bulk_create(batch, batch_size=batch_size)
-            created += len(batch)
-
-        batch: List[Shift] = []
-
-        with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f, delimiter=delimiter)
-            headers = [h.strip() for h in (reader.fieldnames or [])]
-            required = {"agent", "start", "end"}
-            missing = required - set(headers)
-            if missing:
-                raise CommandError(f"CSV missing required headers: {', '.join(sorted(missing))}")
-
-            # Suggest optional columns but not required
-            for row in reader:
-                processed += 1
-                a_raw = (row.get("agent") or "").strip()
-                a_norm = ShiftResource._normalize_name(a_raw)
-                agent_id = agent_map.get(a_norm)
-                if not agent_id:
-                    skipped_no_agent += 1
-                    continue
-
-                start_dt = parse_dt(row.get("start"), tz)
-                end_dt = parse_dt(row.get("end"), tz)
-                if not start_dt or not end_dt:
-                    skipped_bad_time += 1
-                    continue
-                if end_dt <= start_dt:
-                    # Assume overnight shift => add day
-                    end_dt = end_dt + timezone.timedelta(days=1)
-
-                direction = ShiftResource._normalize_direction(row.get("direction"), row.get("activity"))
-                status = ShiftResource._normalize_status(row.get("status"))
-                activity = (row.get("activity") or "").strip()
-                comment = (row.get("comment") or None)
-
-                batch.append(Shift(
-                    agent_id=agent_id,
-                    start=start_dt,
-                    end=end_dt,
-                    direction=direction,
-                    status=status,
-                    activity=activity,
-                    comment=comment,
-                ))
-
-                if len(batch) >= batch_size:
-                    flush_batch(batch)
-                    batch.clear()
-
-        # final flush
-        with transaction.atomic():
-            with connection.cursor() as cur:
-                cur.execute("SET LOCAL synchronous_commit = OFF")
-            flush_batch(batch)
+        if use_copy and connection.vendor != "postgresql":
+            raise CommandError("--copy requires a PostgreSQL database.")
+        if use_copy and mode == "sync":
+            raise CommandError("--copy cannot be combined with --mode sync.")
+        checkpointed = bool(opts["checkpoint"] or opts["resume"])
+        if checkpointed and (use_copy or workers != 1 or mode == "sync" or dry_run):
+            raise CommandError("--checkpoint/--resume work only with serial append/upsert imports.")
 
+        try:
+            headers, data_start = read_header(csv_path, delimiter)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        agent_map = build_agent_map()
+        normalization.warnings.drain()
+        reject_path = Path(opts["reject_file"]).expanduser() if opts["reject_file"] else None
+        stats = ImportStats(keep_rejects=reject_path is not None)
+        # Detect the datetime format once per file instead of trying every format per value
+        parse = DateTimeParser.from_file(csv_path, delimiter, tz)
+
+        if checkpointed:
+            self._import_checkpointed(
+                csv_path, delimiter, headers, data_start, agent_map, parse, stats, batch_size, mode, opts
+            )
+            self._report_rejects(stats, reject_path, headers)
+            self._print_stats(stats, mode)
+            return
+
+        if workers == 1:
+            batches = iter_serial(csv_path, delimiter, agent_map, parse, stats, batch_size=batch_size)
+        else:
+            batches = iter_parallel(csv_path, delimiter, agent_map, parse, stats, workers=workers or None)
+
+        if mode == "sync":
+            plan = plan_diff((row for rows in batches for row in rows), tz)
+            for line in format_plan(plan, tz, limit=int(opts["preview"])):
+                self.stdout.write(line)
+            if not dry_run:
+                apply_plan(plan, batch_size=batch_size)
+            stats.created = 0 if dry_run else len(plan.inserts)
+            self._report_rejects(stats, reject_path, headers)
+            self.stdout.write(self.style.SUCCESS(
+                f"[shifts] processed={stats.processed} "
+                f"{'planned' if dry_run else 'applied'}: inserts={len(plan.inserts)} "
+                f"updates={len(plan.updates)} deletes={len(plan.deletes)} unchanged={plan.unchanged} "
+                f"skipped_no_agent={stats.skipped_no_agent} skipped_bad_time={stats.skipped_bad_time}"
+            ))
+            return
+
+        if dry_run:
+            for _ in batches:
+                pass
+        elif use_copy:
+            try:
+                stats.merge(copy_rows(batches, mode=mode))
+            except NotSupportedError as exc:
+                raise CommandError(str(exc))
+        else:
+            # Single writer, one transaction: a failed import leaves no partial schedule behind
+            stats.merge(write_rows(batches, batch_size=batch_size, mode=mode))
+
+        self._report_rejects(stats, reject_path, headers)
+        self._print_stats(stats, mode)
+
+    def _print_stats(self, stats, mode):
         self.stdout.write(self.style.SUCCESS(
-            f"[shifts] processed={processed} created={created} skipped_no_agent={skipped_no_agent} skipped_bad_time={skipped_bad_time}"
+            f"[shifts] processed={stats.processed} created={stats.created} "
+            f"skipped_no_agent={stats.skipped_no_agent} skipped_bad_time={stats.skipped_bad_time}"
+            f" skipped_duplicate={stats.skipped_duplicate}"
+            + (f" updated={stats.updated} unchanged={stats.unchanged}" if mode == "upsert" else "")
         ))
+
+    def _import_checkpointed(self, csv_path, delimiter, headers, data_start, agent_map, parse, stats,
+                             batch_size, mode, opts):
+        checkpointer = Checkpointer.open("shifts", csv_path, data_start, resume=bool(opts["resume"]))
+        checkpoint = checkpointer.checkpoint
+        if checkpointer.is_done:
+            self.stdout.write(self.style.WARNING(
+                f"[shifts] {csv_path.name} was already imported ({checkpoint.rows_done} rows); nothing to resume"
+            ))
+            return
+        if checkpoint.byte_offset > data_start:
+            self.stdout.write(self.style.NOTICE(
+                f"[shifts] resuming at byte {checkpoint.byte_offset} after {checkpoint.rows_done} rows"
+            ))
+
+        progress = ProgressReporter(
+            self.stdout.write,
+            total_bytes=csv_path.stat().st_size,
+            start_offset=checkpoint.byte_offset,
+            start_rows=checkpoint.rows_done,
+            every=float(opts["progress_every"]),
+            label="shifts",
+        )
+        batches = iter_checkpointed(
+            csv_path, delimiter, headers, checkpoint.byte_offset, agent_map, parse, stats, batch_size=batch_size
+        )
+        try:
+            stats.merge(write_checkpointed(batches, checkpointer, batch_size=batch_size, mode=mode, progress=progress))
+        except BaseException as exc:
+            checkpointer.fail(exc)
+            raise
+        checkpointer.finish()
+        self.stdout.write(progress.line())
+
+    def _report_rejects(self, stats, reject_path, headers):
+        stats.warnings.update(normalization.warnings.drain())
+        for line in normalization.NormalizationWarnings.format(stats.warnings):
+            self.stdout.write(self.style.WARNING(line))
+
+        skipped = stats.skipped_no_agent + stats.skipped_bad_time
+        if not skipped:
+            return
+        if reject_path is None:
+            self.stdout.write(self.style.WARNING(
+                f"[shifts] {skipped} rows rejected; pass --reject-file to see them"
+            ))
+            return
+        write_rejects(reject_path, stats.rejects, headers)
+        self.stdout.write(self.style.WARNING(f"[shifts] {skipped} rejected rows written to {reject_path}"))
@@ -1,15 +1,27 @@
 import csv
+import io
 from pathlib import Path
-from typing import Dict, Set, Tuple
 
 from django.core.management.base import BaseCommand, CommandError
-from django.contrib.auth.models import User, Group
-from django.contrib.auth.hashers import make_password
-from django.db import transaction, connection
-from django.utils.text import slugify
+from django.db import transaction
 
-from core.models import Agent
-from core.resources import ShiftResource
+from core.import_progress import Checkpointer, ProgressReporter, iter_line_batches
+from core.provisioning import ProvisionResult, ProvisionState, Roster, provision_roster
+
+
+def _add_rows(roster, rows):
+    for row in rows:
+        roster.add(
+            row.get("agent"),
+            row.get("team_lead"),
+            # 'id' is treated as Agent.id in this importer
+            agent_id=row.get("agent_id") or row.get("id"),
+            agent_user_id=row.get("agent_user_id") or row.get("user_id"),
+            tl_user_id=(
+                row.get("team_lead_id") or row.get("team_lead_user_id")
+                or row.get("tl_id") or row.get("tl_user_id")
+            ),
+        )
 
 
 class Command(BaseCommand):
@@ -20,6 +32,27 @@ class Command(BaseCommand):
         parser.add_argument("--delimiter", default=",", help="CSV delimiter, default ','")
         parser.add_argument("--batch-size", type=int, default=2000, help="Insert batch size (default: 2000)")
         parser.add_argument("--dry-run", action="store_true", help="Parse only, do not write to DB")
+        parser.add_argument(
+            "--password",
+            default="temp_password123",
+            help="Initial password for created users (default: temp_password123)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            action="store_true",
+            help="Provision and commit every --batch-size rows, recording the last committed byte offset",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue this file (matched by SHA-256) from its last checkpoint; implies --checkpoint",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=float,
+            default=5.0,
+            help="With --checkpoint: print rows/s, batches and ETA every N seconds (default: 5)",
+        )
 
     def handle(self, *args, **opts):
         csv_path = Path(opts["csv_path"]).expanduser()
@@ -29,208 +62,94 @@ class Command(BaseCommand):
         delimiter = opts["delimiter"]
         batch_size = int(opts["batch_size"]) or 2000
         dry_run = bool(opts["dry_run"])
+        checkpointed = bool(opts["checkpoint"] or opts["resume"])
+        if checkpointed and dry_run:
+            raise CommandError("--checkpoint/--resume cannot be combined with --dry-run.")
+
+        with csv_path.open("rb") as fh:
+            header_line = fh.readline().decode("utf-8-sig")
+            data_start = fh.tell()
+        headers = [h.strip() for h in next(csv.reader([header_line], delimiter=delimiter), [])]
+        if "agent" not in headers:
+            raise CommandError("CSV must contain 'agent' header")
+        if "team_lead" not in headers:
+            raise CommandError("CSV must contain 'team_lead' header")
+
+        if checkpointed:
+            result = self._import_checkpointed(csv_path, delimiter, headers, data_start, batch_size, opts)
+            if result is not None:
+                self._print_result(result)
+            return
 
-        # First pass: collect unique names and mapping agent -> tl
-        agents_needed: Set[str] = set()
-        tls_needed: Set[str] = set()
-        agent_original_by_norm: Dict[str, str] = {}
-        tl_original_by_norm: Dict[str, str] = {}
-        agent_to_tl: Dict[str, str] = {}
-        # Optional IDs supplied in CSV
-        agent_id_by_norm: Dict[str, int] = {}
-        agent_user_id_by_norm: Dict[str, int] = {}
-        tl_user_id_by_norm: Dict[str, int] = {}
-
+        # First pass: collect unique names, mapping agent -> tl and optional IDs
+        roster = Roster()
         with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
             reader = csv.DictReader(f, delimiter=delimiter)
-            headers = [h.strip() for h in (reader.fieldnames or [])]
-            if "agent" not in headers:
-                raise CommandError("CSV must contain 'agent' header")
-            if "team_lead" not in headers:
-                raise CommandError("CSV must contain 'team_lead' header")
-            # optional id columns (with aliases)
-            def _has(*names):
-                return any(n in headers for n in names)
-
-            has_agent_id = _has("agent_id", "id")             # 'id' treated as Agent.id in this importer
-            has_agent_user_id = _has("agent_user_id", "user_id")
-            has_tl_user_id = _has("team_lead_id", "team_lead_user_id", "tl_id", "tl_user_id")
-            for row in reader:
-                a_raw = (row.get("agent") or "").strip()
-                if not a_raw:
-                    continue
-                a_norm = ShiftResource._normalize_name(a_raw)
-                if not a_norm:
-                    continue
-                agents_needed.add(a_norm)
-                agent_original_by_norm.setdefault(a_norm, ShiftResource._clean_display_name(a_raw))
-                tl_raw = (row.get("team_lead") or "").strip()
-                tl_norm = ShiftResource._normalize_name(tl_raw)
-                if tl_norm:
-                    tls_needed.add(tl_norm)
-                    tl_original_by_norm.setdefault(tl_norm, ShiftResource._clean_display_name(tl_raw))
-                    agent_to_tl[a_norm] = tl_norm
-
-                # parse optional IDs
-                def _to_int(v):
-                    try:
-                        i = int(str(v).strip())
-                        return i if i > 0 else None
-                    except Exception:
-                        return None
-
-                if has_agent_id:
-                    desired = _to_int(row.get("agent_id") or row.get("id"))
-                    if desired:
-                        agent_id_by_norm.setdefault(a_norm, desired)
-                if has_agent_user_id:
-                    desired = _to_int(row.get("agent_user_id") or row.get("user_id"))
-                    if desired:
-                        agent_user_id_by_norm.setdefault(a_norm, desired)
-                if tl_norm and has_tl_user_id:
-                    desired = _to_int(row.get("team_lead_id") or row.get("team_lead_user_id") or row.get("tl_id") or row.get("tl_user_id"))
-                    if desired:
-                        tl_user_id_by_norm.setdefault(tl_norm, desired)
-
-        self.stdout.write(self.style.NOTICE(f"[users] unique agents in file: {len(agents_needed)}; TLs: {len(tls_needed)}"))
+            reader.fieldnames = [h.strip() for h in (reader.fieldnames or [])]
+            _add_rows(roster, reader)
+
+        self.stdout.write(self.style.NOTICE(
+            f"[users] unique agents in file: {len(roster.agents)}; TLs: {len(roster.team_leads)}"
+        ))
 
         if dry_run:
             self.stdout.write(self.style.SUCCESS("Dry run complete."))
             return
 
-        # Build caches from DB using streaming to keep memory low
-        user_display_to_id: Dict[str, int] = {}
-        for u in User.objects.only("first_name", "last_name", "username").iterator(chunk_size=5000):
-            disp = ShiftResource._clean_display_name(u.get_full_name() or u.username)
-            user_display_to_id[ShiftResource._normalize_name(disp)] = u.pk
-
-        agent_display_to_id: Dict[str, int] = {}
-        for a in Agent.objects.select_related("user").only("id", "user__first_name", "user__last_name", "user__username").iterator(chunk_size=5000):
-            disp = ShiftResource._clean_display_name(a.user.get_full_name() or a.user.username)
-            agent_display_to_id[ShiftResource._normalize_name(disp)] = a.pk
-
-        # Prepare TL group
-        tl_group, _ = Group.objects.get_or_create(name="TL")
-        ShiftResource._ensure_tl_group_permissions(tl_group)
-
-        # Create missing TL users
-        per_base_cache: Dict[str, Set[str]] = {}
-        new_tl_norms = [norm for norm in tls_needed if norm not in user_display_to_id]
-        created_tl_users: Dict[str, int] = {}
-
-        with transaction.atomic():
-            # Speed up commit in Postgres
-            with connection.cursor() as cur:
-                cur.execute("SET LOCAL synchronous_commit = OFF")
-
-            for norm in new_tl_norms:
-                original = tl_original_by_norm.get(norm, norm)
-                first, last = ShiftResource._split_name(original)
-                base = slugify(original, allow_unicode=True).replace('-', '_') or 'tl'
-                username = ShiftResource._allocate_username(base, per_base_cache)
-                desired_uid = tl_user_id_by_norm.get(norm)
-                create_kwargs = dict(
-                    username=username,
-                    first_name=first,
-                    last_name=last,
-                    password=make_password('temp_password123'),
-                    is_staff=True,
-                    is_active=True,
+        # Users, agents and TL memberships are bulk-created; the password is hashed once
+        self._print_result(provision_roster(roster, password=opts["password"], batch_size=batch_size))
+
+    def _print_result(self, result):
+        self.stdout.write(self.style.SUCCESS(f"[users] created TLs: {result.created_team_leads}"))
+        self.stdout.write(self.style.SUCCESS(f"[users] created agents: {result.created_agents}"))
+        self.stdout.write(self.style.SUCCESS(f"[users] assigned team leads to {result.assigned_team_leads} agents"))
+
+    def _import_checkpointed(self, csv_path, delimiter, headers, data_start, batch_size, opts):
+        """Provisions the file batch by batch; each batch commits together with its checkpoint."""
+        checkpointer = Checkpointer.open("users", csv_path, data_start, resume=bool(opts["resume"]))
+        checkpoint = checkpointer.checkpoint
+        if checkpointer.is_done:
+            self.stdout.write(self.style.WARNING(
+                f"[users] {csv_path.name} was already imported ({checkpoint.rows_done} rows); nothing to resume"
+            ))
+            return None
+        if checkpoint.byte_offset > data_start:
+            self.stdout.write(self.style.NOTICE(
+                f"[users] resuming at byte {checkpoint.byte_offset} after {checkpoint.rows_done} rows"
+            ))
+
+        progress = ProgressReporter(
+            self.stdout.write,
+            total_bytes=csv_path.stat().st_size,
+            start_offset=checkpoint.byte_offset,
+            start_rows=checkpoint.rows_done,
+            every=float(opts["progress_every"]),
+            label="users",
+        )
+        total = ProvisionResult()
+        # Users, agents and usernames are read once; every batch updates this state in place
+        state = ProvisionState.load(opts["password"])
+        try:
+            for lines, end_offset in iter_line_batches(csv_path, checkpoint.byte_offset, batch_size):
+                reader = csv.DictReader(
+                    io.StringIO(b"".join(lines).decode("utf-8"), newline=""),
+                    fieldnames=headers,
+                    delimiter=delimiter,
                 )
-                if desired_uid and not User.objects.filter(pk=desired_uid).exists():
-                    create_kwargs['id'] = desired_uid
-                u = User.objects.create(**create_kwargs)
-                u.groups.add(tl_group)
-                user_display_to_id[norm] = u.pk
-                created_tl_users[norm] = u.pk
-
-        self.stdout.write(self.style.SUCCESS(f"[users] created TLs: {len(created_tl_users)}"))
-
-        # Create missing agents (User + Agent)
-        new_agent_norms = [norm for norm in agents_needed if norm not in agent_display_to_id]
-        created_agents = 0
-
-        with transaction.atomic():
-            with connection.cursor() as cur:
-                cur.execute("SET LOCAL synchronous_commit = OFF")
-
-            user_objs = []
-            created_usernames = []
-            for norm in new_agent_norms:
-                original = agent_original_by_norm.get(norm, norm)
-                first, last = ShiftResource._split_name(original)
-                base = slugify(original, allow_unicode=True).replace('-', '_') or 'agent'
-                username = ShiftResource._allocate_username(base, per_base_cache)
-                desired_uid = agent_user_id_by_norm.get(norm)
-                if desired_uid and not User.objects.filter(pk=desired_uid).exists():
-                    user_objs.append(User(
-                        id=desired_uid,
-                        username=username,
-                        first_name=first,
-                        last_name=last,
-                        password=make_password('temp_password123'),
-                        is_active=True,
-                    ))
-                else:
-                    user_objs.append(User(
-                        username=username,
-                        first_name=first,
-                        last_name=last,
-                        password=make_password('temp_password123'),
-                        is_active=True,
-                    ))
-                created_usernames.append(username)
-                if len(user_objs) >= batch_size:
-                    created_users = User.objects.bulk_create(user_objs, batch_size=batch_size)
-                    for u in created_users:
-                        disp = ShiftResource._clean_display_name(u.get_full_name() or u.username)
-                        user_display_to_id[ShiftResource._normalize_name(disp)] = u.pk
-                    user_objs.clear()
-            if user_objs:
-                created_users = User.objects.bulk_create(user_objs, batch_size=batch_size)
-                for u in created_users:
-                    disp = ShiftResource._clean_display_name(u.get_full_name() or u.username)
-                    user_display_to_id[ShiftResource._normalize_name(disp)] = u.pk
-
-            agent_objs = []
-            for norm in new_agent_norms:
-                uid = user_display_to_id.get(norm)
-                if uid:
-                    desired_aid = agent_id_by_norm.get(norm)
-                    if desired_aid and not Agent.objects.filter(pk=desired_aid).exists():
-                        agent_objs.append(Agent(id=desired_aid, user_id=uid))
-                    else:
-                        agent_objs.append(Agent(user_id=uid))
-                if len(agent_objs) >= batch_size:
-                    Agent.objects.bulk_create(agent_objs, batch_size=batch_size)
-                    agent_objs.clear()
-                    created_agents += batch_size
-            if agent_objs:
-                created = Agent.objects.bulk_create(agent_objs, batch_size=batch_size)
-                created_agents += len(created)
-
-            # Reload agent cache for assignments
-            agent_display_to_id.clear()
-            for a in Agent.objects.select_related("user").only("id", "user__first_name", "user__last_name", "user__username").iterator(chunk_size=5000):
-                disp = ShiftResource._clean_display_name(a.user.get_full_name() or a.user.username)
-                agent_display_to_id[ShiftResource._normalize_name(disp)] = a.pk
-
-        self.stdout.write(self.style.SUCCESS(f"[users] created agents: {created_agents}"))
-
-        # Assign team leads
-        assigned = 0
-        with transaction.atomic():
-            with connection.cursor() as cur:
-                cur.execute("SET LOCAL synchronous_commit = OFF")
-            # group by TL to reduce updates
-            tl_to_agent_ids: Dict[int, list] = {}
-            for a_norm, tl_norm in agent_to_tl.items():
-                aid = agent_display_to_id.get(a_norm)
-                tlid = user_display_to_id.get(tl_norm)
-                if aid and tlid:
-                    tl_to_agent_ids.setdefault(tlid, []).append(aid)
-            for tlid, agent_ids in tl_to_agent_ids.items():
-                updated = Agent.objects.filter(id__in=agent_ids).exclude(team_lead_id=tlid).update(team_lead_id=tlid)
-                assigned += updated
-
-        self.stdout.write(self.style.SUCCESS(f"[users] assigned team leads to {assigned} agents"))
+                roster = Roster()
+                _add_rows(roster, reader)
+                with transaction.atomic():
+                    # Provisioning is idempotent (existing users are matched by name), so a resumed
+                    # batch never duplicates users created before the crash
+                    result = provision_roster(roster, batch_size=batch_size, state=state)
+                    checkpointer.advance(len(lines), end_offset)
+                total.created_team_leads += result.created_team_leads
+                total.created_agents += result.created_agents
+                total.assigned_team_leads += result.assigned_team_leads
+                progress.update(len(lines), end_offset)
+        except BaseException as exc:
+            checkpointer.fail(exc)
+            raise
+        checkpointer.finish()
+        self.stdout.write(progress.line())
+        return total
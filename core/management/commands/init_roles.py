@@ -42,7 +42,7 @@ class Command(BaseCommand):
 
         tl_perms = list(agent_perms)
         tl_perms += perms_for(Shift, ["export_schedule"])
-        tl_perms += perms_for(ShiftExchange, ["view_exchange_history"])
+        tl_perms += perms_for(ShiftExchange, ["view_exchange_history", "approve_exchange"])
         tl_g.permissions.set(tl_perms)
 
         mon_perms = []
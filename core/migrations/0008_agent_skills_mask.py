@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+# Заморожене відображення скіл -> біт на момент міграції (див. SKILL_BITS у models.py)
+SKILL_BITS = {"calls": 1 << 0, "tickets": 1 << 1, "chats": 1 << 2}
+
+
+def skills_to_mask(skills):
+    mask = 0
+    for skill in skills or ():
+        mask |= SKILL_BITS.get(skill, 0)
+    return mask
+
+
+def fill_skills_mask(apps, schema_editor):
+    Agent = apps.get_model("core", "Agent")
+    to_update = []
+    for agent in Agent.objects.only("id", "skills").iterator(chunk_size=2000):
+        mask = skills_to_mask(agent.skills)
+        if mask:
+            agent.skills_mask = mask
+            to_update.append(agent)
+    Agent.objects.bulk_update(to_update, ["skills_mask"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_auditlog"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agent",
+            name="skills_mask",
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_skills_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:05
+
+from django.db import migrations
+from django.db.models import Count
+
+# Скільки пар (agent, start) показати в повідомленні про помилку
+REPORT_LIMIT = 20
+
+
+def check_duplicate_shifts(apps, schema_editor):
+    # Дублікати не видаляємо мовчки (разом з ними каскадно зникли б обміни та історія):
+    # міграція зупиняється зі списком, а прибирає їх оператор командою dedupe_shifts
+    Shift = apps.get_model("core", "Shift")
+    duplicates = list(
+        Shift.objects.values("agent_id", "start")
+        .annotate(total=Count("id"))
+        .filter(total__gt=1)
+        .order_by("agent_id", "start")
+    )
+    if not duplicates:
+        return
+    lines = [
+        f"  agent_id={group['agent_id']} start={group['start'].isoformat()} records={group['total']}"
+        for group in duplicates[:REPORT_LIMIT]
+    ]
+    if len(duplicates) > REPORT_LIMIT:
+        lines.append(f"  ... та ще {len(duplicates) - REPORT_LIMIT}")
+    raise RuntimeError(
+        f"Знайдено {len(duplicates)} пар (agent, start) з кількома змінами — унікальне обмеження "
+        f"uniq_shift_agent_start неможливе:\n" + "\n".join(lines) + "\n"
+        f"Перегляньте їх (python manage.py dedupe_shifts), приберіть "
+        f"(python manage.py dedupe_shifts --delete) і повторіть міграцію."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_shiftexchange_decision"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_shifts, migrations.RunPython.noop),
+    ]
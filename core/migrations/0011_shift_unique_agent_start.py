@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 0010 лише перевіряє, що дублікатів (agent, start) немає; прибирає їх
+    # оператор командою dedupe_shifts до міграції
+
+    dependencies = [
+        ("core", "0010_drop_duplicate_shifts"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="shift",
+            constraint=models.UniqueConstraint(fields=("agent", "start"), name="uniq_shift_agent_start"),
+        ),
+    ]
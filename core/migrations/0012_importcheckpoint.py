@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_shift_unique_agent_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('file_hash', models.CharField(max_length=64)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('byte_offset', models.BigIntegerField(default=0)),
+                ('rows_done', models.BigIntegerField(default=0)),
+                ('batches_done', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('running', 'Виконується'), ('done', 'Завершено'), ('failed', 'Помилка')], default='running', max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'file_hash'), name='uniq_import_checkpoint_file')],
+            },
+        ),
+    ]
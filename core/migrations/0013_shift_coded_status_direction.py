@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:12
+
+import core.fields
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+STATUS_CHOICES = [
+    ("work", "Робоча зміна"), ("day_off", "Вихідний"), ("vacation", "Відпустка"), ("sick", "Лікарняний"),
+    ("training", "Тренінг"), ("meeting", "Мітинг"), ("onboard", "Онборд"), ("mentor", "Менторство"),
+]
+DIRECTION_CHOICES = [("calls", "Дзвінки"), ("tickets", "Тікети"), ("chats", "Чати")]
+# Заморожені коди на момент міграції (див. SHIFT_STATUS_CODES / DIRECTION_CODES у models.py)
+STATUS_CODES = {value: idx for idx, (value, _label) in enumerate(STATUS_CHOICES, start=1)}
+DIRECTION_CODES = {value: idx for idx, (value, _label) in enumerate(DIRECTION_CHOICES, start=1)}
+MODELS = ("Shift", "HistoricalShift")
+
+
+def _encode(field, codes, default):
+    # Невідомі рядки (старі дані до нормалізації) отримують код значення за замовчуванням
+    return Case(
+        *[When(**{field: value}, then=Value(code)) for value, code in codes.items()],
+        default=Value(codes[default]),
+    )
+
+
+def _decode(field, codes):
+    return Case(*[When(**{field: code}, then=Value(value)) for value, code in codes.items()])
+
+
+def encode_values(apps, schema_editor):
+    for model_name in MODELS:
+        apps.get_model("core", model_name).objects.update(
+            status_code=_encode("status", STATUS_CODES, "work"),
+            direction_code=_encode("direction", DIRECTION_CODES, "calls"),
+        )
+
+
+def decode_values(apps, schema_editor):
+    for model_name in MODELS:
+        apps.get_model("core", model_name).objects.update(
+            status=_decode("status_code", STATUS_CODES),
+            direction=_decode("direction_code", DIRECTION_CODES),
+        )
+
+
+def _code_operations():
+    for model_name in ("historicalshift", "shift"):
+        for name in ("direction", "status"):
+            yield migrations.AddField(
+                model_name=model_name,
+                name=f"{name}_code",
+                field=models.PositiveSmallIntegerField(null=True),
+            )
+
+
+def _swap_operations():
+    for model_name in ("historicalshift", "shift"):
+        for name in ("direction", "status"):
+            yield migrations.RemoveField(model_name=model_name, name=name)
+            yield migrations.RenameField(model_name=model_name, old_name=f"{name}_code", new_name=name)
+        yield migrations.AlterField(
+            model_name=model_name,
+            name="direction",
+            field=core.fields.CodedChoiceField(choices=DIRECTION_CHOICES, codes=DIRECTION_CODES, default="calls"),
+        )
+        yield migrations.AlterField(
+            model_name=model_name,
+            name="status",
+            field=core.fields.CodedChoiceField(choices=STATUS_CHOICES, codes=STATUS_CODES, default="work"),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_importcheckpoint"),
+    ]
+
+    operations = [
+        *_code_operations(),
+        migrations.RunPython(encode_values, decode_values),
+        *_swap_operations(),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:16
+
+from django.db import migrations, models
+
+# Індекси лише для PostgreSQL: Django не описує їх у Meta, тож створюємо сирим SQL
+POSTGRES_INDEXES = {
+    # Компактний індекс для широких діапазонів по історії (таблиця росте приблизно за start)
+    "shift_start_brin": 'CREATE INDEX IF NOT EXISTS shift_start_brin ON core_shift USING brin (start)',
+    # Перетин/входження інтервалів: Shift.objects.active_at() / overlapping()
+    "shift_period_gist": 'CREATE INDEX IF NOT EXISTS shift_period_gist ON core_shift USING gist (tstzrange(start, "end"))',
+}
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute('SELECT COUNT(*) FROM core_shift WHERE "end" < start')
+        inverted = cur.fetchone()[0]
+        if inverted:
+            raise RuntimeError(
+                f"{inverted} змін мають end < start — tstzrange для них неможливий. "
+                f"Виправте ці записи і повторіть міграцію."
+            )
+        for sql in POSTGRES_INDEXES.values():
+            cur.execute(sql)
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cur:
+        for name in POSTGRES_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_shift_coded_status_direction"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="historicalshift",
+            name="start",
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name="shift",
+            name="start",
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name="shift",
+            index=models.Index(
+                fields=["start"], include=("agent", "end", "status", "direction"), name="shift_week_cover_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shift",
+            index=models.Index(
+                condition=models.Q(("status__in", ("vacation", "sick", "day_off")), _negated=True),
+                fields=["end", "start"],
+                name="shift_working_end_idx",
+            ),
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:24
+
+from django.db import migrations
+
+# Заморожені коди NON_WORKING_STATUSES (vacation, sick, day_off) на момент міграції
+NON_WORKING_CODES = (3, 4, 2)
+WORKING = f"NOT (status IN ({', '.join(map(str, NON_WORKING_CODES))}))"
+
+
+def add_overlap_constraint(apps, schema_editor):
+    # Лише PostgreSQL: на SQLite перетини перевіряє services.save_shift запитом
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute(
+            "SELECT a.agent_id, a.id, b.id FROM core_shift a "
+            "JOIN core_shift b ON b.agent_id = a.agent_id AND b.id > a.id "
+            'AND b.start < a."end" AND a.start < b."end" '
+            f"WHERE a.{WORKING} AND b.{WORKING} "
+            "ORDER BY a.agent_id LIMIT 20"
+        )
+        overlaps = cur.fetchall()
+        if overlaps:
+            pairs = ", ".join(f"agent {agent_id}: {a_id}/{b_id}" for agent_id, a_id, b_id in overlaps)
+            raise RuntimeError(
+                f"Є робочі зміни, що перетинаються ({pairs}{' ...' if len(overlaps) == 20 else ''}). "
+                f"Виправте їх і повторіть міграцію."
+            )
+        cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        # DEFERRABLE: обміни переставляють агентів одним UPDATE і відкладають перевірку до коміту
+        cur.execute(
+            "ALTER TABLE core_shift ADD CONSTRAINT shift_no_overlap "
+            'EXCLUDE USING gist (agent_id WITH =, tstzrange(start, "end") WITH &&) '
+            f"WHERE ({WORKING}) DEFERRABLE INITIALLY IMMEDIATE"
+        )
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute("ALTER TABLE core_shift DROP CONSTRAINT IF EXISTS shift_no_overlap")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_shift_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
@@ -6,6 +6,7 @@ from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 from simple_history.models import HistoricalRecords
+from .fields import CodedChoiceField
 from django.core.serializers.json import DjangoJSONEncoder
 
 try:
@@ -20,6 +21,19 @@ class Skill(models.TextChoices):
     CHATS = "chats", "Чати"
 
 
+# Кожен скіл — окремий біт у Agent.skills_mask. Порядок фіксований:
+# нові скіли додаються лише в кінець, щоб не зсувати вже збережені маски.
+SKILL_BITS = {skill: 1 << idx for idx, skill in enumerate(Skill.values)}
+
+
+def skills_to_mask(skills) -> int:
+    """Перетворює список скілів на бітову маску (невідомі скіли ігноруються)."""
+    mask = 0
+    for skill in skills or ():
+        mask |= SKILL_BITS.get(skill, 0)
+    return mask
+
+
 class ShiftStatus(models.TextChoices):
     WORK = "work", "Робоча зміна"
     DAY_OFF = "day_off", "Вихідний"
@@ -37,6 +51,27 @@ class Direction(models.TextChoices):
     CHATS = "chats", "Чати"
 
 
+# Коди, під якими статус і напрямок зберігаються в Shift (див. CodedChoiceField).
+# Як і SKILL_BITS: нові значення додаються лише в кінець, наявні коди не змінюються.
+SHIFT_STATUS_CODES = {status: idx for idx, status in enumerate(ShiftStatus.values, start=1)}
+DIRECTION_CODES = {direction: idx for idx, direction in enumerate(Direction.values, start=1)}
+
+# Статуси, які не рахуються зайнятістю (дашборд, інструменти). Кортеж, а не множина:
+# порядок має збігатися з умовою часткового індексу, інакше планувальник його не впізнає.
+NON_WORKING_STATUSES = (ShiftStatus.VACATION, ShiftStatus.SICK, ShiftStatus.DAY_OFF)
+
+
+class AgentQuerySet(models.QuerySet):
+    def with_any_skills(self, skills):
+        """Агенти, які мають хоча б один зі скілів (бітове AND у SQL)."""
+        mask = skills if isinstance(skills, int) else skills_to_mask(skills)
+        if not mask:
+            return self.none()
+        return self.alias(
+            _skills_hit=models.F("skills_mask").bitand(mask)
+        ).filter(_skills_hit__gt=0)
+
+
 class Agent(models.Model):
     # Зв'язуємо з користувачем адмінки
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -45,8 +80,12 @@ class Agent(models.Model):
     )
     # Швидко і дешево: список рядків зі скілами
     skills = models.JSONField(default=list, blank=True)
+    # Та сама інформація у вигляді бітової маски (див. SKILL_BITS), синхронізується в save()
+    skills_mask = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
     active = models.BooleanField(default=True)
 
+    objects = AgentQuerySet.as_manager()
+
     class Meta:
         ordering = ["user__username"]
         permissions = (
@@ -56,27 +95,125 @@ class Agent(models.Model):
     def __str__(self):
         return self.user.get_full_name() or self.user.username
 
+    def save(self, *args, **kwargs):
+        self.skills_mask = skills_to_mask(self.skills)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "skills" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "skills_mask"}
+        super().save(*args, **kwargs)
+
+
+class _ShiftPeriodLookup(models.Func):
+    """
+    Умова над інтервалом зміни [start, end). На PostgreSQL компілюється в оператор
+    над tstzrange(start, "end") — його обслуговує GiST-індекс shift_period_gist
+    (міграція 0014); на інших БД — у звичайні порівняння.
+    """
+
+    output_field = models.BooleanField()
+    range_operator = None
+
+    def _compile_args(self, compiler):
+        compiled = [compiler.compile(expr) for expr in self.get_source_expressions()]
+        return [sql for sql, _params in compiled], [tuple(params) for _sql, params in compiled]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        (start, end, *others), (start_p, end_p, *others_p) = self._compile_args(compiler)
+        rhs = others[0] if len(others) == 1 else f"TSTZRANGE({', '.join(others)})"
+        params = [*start_p, *end_p, *(p for group in others_p for p in group)]
+        return f'(TSTZRANGE({start}, {end}) {self.range_operator} {rhs})', params
+
+
+class PeriodContains(_ShiftPeriodLookup):
+    """start <= moment < end."""
+
+    arity = 3
+    range_operator = "@>"
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (start, end, moment), (start_p, end_p, moment_p) = self._compile_args(compiler)
+        return f"({start} <= {moment} AND {end} > {moment})", [*start_p, *moment_p, *end_p, *moment_p]
+
+
+class PeriodOverlaps(_ShiftPeriodLookup):
+    """[start, end) перетинається з [lo, hi)."""
+
+    arity = 4
+    range_operator = "&&"
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (start, end, lo, hi), (start_p, end_p, lo_p, hi_p) = self._compile_args(compiler)
+        return f"({start} < {hi} AND {end} > {lo})", [*start_p, *hi_p, *end_p, *lo_p]
+
+
+class ShiftQuerySet(models.QuerySet):
+    def working(self):
+        """Без вихідних/відпусток/лікарняних — та сама умова, що в частковому індексі."""
+        return self.exclude(status__in=NON_WORKING_STATUSES)
+
+    def active_at(self, moment):
+        """Зміни, що йдуть у момент moment."""
+        return self.filter(PeriodContains(
+            models.F("start"), models.F("end"), models.Value(moment, output_field=models.DateTimeField())
+        ))
+
+    def overlapping(self, start, end):
+        """Зміни, що перетинаються з інтервалом [start, end)."""
+        return self.filter(PeriodOverlaps(
+            models.F("start"),
+            models.F("end"),
+            models.Value(start, output_field=models.DateTimeField()),
+            models.Value(end, output_field=models.DateTimeField()),
+        ))
+
 
 class Shift(models.Model):
     agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="shifts")
-    start = models.DateTimeField(db_index=True)
+    # Окремий індекс по start замінено покривним shift_week_cover_idx (див. Meta)
+    start = models.DateTimeField()
     end = models.DateTimeField(db_index=True)
 
-    direction = models.CharField(
-        max_length=20, choices=Direction.choices, default=Direction.CALLS
+    # У БД — smallint-коди, у Python — звичні рядкові значення choices
+    direction = CodedChoiceField(
+        choices=Direction.choices, codes=DIRECTION_CODES, default=Direction.CALLS
     )
-    status = models.CharField(
-        max_length=20, choices=ShiftStatus.choices, default=ShiftStatus.WORK
+    status = CodedChoiceField(
+        choices=ShiftStatus.choices, codes=SHIFT_STATUS_CODES, default=ShiftStatus.WORK
     )
     activity = models.CharField(max_length=100, blank=True)
     comment = models.TextField(blank=True, null=True)
 
     history = HistoricalRecords()
 
+    objects = ShiftQuerySet.as_manager()
+
     class Meta:
         ordering = ["-start"]
         indexes = [
             models.Index(fields=["agent", "start", "end"]),
+            # Тижневий розклад: діапазон по start + фільтри статусу/напрямку без звернення
+            # до таблиці (INCLUDE діє лише на PostgreSQL, деінде це звичайний індекс по start)
+            models.Index(
+                fields=["start"],
+                include=["agent", "end", "status", "direction"],
+                name="shift_week_cover_idx",
+            ),
+            # Дашборд "зараз": лише робочі зміни, що ще не закінчились
+            models.Index(
+                fields=["end", "start"],
+                condition=~models.Q(status__in=NON_WORKING_STATUSES),
+                name="shift_working_end_idx",
+            ),
+        ]
+        # Лише для PostgreSQL (міграція 0014): BRIN по start для історії і GiST по
+        # tstzrange(start, "end") для PeriodContains/PeriodOverlaps
+        constraints = [
+            # Природний ключ зміни: повторний імпорт оновлює, а не дублює. Не DEFERRABLE —
+            # на нього спирається ON CONFLICT імпорту; перестановки ключів (обміни, зсув
+            # суміжних змін) пишуться у два кроки, див. services.park_claimed_starts
+            models.UniqueConstraint(fields=["agent", "start"], name="uniq_shift_agent_start"),
+            # Перетин робочих змін агента забороняє shift_no_overlap — EXCLUDE USING gist,
+            # лише PostgreSQL (міграція 0015); див. services.save_shift
         ]
         permissions = (
             ("import_schedule", "Може імпортувати базовий розклад"),
@@ -105,6 +242,14 @@ class ShiftExchange(models.Model):
     approved = models.BooleanField(
         null=True, blank=True
     )  # None=в очікуванні, True/False=рішення
+    decided_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="decided_exchanges",
+    )
+    decided_at = models.DateTimeField(null=True, blank=True)
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
@@ -209,3 +354,38 @@ class AuditLog(models.Model):
 
     def __str__(self):
         return f"{self.timestamp:%Y-%m-%d %H:%M:%S} {self.user or 'system'} {self.action} {self.app_label}.{self.model}#{self.object_pk}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Прогрес пакетного імпорту з файлу: останній закомічений байтовий зсув і номер рядка.
+
+    Ключ — (вид імпорту, SHA-256 файлу), тож --resume продовжує саме той файл,
+    навіть якщо його перейменували або перемістили.
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "running", "Виконується"
+        DONE = "done", "Завершено"
+        FAILED = "failed", "Помилка"
+
+    kind = models.CharField(max_length=32)
+    file_hash = models.CharField(max_length=64)
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField(default=0)
+    byte_offset = models.BigIntegerField(default=0)
+    rows_done = models.BigIntegerField(default=0)
+    batches_done = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.RUNNING)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-updated_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "file_hash"], name="uniq_import_checkpoint_file"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.file_name} ({self.rows_done} рядків, {self.get_status_display()})"
@@ -0,0 +1,150 @@
+# core/normalization.py
+"""
+Єдина нормалізація імен, напрямків і статусів для всіх шляхів імпорту
+(ShiftResource, management-команди, converter.py).
+
+Модуль не залежить від Django, щоб converter.py працював як окремий скрипт.
+Таблиці аліасів будуються один раз при імпорті модуля, результати для кожного
+різного сирого значення кешуються (lru_cache), а замість print на кожен рядок
+невідомі значення накопичуються в лічильнику `warnings`.
+"""
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Значення мають збігатися з core.models.Direction / core.models.ShiftStatus
+DIRECTION_VALUES = frozenset({"calls", "tickets", "chats"})
+DEFAULT_DIRECTION = "calls"
+
+STATUS_VALUES = frozenset({
+    "work", "day_off", "vacation", "sick", "training", "meeting", "onboard", "mentor",
+})
+DEFAULT_STATUS = "work"
+
+UKRAINIAN_DIRECTION_MAP = {
+    "дзвінки": "calls",
+    "тікети": "tickets",
+    "чати": "chats",
+}
+
+# Статуси, які в Excel-графіку займають увесь день (раніше STATUS_MAP у converter.py)
+GRID_STATUS_ALIASES = {
+    "відпустка": "vacation",
+    "off": "day_off",
+    "вихідний": "day_off",
+    "лікарняний": "sick",
+    "mentor": "mentor",
+    "ментор": "mentor",
+    "менторство": "mentor",
+}
+
+_STATUS_ALIASES = {
+    **GRID_STATUS_ALIASES,
+    "day off": "day_off",
+    "vacation": "vacation",
+    "sick": "sick",
+    "training": "training",
+    "тренінг": "training",
+    "meeting": "meeting",
+    "мітинг": "meeting",
+    "onboard": "onboard",
+    "онборд": "onboard",
+    **{code: code for code in STATUS_VALUES},
+}
+_DIRECTION_ALIASES = {
+    **UKRAINIAN_DIRECTION_MAP,
+    **{code: code for code in DIRECTION_VALUES},
+}
+
+
+class NormalizationWarnings:
+    """Агреговані попередження: (вид, сире значення) -> кількість рядків."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, kind: str, raw: str) -> None:
+        self.counts[(kind, raw)] += 1
+
+    def drain(self) -> Counter:
+        counts, self.counts = self.counts, Counter()
+        return counts
+
+    @staticmethod
+    def format(counts: Counter) -> List[str]:
+        defaults = {"direction": DEFAULT_DIRECTION, "status": DEFAULT_STATUS}
+        labels = {"direction": "напрям", "status": "статус", "agent": "агента", "team_lead": "тімліда"}
+        lines = []
+        for (kind, raw), count in sorted(counts.items()):
+            label = labels.get(kind, kind)
+            if kind in defaults:
+                lines.append(
+                    f"ПОПЕРЕДЖЕННЯ: невідомий {label} '{raw}' у {count} рядках. "
+                    f"Використано значення за замовчуванням '{defaults[kind]}'."
+                )
+            else:
+                lines.append(f"ПОПЕРЕДЖЕННЯ: не знайдено {label} '{raw}' у системі ({count} рядків).")
+        return lines
+
+
+warnings = NormalizationWarnings()
+
+
+@lru_cache(maxsize=65536)
+def clean_display_name(name) -> str:
+    if not name:
+        return ""
+    return " ".join(str(name).strip().split())
+
+
+@lru_cache(maxsize=65536)
+def normalize_name(name) -> str:
+    if not name:
+        return ""
+    return clean_display_name(name).casefold()
+
+
+@lru_cache(maxsize=4096)
+def _lookup_direction(value) -> Tuple[str, Optional[str]]:
+    # (код, сире значення для попередження або None)
+    label = " ".join(str(value).strip().split()) if value else ""
+    if not label:
+        return DEFAULT_DIRECTION, None
+    mapped = _DIRECTION_ALIASES.get(label.casefold())
+    if mapped:
+        return mapped, None
+    return DEFAULT_DIRECTION, label
+
+
+@lru_cache(maxsize=4096)
+def _lookup_status(value) -> Tuple[str, Optional[str]]:
+    raw = str(value).strip() if value else ""
+    if not raw:
+        return DEFAULT_STATUS, None
+    mapped = _STATUS_ALIASES.get(raw.casefold())
+    if mapped:
+        return mapped, None
+    return DEFAULT_STATUS, raw
+
+
+def normalize_direction(value) -> str:
+    code, unknown = _lookup_direction(value)
+    if unknown is not None:
+        warnings.add("direction", unknown)
+    return code
+
+
+def normalize_status(value) -> str:
+    """Приводить статус до одного з кодів ShiftStatus, приймаючи різні варіанти написання."""
+    code, unknown = _lookup_status(value)
+    if unknown is not None:
+        warnings.add("status", unknown)
+    return code
+
+
+@lru_cache(maxsize=4096)
+def grid_status(value) -> Optional[str]:
+    """Статус на весь день для клітинки Excel-графіка або None, якщо це не статус."""
+    if not value:
+        return None
+    return GRID_STATUS_ALIASES.get(str(value).strip().casefold())
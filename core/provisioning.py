@@ -0,0 +1,239 @@
+# core/provisioning.py
+"""
+Масове створення користувачів, агентів і тімлідів зі списку (roster) з файлу.
+
+Весь roster обробляється фіксованою кількістю запитів незалежно від розміру:
+наявні користувачі/агенти (і всі username-и) читаються один раз (ProvisionState,
+спільний для всіх пачок відновлюваного імпорту), нові записи створюються через
+bulk_create (користувачі, агенти, членство в групі TL), а тімліди
+призначаються одним UPDATE ... CASE, згрупованим за тімлідом.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.text import slugify
+
+from . import normalization
+from .models import Agent
+from .usernames import UsernameAllocator
+
+
+def _to_positive_int(value) -> Optional[int]:
+    try:
+        number = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def _with_pks(objs):
+    """bulk_create на бекендах без RETURNING не заповнює pk — дочитуємо їх за унікальним ключем."""
+    if all(obj.pk for obj in objs):
+        return objs
+    model = type(objs[0])
+    if model is User:
+        ids = dict(User.objects.filter(username__in=[u.username for u in objs]).values_list("username", "pk"))
+        for user in objs:
+            user.pk = ids[user.username]
+    else:
+        ids = dict(Agent.objects.filter(user_id__in=[a.user_id for a in objs]).values_list("user_id", "pk"))
+        for agent in objs:
+            agent.pk = ids[agent.user_id]
+    return objs
+
+
+@dataclass
+class Roster:
+    """Унікальні агенти й тімліди з файлу (ключ — нормалізоване ім'я)."""
+
+    agents: Dict[str, str] = field(default_factory=dict)
+    team_leads: Dict[str, str] = field(default_factory=dict)
+    agent_to_tl: Dict[str, str] = field(default_factory=dict)
+    # Бажані ID з файлу (необов'язкові колонки)
+    agent_ids: Dict[str, int] = field(default_factory=dict)
+    agent_user_ids: Dict[str, int] = field(default_factory=dict)
+    tl_user_ids: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, agent, team_lead=None, agent_id=None, agent_user_id=None, tl_user_id=None) -> None:
+        agent_norm = normalization.normalize_name(agent)
+        if not agent_norm:
+            return
+        self.agents.setdefault(agent_norm, normalization.clean_display_name(agent))
+        if _to_positive_int(agent_id):
+            self.agent_ids.setdefault(agent_norm, _to_positive_int(agent_id))
+        if _to_positive_int(agent_user_id):
+            self.agent_user_ids.setdefault(agent_norm, _to_positive_int(agent_user_id))
+
+        tl_norm = normalization.normalize_name(team_lead)
+        if not tl_norm:
+            return
+        self.team_leads.setdefault(tl_norm, normalization.clean_display_name(team_lead))
+        self.agent_to_tl[agent_norm] = tl_norm
+        if _to_positive_int(tl_user_id):
+            self.tl_user_ids.setdefault(tl_norm, _to_positive_int(tl_user_id))
+
+
+@dataclass
+class ProvisionResult:
+    created_team_leads: int = 0
+    created_agents: int = 0
+    assigned_team_leads: int = 0
+
+
+@dataclass
+class ProvisionState:
+    """
+    Наявні користувачі/агенти за нормалізованим ім'ям, username-и і хеш пароля.
+
+    Читається один раз (load) і доповнюється provision_roster, тож пачкове
+    (відновлюване) імпортування не перечитує всю таблицю на кожну пачку.
+    Після відкату транзакції пачки стан застарілий — його треба завантажити знову.
+    """
+
+    password_hash: str
+    user_by_name: Dict[str, int] = field(default_factory=dict)
+    agent_by_name: Dict[str, int] = field(default_factory=dict)
+    current_tl: Dict[int, Optional[int]] = field(default_factory=dict)
+    usernames: Optional[UsernameAllocator] = None
+
+    @classmethod
+    def load(cls, password: Optional[str] = None) -> "ProvisionState":
+        # Хеш рахується один раз: PBKDF2 на кожного користувача — найдорожча частина імпорту
+        state = cls(password_hash=make_password(password))
+        for user in User.objects.only("id", "first_name", "last_name", "username").iterator(chunk_size=5000):
+            display = normalization.clean_display_name(user.get_full_name() or user.username)
+            state.user_by_name.setdefault(normalization.normalize_name(display), user.pk)
+
+        agents_qs = Agent.objects.select_related("user").only(
+            "id", "team_lead_id", "user__first_name", "user__last_name", "user__username"
+        )
+        for agent in agents_qs.iterator(chunk_size=5000):
+            display = normalization.clean_display_name(agent.user.get_full_name() or agent.user.username)
+            state.agent_by_name.setdefault(normalization.normalize_name(display), agent.pk)
+            state.current_tl[agent.pk] = agent.team_lead_id
+        return state
+
+    def allocator(self) -> UsernameAllocator:
+        if self.usernames is None:
+            self.usernames = UsernameAllocator.from_db()
+        return self.usernames
+
+
+def provision_roster(
+    roster: Roster,
+    password: Optional[str] = None,
+    batch_size: int = 2000,
+    state: Optional[ProvisionState] = None,
+) -> ProvisionResult:
+    """
+    Створює відсутніх тімлідів і агентів та призначає тімлідів агентам.
+
+    password=None — непридатний для входу пароль (як set_unusable_password);
+    інакше пароль хешується один раз для всіх нових користувачів.
+    state — стан з попередніх пачок (тоді password не використовується).
+    """
+    from .resources import ShiftResource
+
+    result = ProvisionResult()
+
+    with transaction.atomic():
+        if state is None:
+            state = ProvisionState.load(password)
+        password_hash = state.password_hash
+        user_by_name = state.user_by_name
+        agent_by_name = state.agent_by_name
+        current_tl = state.current_tl
+
+        new_tl_norms = [norm for norm in roster.team_leads if norm not in user_by_name]
+        new_agent_norms = [norm for norm in roster.agents if norm not in agent_by_name]
+
+        # Бажані ID з файлу використовуємо лише якщо вони вільні — по одному запиту на таблицю
+        wanted_user_ids = {roster.tl_user_ids.get(n) for n in new_tl_norms}
+        wanted_user_ids |= {roster.agent_user_ids.get(n) for n in new_agent_norms}
+        wanted_user_ids.discard(None)
+        busy_user_ids = set(User.objects.filter(pk__in=wanted_user_ids).values_list("pk", flat=True))
+        wanted_agent_ids = {roster.agent_ids.get(n) for n in new_agent_norms} - {None}
+        busy_agent_ids = set(Agent.objects.filter(pk__in=wanted_agent_ids).values_list("pk", flat=True))
+
+        usernames = state.allocator() if (new_tl_norms or new_agent_norms) else None
+
+        def build_user(norm, display, desired_id, is_staff, fallback):
+            first, last = ShiftResource._split_name(display)
+            user = User(
+                username=usernames.allocate(slugify(display, allow_unicode=True).replace("-", "_"), fallback),
+                first_name=first,
+                last_name=last,
+                password=password_hash,
+                is_staff=is_staff,
+                is_active=True,
+            )
+            if desired_id and desired_id not in busy_user_ids:
+                user.pk = desired_id
+                busy_user_ids.add(desired_id)
+            return user
+
+        if new_tl_norms:
+            tl_group, _ = Group.objects.get_or_create(name="TL")
+            ShiftResource._ensure_tl_group_permissions(tl_group)
+            tl_users = [
+                build_user(norm, roster.team_leads[norm], roster.tl_user_ids.get(norm), True, "tl")
+                for norm in new_tl_norms
+            ]
+            User.objects.bulk_create(tl_users, batch_size=batch_size)
+            tl_users = _with_pks(tl_users)
+            for norm, user in zip(new_tl_norms, tl_users):
+                user_by_name[norm] = user.pk
+            memberships = User.groups.through
+            memberships.objects.bulk_create(
+                [memberships(user_id=user.pk, group_id=tl_group.pk) for user in tl_users],
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            result.created_team_leads = len(tl_users)
+
+        if new_agent_norms:
+            agent_users = [
+                build_user(norm, roster.agents[norm], roster.agent_user_ids.get(norm), False, "agent")
+                for norm in new_agent_norms
+            ]
+            User.objects.bulk_create(agent_users, batch_size=batch_size)
+            agent_users = _with_pks(agent_users)
+            agents = []
+            for norm, user in zip(new_agent_norms, agent_users):
+                agent = Agent(user_id=user.pk)
+                desired_id = roster.agent_ids.get(norm)
+                if desired_id and desired_id not in busy_agent_ids:
+                    agent.pk = desired_id
+                    busy_agent_ids.add(desired_id)
+                agents.append(agent)
+            Agent.objects.bulk_create(agents, batch_size=batch_size)
+            for norm, agent in zip(new_agent_norms, _with_pks(agents)):
+                agent_by_name[norm] = agent.pk
+                current_tl[agent.pk] = None
+            result.created_agents = len(agents)
+
+        # Призначення тімлідів: лише змінені агенти, один UPDATE з CASE по групах тімліда
+        by_tl: Dict[int, list] = {}
+        for agent_norm, tl_norm in roster.agent_to_tl.items():
+            agent_id = agent_by_name.get(agent_norm)
+            tl_id = user_by_name.get(tl_norm)
+            if agent_id and tl_id and current_tl.get(agent_id) != tl_id:
+                by_tl.setdefault(tl_id, []).append(agent_id)
+        if by_tl:
+            changed_ids = [agent_id for agent_ids in by_tl.values() for agent_id in agent_ids]
+            result.assigned_team_leads = Agent.objects.filter(pk__in=changed_ids).update(
+                team_lead_id=Case(
+                    *[When(pk__in=agent_ids, then=Value(tl_id)) for tl_id, agent_ids in by_tl.items()],
+                    output_field=IntegerField(),
+                )
+            )
+            for tl_id, agent_ids in by_tl.items():
+                for agent_id in agent_ids:
+                    current_tl[agent_id] = tl_id
+
+    return result
+
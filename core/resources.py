@@ -1,21 +1,17 @@
 # core/resources.py
 from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget, Widget
-from .models import Shift, ShiftExchange, Agent, ShiftStatus
+from .models import Shift, ShiftExchange, Agent
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from django.utils.text import slugify
 from django.db import transaction
-from import_export.instance_loaders import CachedInstanceLoader
+from import_export.instance_loaders import ModelInstanceLoader
 # Видалено імпорти сигналів та аудиту - вони більше не потрібні
 from import_export.widgets import DateTimeWidget
 
-UKRAINIAN_DIRECTION_MAP = {
-    "дзвінки": "calls",
-    "тікети": "tickets",
-    "чати": "chats",
-}
-DEFAULT_DIRECTION = "calls"
+from . import normalization
+from .provisioning import Roster, provision_roster
+from .normalization import DEFAULT_DIRECTION, UKRAINIAN_DIRECTION_MAP  # noqa: F401 - зворотна сумісність
 
 
 # Допоміжний віджет, щоб просто читати значення без перетворень
@@ -24,6 +20,68 @@ class SimpleReadWidget(Widget):
         return value
 
 
+class ShiftNaturalKeyInstanceLoader(ModelInstanceLoader):
+    """
+    Шукає існуючі зміни за 'id' (якщо колонка є у файлі), інакше — за природним
+    ключем (agent, start). Усі можливі збіги завантажуються наперед двома запитами,
+    тож повторний імпорт того ж місяця оновлює зміни, а не створює дублікати.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.by_id = {}
+        self.by_key = {}
+        rows = self.dataset.dict
+        if not rows:
+            return
+
+        if 'id' in rows[0] and not getattr(self.resource, '_agent_header_is_id_alias', False):
+            ids = set()
+            for row in rows:
+                try:
+                    ids.add(int(str(row['id']).strip()))
+                except (TypeError, ValueError):
+                    continue
+            if ids:
+                self.by_id = self.get_queryset().in_bulk(ids)
+
+        agent_header = getattr(self.resource, '_agent_header', 'agent')
+        agent_ids, starts = set(), []
+        for row in rows:
+            agent_id = self.resource._resolve_agent_id(row.get(agent_header))
+            start = self._clean_start(row)
+            if agent_id and start:
+                agent_ids.add(agent_id)
+                starts.append(start)
+        if agent_ids:
+            qs = self.get_queryset().filter(
+                agent_id__in=agent_ids, start__gte=min(starts), start__lte=max(starts)
+            )
+            self.by_key = {(shift.agent_id, shift.start): shift for shift in qs}
+
+    def _clean_start(self, row):
+        try:
+            return self.resource.fields['start'].clean(row)
+        except Exception:
+            return None
+
+    def get_instance(self, row):
+        raw_id = row.get('id')
+        if raw_id not in (None, ''):
+            try:
+                instance = self.by_id.get(int(str(raw_id).strip()))
+            except ValueError:
+                instance = None
+            if instance is not None:
+                return instance
+        # Після before_import_row у колонці 'agent' уже ID агента
+        agent_id = self.resource._resolve_agent_id(row.get('agent'))
+        start = self._clean_start(row)
+        if not agent_id or not start:
+            return None
+        return self.by_key.get((agent_id, start))
+
+
 class ShiftResource(resources.ModelResource):
     # Поле для зв'язку Shift -> Agent.
     # Воно читатиме колонку 'agent' з CSV, але очікуватиме ID після обробки в before_import_row.
@@ -48,7 +106,8 @@ class ShiftResource(resources.ModelResource):
         model = Shift
         fields = ('id', 'agent', 'team_lead', 'start', 'end', 'direction', 'status')
         export_order = ('id', 'agent', 'team_lead', 'start', 'end', 'direction', 'status')
-        import_id_fields = ('id',)  # ДИВ. пункт 4 нижче щодо альтернативи
+        # Список, а не кортеж: файл без колонки 'id' дозволений (пошук за (agent, start))
+        import_id_fields = ['id']
 
         # --- ОПТИМІЗАЦІЯ ---
 
@@ -68,7 +127,9 @@ class ShiftResource(resources.ModelResource):
         skip_diff = True
         clean_model_instances = False
         use_transactions = True
-        instance_loader_class = CachedInstanceLoader
+        instance_loader_class = ShiftNaturalKeyInstanceLoader
+        # Експорт: queryset.iterator(chunk_size=...) замість завантаження всіх змін одразу
+        chunk_size = 2000
 
     def before_import(self, dataset, using_transactions=None, dry_run=False, **kwargs):
         """
@@ -79,6 +140,8 @@ class ShiftResource(resources.ModelResource):
         self._agent_cache.clear()
         self._team_lead_cache.clear()
         self._agent_team_lead_map = {}
+        # Попередження збираються за весь файл і друкуються одним підсумком в after_import
+        normalization.warnings.drain()
         # Яку колонку використовуємо як ідентифікатор агента
         self._agent_header = 'agent'
         self._agent_header_is_id_alias = False
@@ -170,6 +233,32 @@ class ShiftResource(resources.ModelResource):
                     if missing_ids:
                         print(f"ПОПЕРЕДЖЕННЯ: {len(missing_ids)} Agent ID відсутні у системі (приклад: {sorted(list(missing_ids))[:5]}). Такі рядки буде пропущено.")
 
+    def after_import(self, dataset, result, **kwargs):
+        for line in normalization.NormalizationWarnings.format(normalization.warnings.drain()):
+            print(line)
+        super().after_import(dataset, result, **kwargs)
+
+    def get_bulk_update_fields(self):
+        # Лише реальні поля моделі: team_lead — readonly-колонка для експорту
+        return [
+            name for name in super().get_bulk_update_fields()
+            if not self.fields[name].readonly
+        ]
+
+    def get_instance(self, instance_loader, row):
+        # Природний ключ (agent, start) працює і без колонки 'id' у файлі
+        return instance_loader.get_instance(row)
+
+    def _resolve_agent_id(self, raw_agent):
+        """ID агента з числового значення або з кешу імен, побудованого в before_import."""
+        if raw_agent is None or raw_agent == '':
+            return None
+        try:
+            agent_id = int(str(raw_agent).strip())
+        except (TypeError, ValueError):
+            return self._agent_cache.get(self._normalize_name(raw_agent))
+        return agent_id if agent_id > 0 else None
+
     def before_import_row(self, row, row_number=None, **kwargs):
         """
         Підставляє ID агента з кешу в колонку 'agent' для ForeignKeyWidget.
@@ -195,7 +284,7 @@ class ShiftResource(resources.ModelResource):
                 if normalized and normalized in self._agent_cache:
                     row['agent'] = self._agent_cache[normalized]
                 elif normalized and normalized not in self._agent_cache:
-                    print(f"ПОМИЛКА в рядку {row_number}: Не знайдено ID для агента '{name}' у кеші!")
+                    normalization.warnings.add("agent", self._clean_display_name(name))
                     row['_skip_row_reason'] = f"Agent '{name}' не існує"
                     return
                 else:
@@ -242,8 +331,7 @@ class ShiftResource(resources.ModelResource):
                     display_name = self._clean_display_name(user.get_full_name() or user.username)
                     self._team_lead_cache[self._normalize_name(display_name)] = user.pk
             if tl_normalized not in self._team_lead_cache:
-                print(
-                    f"ПОПЕРЕДЖЕННЯ: тімліда '{tl_display}' не знайдено в системі. Імпорт розкладу не створює користувачів.")
+                normalization.warnings.add("team_lead", self._clean_display_name(tl_display))
 
     # Можна видалити цей метод, якщо він був у попередній версії
     # def after_import_row(self, row, row_result, **kwargs):
@@ -251,16 +339,11 @@ class ShiftResource(resources.ModelResource):
 
     @staticmethod
     def _normalize_name(name):
-        if not name:
-            return ""
-        cleaned = ShiftResource._clean_display_name(name)
-        return " ".join(cleaned.split()).casefold()
+        return normalization.normalize_name(name)
 
     @staticmethod
     def _clean_display_name(name):
-        if not name:
-            return ""
-        return " ".join(str(name).strip().split())
+        return normalization.clean_display_name(name)
 
     @staticmethod
     def _split_name(full_name):
@@ -272,39 +355,9 @@ class ShiftResource(resources.ModelResource):
         last_name = parts[1] if len(parts) > 1 else ""
         return first_name, last_name
 
-    @staticmethod
-    def _generate_username(full_name, taken_usernames):
-        base = slugify(full_name, allow_unicode=True).replace('-', '_')
-        if not base:
-            base = "agent"
-        candidate = base
-        counter = 1
-        while candidate in taken_usernames:
-            candidate = f"{base}_{counter}"
-            counter += 1
-        taken_usernames.add(candidate)
-        return candidate
-
     @staticmethod
     def _normalize_direction(direction_value):
-        def _clean(value):
-            return " ".join(str(value).strip().split()) if value else ""
-
-        label = _clean(direction_value)
-        normalized = label.casefold()
-
-        if normalized in {"calls", "tickets", "chats"}:
-            return normalized
-
-        if normalized:
-            mapped = UKRAINIAN_DIRECTION_MAP.get(normalized)
-            if mapped:
-                return mapped
-            print(
-                f"ПОПЕРЕДЖЕННЯ: невідомий напрям '{label}'. Використовую значення за замовчуванням '{DEFAULT_DIRECTION}'.")
-            return DEFAULT_DIRECTION
-
-        return DEFAULT_DIRECTION
+        return normalization.normalize_direction(direction_value)
 
     @staticmethod
     def _normalize_status(status_value):
@@ -312,54 +365,31 @@ class ShiftResource(resources.ModelResource):
         Приводить значення статусу до одного з дозволених ShiftStatus.
         Приймає різні варіанти написання, у тому числі новий статус 'mentor'.
         """
-        if not status_value:
-            return ShiftStatus.WORK
-
-        raw = str(status_value).strip()
-        if not raw:
-            return ShiftStatus.WORK
-
-        lowered = raw.casefold()
-        alias_map = {
-            "off": ShiftStatus.DAY_OFF,
-            "day off": ShiftStatus.DAY_OFF,
-            "day_off": ShiftStatus.DAY_OFF,
-            "vacation": ShiftStatus.VACATION,
-            "відпустка": ShiftStatus.VACATION,
-            "sick": ShiftStatus.SICK,
-            "лікарняний": ShiftStatus.SICK,
-            "training": ShiftStatus.TRAINING,
-            "тренінг": ShiftStatus.TRAINING,
-            "meeting": ShiftStatus.MEETING,
-            "мітинг": ShiftStatus.MEETING,
-            "onboard": ShiftStatus.ONBOARD,
-            "онборд": ShiftStatus.ONBOARD,
-            "mentor": ShiftStatus.MENTOR,
-            "ментор": ShiftStatus.MENTOR,
-            "менторство": ShiftStatus.MENTOR,
-        }
-
-        if lowered in alias_map:
-            return alias_map[lowered]
+        return normalization.normalize_status(status_value)
 
-        # Дозволяємо пряме використання кодів Статусів (work, day_off тощо)
-        valid_values = {choice: choice for choice, _ in ShiftStatus.choices}
-        if raw in valid_values:
-            return raw
+    @staticmethod
+    def export_queryset(queryset):
+        """Агент, його користувач і тімлід — одним JOIN, без лінивих запитів на кожен рядок."""
+        return queryset.select_related("agent__user", "agent__team_lead")
 
-        lowered_map = {choice.casefold(): choice for choice in valid_values}
-        if lowered in lowered_map:
-            return lowered_map[lowered]
+    def filter_export(self, queryset, **kwargs):
+        return self.export_queryset(super().filter_export(queryset, **kwargs))
 
-        print(f"ПОПЕРЕДЖЕННЯ: невідомий статус '{raw}'. Використовую значення за замовчуванням '{ShiftStatus.WORK}'.")
-        return ShiftStatus.WORK
+    def before_export(self, queryset, **kwargs):
+        # Ім'я тімліда на експорт: team_lead_id -> відображуване ім'я
+        self._team_lead_display_memo = {}
+        super().before_export(queryset, **kwargs)
 
     def dehydrate_team_lead(self, shift):
-        tl = getattr(shift.agent, "team_lead", None)
-        if not tl:
+        tl_id = shift.agent.team_lead_id
+        if not tl_id:
             return ""
-        display = tl.get_full_name() or tl.username
-        return self._clean_display_name(display)
+        memo = self.__dict__.setdefault("_team_lead_display_memo", {})
+        display = memo.get(tl_id)
+        if display is None:
+            tl = shift.agent.team_lead
+            display = memo[tl_id] = self._clean_display_name(tl.get_full_name() or tl.username)
+        return display
 
     def skip_row(self, instance, original, row, import_validation_errors=None):
         """Пропускає рядок, якщо у before_import_row він був позначений як такий, що підлягає пропуску."""
@@ -377,7 +407,13 @@ class ShiftResource(resources.ModelResource):
         """
         required = {
             Shift: ["view_shift", "export_schedule"],
-            ShiftExchange: ["add_shiftexchange", "view_shiftexchange", "request_exchange", "view_exchange_history"],
+            ShiftExchange: [
+                "add_shiftexchange",
+                "view_shiftexchange",
+                "request_exchange",
+                "view_exchange_history",
+                "approve_exchange",
+            ],
         }
         existing = set(group.permissions.values_list("codename", flat=True))
         to_add = []
@@ -392,32 +428,6 @@ class ShiftResource(resources.ModelResource):
         if to_add:
             group.permissions.add(*to_add)
 
-    @staticmethod
-    def _allocate_username(base: str, per_base_cache: dict) -> str:
-        """Повертає вільний username з префіксом base, мінімізуючи запити і пам'ять.
-        - per_base_cache: дикт base -> set усіх зайнятих імен (тільки для цього base)
-        - запит у БД робиться лише перший раз для кожного base
-        """
-        if not base:
-            base = 'user'
-        base = base.strip()
-        used = per_base_cache.get(base)
-        if used is None:
-            # отримуємо наявні юзернейми лише для цього префіксу
-            existing = set(User.objects.filter(username__startswith=base)
-                           .values_list('username', flat=True))
-            used = existing
-            per_base_cache[base] = used
-        # підбір кандидата
-        candidate = base
-        suffix = 1
-        while candidate in used:
-            candidate = f"{base}_{suffix}"
-            suffix += 1
-        used.add(candidate)
-        return candidate
-
-
 class UsersFromScheduleResource(resources.ModelResource):
     # Читаємо сирі значення з колонок, але не записуємо їх у модель напряму
     agent_display = fields.Field(column_name='agent', attribute='agent_display', widget=SimpleReadWidget(),
@@ -458,146 +468,31 @@ class UsersFromScheduleResource(resources.ModelResource):
         idx_agent_user_id = _idx('agent_user_id', 'user_id')
         idx_tl_user_id = _idx('team_lead_id', 'team_lead_user_id', 'tl_user_id', 'tl_id')
 
-        # Підготовка нормалізованих імен без дублювання пам'яті
-        normalized_to_original = {}
-        normalized_agent_to_tl = {}
-        normalized_team_leads = {}
-        # Мапи бажаних ідентифікаторів з файлу (за нормалізованим ім'ям)
-        desired_agent_id_by_norm = {}
-        desired_agent_user_id_by_norm = {}
-        desired_tl_user_id_by_norm = {}
+        def _cell(row, idx):
+            return row[idx] if idx is not None else None
+
+        # Унікальні агенти/тімліди та бажані ID з файлу (за нормалізованим ім'ям)
+        roster = Roster()
         for row in dataset:
-            try:
-                raw_agent = row[idx_agent]
-            except Exception:
-                continue
-            if not raw_agent:
-                continue
-            agent_norm = ShiftResource._normalize_name(raw_agent)
-            if not agent_norm:
-                continue
-            normalized_to_original.setdefault(agent_norm, ShiftResource._clean_display_name(raw_agent))
-            raw_tl = row[idx_tl] if idx_tl is not None else None
-            tl_norm = ShiftResource._normalize_name(raw_tl)
-            if tl_norm:
-                normalized_agent_to_tl[agent_norm] = tl_norm
-                normalized_team_leads.setdefault(tl_norm, ShiftResource._clean_display_name(raw_tl))
-
-            # Зчитуємо бажані ID, якщо є відповідні колонки
-            def _to_int(val):
-                try:
-                    v = int(str(val).strip())
-                    return v if v > 0 else None
-                except Exception:
-                    return None
-
-            if idx_agent_id is not None:
-                desired = _to_int(row[idx_agent_id])
-                if desired:
-                    desired_agent_id_by_norm.setdefault(agent_norm, desired)
-            if idx_agent_user_id is not None:
-                desired = _to_int(row[idx_agent_user_id])
-                if desired:
-                    desired_agent_user_id_by_norm.setdefault(agent_norm, desired)
-            if tl_norm and idx_tl_user_id is not None:
-                desired = _to_int(row[idx_tl_user_id])
-                if desired:
-                    desired_tl_user_id_by_norm.setdefault(tl_norm, desired)
+            roster.add(
+                row[idx_agent],
+                _cell(row, idx_tl),
+                agent_id=_cell(row, idx_agent_id),
+                agent_user_id=_cell(row, idx_agent_user_id),
+                tl_user_id=_cell(row, idx_tl_user_id),
+            )
 
         print(
-            f"[Імпорт користувачів] Агенти у файлі: {len(normalized_to_original)} | Тімліди: {len(normalized_team_leads)}")
-
-        # Створюємо структури лише для потрібних баз юзернеймів
-        per_base_cache = {}
-
-        with transaction.atomic():
-            # Підтверджуємо/створюємо тім-лідів
-            tl_cache = {}
-            if normalized_team_leads:
-                # вже існуючі — ітеруємо без кешу пам'яті
-                for user in User.objects.only('first_name', 'last_name', 'username').iterator(chunk_size=2000):
-                    display = ShiftResource._clean_display_name(user.get_full_name() or user.username)
-                    norm = ShiftResource._normalize_name(display)
-                    if norm in normalized_team_leads and norm not in tl_cache:
-                        tl_cache[norm] = user.pk
-
-                # створюємо нових
-                new_tl = set(normalized_team_leads.keys()) - set(tl_cache.keys())
-                if new_tl:
-                    tl_group, _ = Group.objects.get_or_create(name="TL")
-                    ShiftResource._ensure_tl_group_permissions(tl_group)
-                    for norm in new_tl:
-                        original = normalized_team_leads[norm]
-                        first, last = ShiftResource._split_name(original)
-                        base = slugify(original, allow_unicode=True).replace('-', '_') or 'tl'
-                        username = ShiftResource._allocate_username(base, per_base_cache)
-                        desired_uid = desired_tl_user_id_by_norm.get(norm)
-                        # Якщо у файлі задано бажаний ID користувача — спробуємо його використати
-                        create_kwargs = dict(
-                            username=username,
-                            first_name=first,
-                            last_name=last,
-                            is_staff=True,
-                            is_active=True,
-                        )
-                        if desired_uid and not User.objects.filter(pk=desired_uid).exists():
-                            create_kwargs['id'] = desired_uid
-                        user = User.objects.create(**create_kwargs)
-                        user.set_unusable_password()
-                        user.save(update_fields=['password'])
-
-                        user.groups.add(tl_group)
-                        tl_cache[norm] = user.pk
-                print(f"[Імпорт користувачів] Готово тімлідів: {len(tl_cache)}")
-
-            # Підтверджуємо/створюємо агентів
-            agent_cache = {}
-            for agent in Agent.objects.select_related('user').only('id', 'user__first_name', 'user__last_name',
-                                                                   'user__username').iterator(chunk_size=2000):
-                display = ShiftResource._clean_display_name(agent.user.get_full_name() or agent.user.username)
-                agent_cache[ShiftResource._normalize_name(display)] = agent.pk
-
-            new_agents = set(normalized_to_original.keys()) - set(agent_cache.keys())
-            for norm in new_agents:
-                original = normalized_to_original[norm]
-                first, last = ShiftResource._split_name(original)
-                base = slugify(original, allow_unicode=True).replace('-', '_') or 'agent'
-                username = ShiftResource._allocate_username(base, per_base_cache)
-                desired_user_id = desired_agent_user_id_by_norm.get(norm)
-                user_create_kwargs = dict(
-                    username=username,
-                    first_name=first,
-                    last_name=last,
-                    is_staff=False,
-                    is_active=True,
-                )
-                if desired_user_id and not User.objects.filter(pk=desired_user_id).exists():
-                    user_create_kwargs['id'] = desired_user_id
-                user = User.objects.create(**user_create_kwargs)
-                user.set_unusable_password()
-                user.save(update_fields=['password'])
-                # Можемо також встановити бажаний ID агента, якщо задано
-                desired_agent_id = desired_agent_id_by_norm.get(norm)
-                if desired_agent_id and not Agent.objects.filter(pk=desired_agent_id).exists():
-                    agent = Agent.objects.create(id=desired_agent_id, user=user)
-                else:
-                    agent = Agent.objects.create(user=user)
-                agent_cache[norm] = agent.pk
-
-            if new_agents:
-                print(f"[Імпорт користувачів] Створено нових агентів: {len(new_agents)}")
-
-            # Призначаємо тім-лідів
-            assigned = 0
-            for agent_norm, tl_norm in normalized_agent_to_tl.items():
-                agent_id = agent_cache.get(agent_norm)
-                tl_id = tl_cache.get(tl_norm)
-                if agent_id and tl_id:
-                    updated = Agent.objects.filter(pk=agent_id).exclude(team_lead_id=tl_id).update(team_lead_id=tl_id)
-                    if updated:
-                        assigned += 1
-            if assigned:
-                print(f"[Імпорт користувачів] Оновлено тім-ліда для {assigned} агентів")
+            f"[Імпорт користувачів] Агенти у файлі: {len(roster.agents)} | Тімліди: {len(roster.team_leads)}")
+
+        # Нові користувачі отримують непридатний для входу пароль, як і раніше
+        result = provision_roster(roster)
+        if result.created_team_leads:
+            print(f"[Імпорт користувачів] Створено тімлідів: {result.created_team_leads}")
+        if result.created_agents:
+            print(f"[Імпорт користувачів] Створено нових агентів: {result.created_agents}")
+        if result.assigned_team_leads:
+            print(f"[Імпорт користувачів] Оновлено тім-ліда для {result.assigned_team_leads} агентів")
 
     def before_import_row(self, row, row_number=None, **kwargs):
         # Увесь запис зроблено в before_import. Рядки не записуємо принципово.
@@ -0,0 +1,56 @@
+# core/schedule_cache.py
+from datetime import date, datetime, timedelta
+from typing import Iterable, Set
+
+from django.core.cache import cache
+from django.utils import timezone
+
+CACHE_VERSION_KEY = "schedule_cache_version:{week}"
+CACHE_VERSION_TIMEOUT = 86400 * 7  # 7 днів
+
+
+def _to_local_date(value) -> date:
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value, timezone.get_current_timezone())
+        return value.date()
+    if hasattr(value, "date") and not isinstance(value, date):
+        return value.date()
+    return value
+
+
+def affected_weeks(dates: Iterable) -> Set[str]:
+    """Повертає ключі тижнів (ISO-дата понеділка) для набору дат.
+
+    Як і раніше, разом із тижнем дати беремо і сусідні тижні — на випадок,
+    якщо зміна перетинає межу тижня.
+    """
+    weeks = set()
+    for value in dates:
+        if value is None:
+            continue
+        local_date = _to_local_date(value)
+        week_start = local_date - timedelta(days=local_date.weekday())
+        for week_offset in (-7, 0, 7):
+            weeks.add((week_start + timedelta(days=week_offset)).isoformat())
+    return weeks
+
+
+def invalidate_schedule_weeks(dates: Iterable) -> Set[str]:
+    """Інвалідує кеш розкладу один раз на кожен залучений тиждень.
+
+    Використовує версійність кешу: збільшення версії тижня автоматично
+    інвалідує всі ключі кешу цього тижня незалежно від комбінації фільтрів.
+    """
+    weeks = affected_weeks(dates)
+    for week_param in weeks:
+        cache_version_key = CACHE_VERSION_KEY.format(week=week_param)
+        current_version = cache.get(cache_version_key, 0)
+        cache.set(cache_version_key, current_version + 1, timeout=CACHE_VERSION_TIMEOUT)
+    return weeks
+
+
+def invalidate_schedule_cache(shift_date=None):
+    """Інвалідує кеш розкладу для тижня, до якого належить дата."""
+    if shift_date:
+        invalidate_schedule_weeks([shift_date])
@@ -0,0 +1,247 @@
+# core/schedule_grid.py
+"""
+Розбір Excel-графіка планувальника: колонки A–C — тімлід / напрям / агент,
+далі по одній колонці на дату (дати в першому рядку).
+
+Правила клітинок спільні для converter.py (вивантаження у файл) і команди
+import_schedule_grid (пряме завантаження в БД):
+  * статус на весь день ("OFF", "Відпустка", ...) — зміна 00:00–24:00;
+  * "HH:MM-HH:MM" — одна зміна, кінець <= початку означає перехід через північ;
+  * "HH:MM-HH:MM, HH:MM-HH:MM" — кілька змін в один день;
+  * "HH:MM-HH:MM, Текст" — зміна з активністю (або спецстатусом, напр. "Ментор").
+
+Модуль не залежить від Django; дати повертаються наївними (локальний час графіка).
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from core.normalization import grid_status, normalize_direction
+
+TIME_RANGE_RE = re.compile(r"^\s*(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2}|24:00)\s*$")
+
+# Спеціальні текстові мітки для статусу/активності
+SPECIAL_ACTIVITY_MAP = {
+    "ментор": ("mentor", "Ментор"),
+    "менторство": ("mentor", "Ментор"),
+    "mentor": ("mentor", "Ментор"),
+}
+
+HEADER_DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%m/%d/%y", "%d.%m.%y")
+EXCEL_EPOCH = datetime(1899, 12, 30)
+# Перша колонка з датами (D)
+FIRST_DATE_COLUMN = 4
+
+
+class GridShift(NamedTuple):
+    agent: str
+    team_lead: str
+    direction: str
+    start: datetime
+    end: datetime
+    status: str
+    activity: str
+
+
+class GridError(NamedTuple):
+    row: int
+    column: int
+    agent: str
+    team_lead: str
+    date: date
+    value: str
+    message: str
+
+
+def column_letter(index: int) -> str:
+    """1 -> A, 27 -> AA (без openpyxl, щоб модуль лишався легким)."""
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def parse_time_range_on_date(range_str: str, date_obj) -> Tuple[datetime, datetime]:
+    """Парсить один інтервал часу 'HH:MM - HH:MM|24:00' в рамках конкретної дати.
+
+    Повертає (start_dt, end_dt) з урахуванням переходу через північ.
+    """
+    m = TIME_RANGE_RE.match(range_str)
+    if not m:
+        raise ValueError(f"Невірний формат часу '{range_str}'. Очікується 'HH:MM-HH:MM'.")
+
+    start_str, end_str = m.groups()
+    h_start, m_start = map(int, start_str.split(":"))
+    start_dt = datetime.combine(date_obj, time(h_start, m_start))
+
+    if end_str == "24:00":
+        end_dt = datetime.combine(date_obj + timedelta(days=1), time(0, 0))
+    else:
+        h_end, m_end = map(int, end_str.split(":"))
+        end_dt = datetime.combine(date_obj, time(h_end, m_end))
+
+    if end_dt <= start_dt:
+        end_dt += timedelta(days=1)
+    return start_dt, end_dt
+
+
+def parse_header_date(value) -> Optional[date]:
+    """Дата з клітинки заголовка: datetime, серійне число Excel або рядок.
+
+    Порожнє значення — None; нерозпізнане — ValueError з поясненням.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)) and value > 0:
+        if not 1 < value < 2958466:
+            raise ValueError(f"Значення '{value}' схоже на число, але поза межами типових дат Excel.")
+        try:
+            return (EXCEL_EPOCH + timedelta(days=value)).date()
+        except (OverflowError, ValueError) as e:
+            raise ValueError(f"Не вдалося конвертувати число '{value}' з Excel дати. {e}")
+    if not value:
+        return None
+    date_str = str(value).split(" ")[0]
+    for fmt in HEADER_DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except (ValueError, TypeError):
+            continue
+    raise ValueError(f"Не вдалося розпізнати дату '{value}'.")
+
+
+def _parse_hm(value: str) -> time:
+    hours, minutes = map(int, value.split(":"))
+    return time(hours, minutes)
+
+
+# Шаблон зміни, незалежний від дати: (початок, кінець, кінець наступного дня?, статус, активність)
+CellTemplate = Tuple[Tuple[time, time, bool, str, str], ...]
+
+
+def _range_template(range_str: str, status: str, activity: str) -> Tuple[time, time, bool, str, str]:
+    m = TIME_RANGE_RE.match(range_str)
+    if not m:
+        raise ValueError(f"Невірний формат часу '{range_str}'. Очікується 'HH:MM-HH:MM'.")
+    start_str, end_str = m.groups()
+    start_t = _parse_hm(start_str)
+    if end_str == "24:00":
+        return start_t, time(0, 0), True, status, activity
+    end_t = _parse_hm(end_str)
+    # Кінець <= початку означає перехід через північ
+    return start_t, end_t, end_t <= start_t, status, activity
+
+
+@lru_cache(maxsize=8192)
+def classify_cell(shift_raw: str) -> CellTemplate:
+    """
+    Класифікує значення клітинки один раз (результат кешується): статус на весь день,
+    інтервал, кілька інтервалів або інтервал з активністю. ValueError для невідомого формату.
+
+    У графіку ті самі значення ("09:00-18:00", "OFF") повторюються тисячі разів,
+    тож для кожної клітинки лишається тільки підставити дату (parse_cell).
+    """
+    day_status = grid_status(shift_raw)
+    if day_status:
+        return ((time(0, 0), time(0, 0), True, day_status, ""),)
+
+    # Кілька часових інтервалів через кому, напр. "12:00 - 13:00, 22:00 - 23:00"
+    segments = [seg.strip() for seg in shift_raw.split(",") if seg.strip()]
+    time_segments = [seg for seg in segments if TIME_RANGE_RE.match(seg)]
+    if len(time_segments) >= 2 and len(time_segments) == len(segments):
+        return tuple(_range_template(seg, "work", "") for seg in time_segments)
+
+    if "," in shift_raw:
+        time_part, activity_part = shift_raw.split(",", 1)
+        time_part = time_part.strip()
+        activity_part = activity_part.strip()
+        status, activity = "work", activity_part
+        special = SPECIAL_ACTIVITY_MAP.get(activity_part.lower())
+        if special:
+            special_status, activity = special
+            status = special_status or status
+        try:
+            return (_range_template(time_part, status, activity),)
+        except ValueError:
+            raise ValueError(f"Невірний формат часу '{time_part}' у записі з комою.")
+
+    try:
+        return (_range_template(shift_raw, "work", ""),)
+    except ValueError:
+        raise ValueError(
+            f"Невідомий формат значення '{shift_raw}'. "
+            f"Очікується статус, 'HH:MM-HH:MM' або 'HH:MM-HH:MM, Текст'."
+        )
+
+
+def parse_cell(shift_raw: str, date_obj) -> List[Tuple[datetime, datetime, str, str]]:
+    """Клітинка графіка -> список (start, end, status, activity); ValueError для невідомого формату."""
+    next_day = date_obj + timedelta(days=1)
+    return [
+        (
+            datetime.combine(date_obj, start_t),
+            datetime.combine(next_day if overnight else date_obj, end_t),
+            status,
+            activity,
+        )
+        for start_t, end_t, overnight, status, activity in classify_cell(shift_raw)
+    ]
+
+
+class GridReader:
+    """
+    Потоково читає рядки графіка (кортежі значень, напр. iter_rows(values_only=True)).
+
+    Перший рядок — заголовок з датами; .dates і .header_warnings доступні одразу
+    після створення. Ітерація дає GridShift; помилки клітинок передаються в on_error
+    (або збираються в .errors), щоб не зупиняти весь імпорт.
+    """
+
+    def __init__(self, rows: Iterable[tuple], on_error: Optional[Callable[[GridError], None]] = None):
+        self._rows = iter(rows)
+        self.errors: List[GridError] = []
+        self._on_error = on_error or self.errors.append
+        self.dates: List[Optional[date]] = []
+        self.header_warnings: List[str] = []
+        for col_idx, value in enumerate(next(self._rows, ()), start=1):
+            if col_idx < FIRST_DATE_COLUMN:
+                continue
+            try:
+                parsed = parse_header_date(value)
+            except ValueError as e:
+                self.header_warnings.append(f"колонка {col_idx} ({column_letter(col_idx)}1): {e}")
+                parsed = None
+            self.dates.append(parsed)
+
+    @property
+    def valid_dates(self) -> int:
+        return sum(1 for d in self.dates if d)
+
+    def __iter__(self) -> Iterator[GridShift]:
+        dates = self.dates
+        for row_idx, row in enumerate(self._rows, start=2):
+            if len(row) < FIRST_DATE_COLUMN - 1 or not row[2]:
+                continue
+            agent = str(row[2]).strip()
+            team_lead = str(row[0]).strip() if row[0] else ""
+            direction = normalize_direction(row[1])
+
+            for col_idx, (date_obj, value) in enumerate(
+                zip(dates, row[FIRST_DATE_COLUMN - 1:]), start=FIRST_DATE_COLUMN
+            ):
+                if not date_obj or value is None:
+                    continue
+                shift_raw = str(value).strip()
+                if not shift_raw:
+                    continue
+                try:
+                    parsed = parse_cell(shift_raw, date_obj)
+                except ValueError as e:
+                    self._on_error(GridError(row_idx, col_idx, agent, team_lead, date_obj, shift_raw, str(e)))
+                    continue
+                for start_dt, end_dt, status, activity in parsed:
+                    yield GridShift(agent, team_lead, direction, start_dt, end_dt, status, activity)
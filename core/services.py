@@ -1,24 +1,661 @@
-# core/services.py
-from typing import Tuple
-from .models import Shift
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
 
-def can_swap(sh1: Shift, sh2: Shift, user) -> Tuple[bool, str]:
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+
+from .models import NON_WORKING_STATUSES, Shift, ShiftExchange
+from .schedule_cache import invalidate_schedule_weeks
+
+# Статуси, які не можна віддавати/забирати в обміні
+NON_SWAPPABLE_STATUSES = frozenset({"vacation", "sick", "day_off", "mentor"})
+# Півширина типового вікна пошуку кандидатів на обмін (див. find_swap_candidates)
+SWAP_CANDIDATE_WINDOW = timedelta(days=30)
+
+# Обмеження виключення на перетин робочих змін агента (міграція 0015, лише PostgreSQL)
+SHIFT_OVERLAP_CONSTRAINT = "shift_no_overlap"
+# Природний ключ зміни (agent, start) — див. Shift.Meta
+SHIFT_KEY_CONSTRAINT = "uniq_shift_agent_start"
+SHIFT_KEY_COLUMNS = f"{Shift._meta.db_table}.agent_id, {Shift._meta.db_table}.start"
+# Тимчасові початки змін під час перестановки ключів (див. park_claimed_starts)
+PARKED_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+PARK_BATCH_SIZE = 1000
+
+
+class ShiftOverlapError(Exception):
+    """Зміна перетинається з іншою зміною того самого агента."""
+
+    def __init__(self, conflict: Optional[Shift] = None, shift: Optional[Shift] = None):
+        self.conflict = conflict
+        self.shift = shift
+        super().__init__(self.message())
+
+    def message(self, tz=None) -> str:
+        if self.conflict is None:
+            return "Перетин із існуючою зміною"
+        tz = tz or timezone.get_current_timezone()
+        start = timezone.localtime(self.conflict.start, tz)
+        end = timezone.localtime(self.conflict.end, tz)
+        return f"Перетин із існуючою зміною: {start:%d.%m %H:%M}–{end:%H:%M}"
+
+
+def find_overlap(shift: Shift, working_only: bool = True) -> Optional[Shift]:
+    """Перша зміна агента, що перетинається з shift (за замовчуванням — як у shift_no_overlap)."""
+    qs = Shift.objects.filter(agent_id=shift.agent_id).overlapping(shift.start, shift.end)
+    if working_only:
+        if shift.status in NON_WORKING_STATUSES:
+            return None
+        qs = qs.working()
+    if shift.pk is not None:
+        qs = qs.exclude(pk=shift.pk)
+    return qs.order_by("start").first()
+
+
+def save_shift(shift: Shift, update_fields=None) -> None:
+    """
+    Зберігає зміну з захистом від перетинів; при конфлікті — ShiftOverlapError.
+
+    На PostgreSQL перетин відсікає саме обмеження shift_no_overlap, тож зайвого
+    запиту перед записом немає і паралельні правки не можуть обійти перевірку.
+    На інших БД (SQLite у тестах) перевірка робиться запитом перед записом.
+    """
+    if connection.vendor != "postgresql":
+        conflict = find_overlap(shift)
+        if conflict is not None:
+            raise ShiftOverlapError(conflict)
+    try:
+        with transaction.atomic():
+            shift.save(update_fields=update_fields)
+    except IntegrityError:
+        # shift_no_overlap або uniq_shift_agent_start (той самий початок) — показуємо конфлікт
+        conflict = find_overlap(shift, working_only=False)
+        if conflict is None:
+            raise
+        raise ShiftOverlapError(conflict)
+
+
+def defer_overlap_check() -> None:
+    """Обміни переставляють агентів кількох змін одним UPDATE: перетин перевіряється на коміті."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            cur.execute(f"SET CONSTRAINTS {connection.ops.quote_name(SHIFT_OVERLAP_CONSTRAINT)} DEFERRED")
+
+
+@contextmanager
+def overlap_check_deferred():
+    """Перетини перевіряються один раз після всіх UPDATE у блоці, а не після кожного рядка."""
+    defer_overlap_check()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        if connection.vendor == "postgresql":
+            try:
+                with connection.cursor() as cur:
+                    cur.execute(f"SET CONSTRAINTS {connection.ops.quote_name(SHIFT_OVERLAP_CONSTRAINT)} IMMEDIATE")
+            except DatabaseError:
+                # Транзакцію вже перервала помилка з тіла блоку — назовні має піти саме вона
+                if not failed:
+                    raise
+
+
+def park_claimed_starts(shifts: Sequence[Shift]) -> bool:
+    """
+    Готує UPDATE, що переставляє ключі (agent, start) між змінами пачки.
+
+    uniq_shift_agent_start не можна зробити DEFERRABLE (ON CONFLICT імпорту не
+    приймає відкладені обмеження), тож БД перевіряє його після кожного рядка:
+    обмін змінами з однаковим початком чи зсув суміжних змін на слот упирається
+    в проміжний стан із двома однаковими ключами. Тому спершу зміни, чий
+    збережений ключ забирає інша зміна пачки, тимчасово відсуваються в незайнятий
+    діапазон (PARKED_START + id мікросекунд). Shift-и в пам'яті вже містять нові
+    значення; True — викликач мусить записати їх разом із полем start.
+    """
+    by_pk = {sh.pk: sh for sh in shifts if sh.pk is not None}
+    if len(by_pk) < 2:
+        return False
+    claimed = {(sh.agent_id, sh.start) for sh in by_pk.values()}
+    to_park = [
+        pk
+        for pk, agent_id, start in Shift.objects.filter(pk__in=list(by_pk)).values_list("pk", "agent_id", "start")
+        if (agent_id, start) in claimed and (by_pk[pk].agent_id, by_pk[pk].start) != (agent_id, start)
+    ]
+    if not to_park:
+        return False
+    Shift.objects.bulk_update(
+        [Shift(pk=pk, start=PARKED_START + timedelta(microseconds=pk)) for pk in to_park],
+        ["start"],
+        batch_size=PARK_BATCH_SIZE,
+    )
+    return True
+
+
+def _shift_violation_message(exc: IntegrityError) -> str:
+    """Повідомлення для порушення shift_no_overlap / uniq_shift_agent_start; "" — інша помилка."""
+    text = str(exc)
+    if SHIFT_OVERLAP_CONSTRAINT in text:
+        return "Обмін створює перетин робочих змін агента."
+    # PostgreSQL називає обмеження, SQLite — колонки
+    if SHIFT_KEY_CONSTRAINT in text or SHIFT_KEY_COLUMNS in text:
+        return "Агент уже має зміну з таким самим початком."
+    return ""
+
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    """Знімок груп користувача, який рахується один раз на запит."""
+
+    user_id: Optional[int]
+    groups: FrozenSet[str]
+    is_staff: bool = False
+    is_superuser: bool = False
+
+    @property
+    def is_agent(self) -> bool:
+        return "Agent" in self.groups
+
+
+def get_permission_snapshot(user) -> PermissionSnapshot:
+    # request.user живе рівно один запит, тож кеш на об'єкті користувача і є per-request кешем
+    snapshot = getattr(user, "_permission_snapshot", None)
+    if snapshot is None:
+        if getattr(user, "is_authenticated", False):
+            groups = frozenset(user.groups.values_list("name", flat=True))
+        else:
+            groups = frozenset()
+        snapshot = PermissionSnapshot(
+            user_id=getattr(user, "id", None),
+            groups=groups,
+            is_staff=bool(getattr(user, "is_staff", False)),
+            is_superuser=bool(getattr(user, "is_superuser", False)),
+        )
+        try:
+            user._permission_snapshot = snapshot
+        except AttributeError:
+            pass
+    return snapshot
+
+
+def _check_swap(sh1: Shift, sh2: Shift, snapshot: PermissionSnapshot) -> Tuple[bool, str]:
     # Агент може міняти лише якщо володіє хоча б однією із змін
-    if user.groups.filter(name="Agent").exists():
-        owns = (sh1.agent.user_id == user.id) or (sh2.agent.user_id == user.id)
+    if snapshot.is_agent:
+        owns = (sh1.agent.user_id == snapshot.user_id) or (sh2.agent.user_id == snapshot.user_id)
         if not owns:
             return False, "Можна міняти лише власні зміни."
 
-    # Скіли (перетин) або однаковий напрям
-    s1 = set(sh1.agent.skills or [])
-    s2 = set(sh2.agent.skills or [])
-    if s1.isdisjoint(s2) and sh1.direction != sh2.direction:
+    # Скіли (перетин бітових масок) або однаковий напрям
+    if not (sh1.agent.skills_mask & sh2.agent.skills_mask) and sh1.direction != sh2.direction:
         return False, "Скіли не збігаються та різні напрямки."
 
     # Заборонені статуси для обміну
-    non_work = {"vacation", "sick", "day_off", "mentor"}
+    non_work = NON_SWAPPABLE_STATUSES
     if sh1.status in non_work or sh2.status in non_work:
         return False, "Не можна міняти на відпустку/лікарняний/вихідний/менторство."
 
     # Перетин часу? Дозволено, але попереджай у майбутньому
     return True, ""
+
+
+def can_swap(sh1: Shift, sh2: Shift, user) -> Tuple[bool, str]:
+    return _check_swap(sh1, sh2, get_permission_snapshot(user))
+
+
+def can_swap_many(pairs: Iterable[Tuple], user) -> List[Tuple[bool, str]]:
+    """Пакетна перевірка пар змін для одного користувача.
+
+    Пари можуть містити як об'єкти Shift, так і їхні ID. Усі зміни разом з
+    агентами завантажуються одним select_related-запитом, групи користувача
+    беруться зі знімка прав. Результат вирівняний з вхідним списком пар.
+    """
+    pairs = list(pairs)
+    ids = {
+        item.pk if isinstance(item, Shift) else item
+        for pair in pairs
+        for item in pair
+    }
+    shifts = Shift.objects.select_related("agent").in_bulk(ids) if ids else {}
+    snapshot = get_permission_snapshot(user)
+
+    results = []
+    for first, second in pairs:
+        sh1 = shifts.get(first.pk if isinstance(first, Shift) else first)
+        sh2 = shifts.get(second.pk if isinstance(second, Shift) else second)
+        if sh1 is None or sh2 is None:
+            results.append((False, "Зміну не знайдено."))
+        else:
+            results.append(_check_swap(sh1, sh2, snapshot))
+    return results
+
+
+class _AgentIntervals:
+    """Відсортовані інтервали змін одного агента для швидкої перевірки перетинів.
+
+    max_ends[i] — максимальний кінець серед перших i+1 інтервалів, тож пошук
+    зупиняється, щойно жоден із попередніх інтервалів не може дотягнутися до start.
+    """
+
+    __slots__ = ("starts", "ends", "ids", "max_ends")
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r[1])
+        self.ids = [r[0] for r in rows]
+        self.starts = [r[1] for r in rows]
+        self.ends = [r[2] for r in rows]
+        self.max_ends = []
+        running = None
+        for end in self.ends:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def conflicts(self, start, end, exclude_id=None) -> bool:
+        j = bisect_left(self.starts, end) - 1
+        while j >= 0 and self.max_ends[j] > start:
+            if self.ends[j] > start and self.ids[j] != exclude_id:
+                return True
+            j -= 1
+        return False
+
+
+_EMPTY_INTERVALS = _AgentIntervals([])
+
+
+def _load_agent_intervals(agent_ids, span_start, span_end) -> Dict[int, _AgentIntervals]:
+    # Інтервали всіх змін агентів (будь-який статус) з запасом на довгі зміни — один запит
+    rows_by_agent: Dict[int, list] = {}
+    for sid, agent_id, start, end in Shift.objects.filter(
+        agent_id__in=agent_ids,
+        start__lt=span_end + timedelta(days=1),
+        end__gt=span_start - timedelta(days=1),
+    ).values_list("id", "agent_id", "start", "end"):
+        rows_by_agent.setdefault(agent_id, []).append((sid, start, end))
+    return {agent_id: _AgentIntervals(rows) for agent_id, rows in rows_by_agent.items()}
+
+
+def find_swap_candidates(
+    shift: Shift,
+    user,
+    window_start=None,
+    window_end=None,
+) -> List[Shift]:
+    """Повертає всі зміни інших агентів, з якими можна обміняти `shift`.
+
+    Правила ті самі, що й у `can_swap` (власність для групи Agent, перетин скілів
+    або однаковий напрям, заборонені статуси), плюс відсутність перетинів у графіку
+    обох агентів після обміну. Все рахується пакетно: одна вибірка кандидатів
+    (сумісність скілів — бітове AND прямо в SQL) і одна вибірка інтервалів
+    замість ORM-викликів на кожну пару.
+    """
+    if shift.status in NON_SWAPPABLE_STATUSES:
+        return []
+
+    # Типове вікно — навколо самої зміни, а не поточного моменту: інакше для
+    # змін за межами «сьогодні + 60 днів» кандидатів не знайшлося б узагалі
+    if window_start is None:
+        window_start = shift.start - SWAP_CANDIDATE_WINDOW
+    if window_end is None:
+        window_end = shift.start + SWAP_CANDIDATE_WINDOW
+
+    is_agent = get_permission_snapshot(user).is_agent
+    source_agent_id = shift.agent_id
+    source_user_id = shift.agent.user_id
+
+    candidate_rows = list(
+        Shift.objects.filter(end__gte=window_start, start__lte=window_end)
+        .exclude(agent_id=source_agent_id)
+        .exclude(status__in=NON_SWAPPABLE_STATUSES)
+        .alias(_skills_hit=F("agent__skills_mask").bitand(shift.agent.skills_mask))
+        .filter(Q(direction=shift.direction) | Q(_skills_hit__gt=0))
+        .values_list("id", "agent_id", "agent__user_id", "start", "end")
+    )
+    if is_agent and source_user_id != user.id:
+        candidate_rows = [row for row in candidate_rows if row[2] == user.id]
+    if not candidate_rows:
+        return []
+
+    agent_ids = {row[1] for row in candidate_rows}
+    agent_ids.add(source_agent_id)
+
+    intervals = _load_agent_intervals(
+        agent_ids, min(window_start, shift.start), max(window_end, shift.end)
+    )
+    source_intervals = intervals.get(source_agent_id, _EMPTY_INTERVALS)
+
+    compatible_ids = []
+    for sid, agent_id, _user_id, start, end in candidate_rows:
+        # Власник вихідної зміни забирає кандидата, власник кандидата — вихідну зміну
+        if source_intervals.conflicts(start, end, exclude_id=shift.pk):
+            continue
+        if intervals.get(agent_id, _EMPTY_INTERVALS).conflicts(shift.start, shift.end, exclude_id=sid):
+            continue
+        compatible_ids.append(sid)
+
+    if not compatible_ids:
+        return []
+    return list(
+        Shift.objects.select_related("agent", "agent__user")
+        .filter(pk__in=compatible_ids)
+        .order_by("start", "agent__user__last_name", "agent__user__first_name")
+    )
+
+
+@dataclass
+class ExchangeDecision:
+    approved: List[ShiftExchange]
+    rejected: List[ShiftExchange]
+    failed: List[Tuple[ShiftExchange, str]]
+
+
+def decide_exchanges(exchange_ids: Iterable[int], user, approve: bool) -> ExchangeDecision:
+    """Пакетно погоджує або відхиляє запити на обмін, що очікують рішення.
+
+    Усі залучені зміни блокуються одним select_for_update, кожен обмін
+    повторно перевіряється правилами can_swap на вже заблокованих даних
+    (послідовно, тож ланцюжки обмінів з однією зміною враховуються),
+    агенти міняються одним bulk_update, а кеш розкладу інвалідується
+    один раз на кожен залучений тиждень після коміту.
+    """
+    result = ExchangeDecision(approved=[], rejected=[], failed=[])
+    exchange_ids = list(exchange_ids)
+    if not exchange_ids:
+        return result
+
+    snapshot = get_permission_snapshot(user)
+    now = timezone.now()
+    exchanges = []
+    try:
+        with transaction.atomic():
+            exchanges.extend(
+                ShiftExchange.objects.select_for_update()
+                .filter(pk__in=exchange_ids, approved__isnull=True)
+                .order_by("created_at", "pk")
+            )
+            if not exchanges:
+                return result
+
+            if not approve:
+                for exchange in exchanges:
+                    exchange.approved = False
+                    exchange.decided_by = user
+                    exchange.decided_at = now
+                ShiftExchange.objects.bulk_update(exchanges, ["approved", "decided_by", "decided_at"])
+                result.rejected = exchanges
+                return result
+
+            shift_ids = {ex.from_shift_id for ex in exchanges} | {ex.to_shift_id for ex in exchanges}
+            shifts = {
+                sh.pk: sh
+                for sh in Shift.objects.select_for_update(of=("self",))
+                .select_related("agent")
+                .filter(pk__in=shift_ids)
+            }
+
+            changed = {}
+            decided = []
+            for exchange in exchanges:
+                sh1 = shifts.get(exchange.from_shift_id)
+                sh2 = shifts.get(exchange.to_shift_id)
+                if sh1 is None or sh2 is None:
+                    result.failed.append((exchange, "Зміну не знайдено."))
+                    continue
+                ok, msg = _check_swap(sh1, sh2, snapshot)
+                if not ok:
+                    result.failed.append((exchange, msg))
+                    continue
+                sh1.agent, sh2.agent = sh2.agent, sh1.agent
+                changed[sh1.pk] = sh1
+                changed[sh2.pk] = sh2
+                exchange.approved = True
+                exchange.decided_by = user
+                exchange.decided_at = now
+                decided.append(exchange)
+
+            if changed:
+                # Перетини перевіряються ще всередині блоку, а не на коміті зовнішньої
+                # транзакції (exchange_create), де помилку вже нікому перехопити
+                with overlap_check_deferred():
+                    parked = park_claimed_starts(list(changed.values()))
+                    bulk_update_with_history(
+                        list(changed.values()),
+                        Shift,
+                        ["agent", "start"] if parked else ["agent"],
+                        default_user=user,
+                        default_change_reason="Обмін змінами",
+                    )
+            if decided:
+                ShiftExchange.objects.bulk_update(decided, ["approved", "decided_by", "decided_at"])
+            result.approved = decided
+
+            affected_dates = [sh.start for sh in changed.values()]
+            transaction.on_commit(lambda: invalidate_schedule_weeks(affected_dates))
+    except IntegrityError as exc:
+        message = _shift_violation_message(exc)
+        if not message:
+            raise
+        # Обмеження змін спрацювало на записі — жоден обмін не застосовано
+        return ExchangeDecision(
+            approved=[],
+            rejected=[],
+            failed=[(exchange, message) for exchange in exchanges],
+        )
+
+    return result
+
+
+def _chain_hop_error(giver: Shift, taken: Shift) -> str:
+    """Перевіряє, чи може власник `giver` забрати зміну `taken` (правила can_swap без власності)."""
+    if giver.status in NON_SWAPPABLE_STATUSES or taken.status in NON_SWAPPABLE_STATUSES:
+        return "Не можна міняти на відпустку/лікарняний/вихідний/менторство."
+    if not (giver.agent.skills_mask & taken.agent.skills_mask) and giver.direction != taken.direction:
+        return "Скіли не збігаються та різні напрямки."
+    return ""
+
+
+def _chain_error(chain: List[Shift], snapshot: PermissionSnapshot, intervals) -> str:
+    if len(chain) < 2:
+        return "Ланцюжок має містити щонайменше дві зміни."
+    if len({sh.pk for sh in chain}) != len(chain):
+        return "Зміна не може повторюватися в ланцюжку."
+    if len({sh.agent_id for sh in chain}) != len(chain):
+        return "Кожен агент може брати участь у ланцюжку лише один раз."
+    if snapshot.is_agent and not any(sh.agent.user_id == snapshot.user_id for sh in chain):
+        return "Можна міняти лише власні зміни."
+
+    size = len(chain)
+    for idx, giver in enumerate(chain):
+        taken = chain[(idx + 1) % size]
+        error = _chain_hop_error(giver, taken)
+        if error:
+            return f"{giver.agent} → {taken.agent}: {error}"
+        agent_intervals = intervals.get(giver.agent_id, _EMPTY_INTERVALS)
+        if agent_intervals.conflicts(taken.start, taken.end, exclude_id=giver.pk):
+            return f"{giver.agent} вже має зміну, що перетинається з {taken.start:%d.%m %H:%M}."
+    return ""
+
+
+def validate_chain(chain: List[Shift], user) -> Tuple[bool, str]:
+    """Перевіряє ротацію змін: агент зміни chain[i] забирає зміну chain[i + 1],
+    агент останньої зміни — першу (A→B→C→A). Для двох змін це звичайний обмін.
+    """
+    intervals = _load_agent_intervals(
+        {sh.agent_id for sh in chain},
+        min(sh.start for sh in chain),
+        max(sh.end for sh in chain),
+    ) if chain else {}
+    error = _chain_error(chain, get_permission_snapshot(user), intervals)
+    return (False, error) if error else (True, "")
+
+
+def execute_chain(
+    shift_ids: List[int],
+    user,
+    exchange_ids: Iterable[int] = (),
+    comment: str = "",
+    require_requests: bool = False,
+) -> Tuple[bool, str]:
+    """Атомарно виконує ланцюговий обмін (див. validate_chain).
+
+    Зміни блокуються одним select_for_update, агенти переставляються одним
+    bulk_update. Запити на обмін з `exchange_ids`, які відповідають крокам
+    ланцюжка, позначаються погодженими; для решти кроків створюються нові
+    погоджені записи ShiftExchange. З require_requests=True (черга запитів)
+    кожен крок мусить мати свій запит, інакше ланцюжок не виконується.
+    """
+    shift_ids = list(shift_ids)
+    snapshot = get_permission_snapshot(user)
+    now = timezone.now()
+
+    try:
+        with transaction.atomic():
+            locked = {
+                sh.pk: sh
+                for sh in Shift.objects.select_for_update(of=("self",))
+                .select_related("agent")
+                .filter(pk__in=shift_ids)
+            }
+            if len(locked) != len(set(shift_ids)):
+                return False, "Зміну не знайдено."
+            chain = [locked[pk] for pk in shift_ids]
+            intervals = _load_agent_intervals(
+                {sh.agent_id for sh in chain},
+                min(sh.start for sh in chain),
+                max(sh.end for sh in chain),
+            )
+            error = _chain_error(chain, snapshot, intervals)
+            if error:
+                return False, error
+
+            size = len(chain)
+            hops = {(chain[idx].pk, chain[(idx + 1) % size].pk) for idx in range(size)}
+            pending = list(
+                ShiftExchange.objects.select_for_update()
+                .filter(pk__in=list(exchange_ids), approved__isnull=True)
+            )
+            covered = set()
+            for exchange in pending:
+                hop = (exchange.from_shift_id, exchange.to_shift_id)
+                if hop in hops and hop not in covered:
+                    exchange.approved = True
+                    exchange.decided_by = user
+                    exchange.decided_at = now
+                    covered.add(hop)
+            if require_requests and covered != hops:
+                return False, "Для кожного кроку ланцюжка потрібен запит на обмін, що очікує рішення."
+
+            new_agents = {chain[(idx + 1) % size].pk: chain[idx].agent for idx in range(size)}
+            for sh in chain:
+                sh.agent = new_agents[sh.pk]
+            with overlap_check_deferred():
+                parked = park_claimed_starts(chain)
+                bulk_update_with_history(
+                    chain,
+                    Shift,
+                    ["agent", "start"] if parked else ["agent"],
+                    default_user=user,
+                    default_change_reason="Ланцюговий обмін змінами",
+                )
+
+            ShiftExchange.objects.bulk_update(
+                [ex for ex in pending if ex.approved], ["approved", "decided_by", "decided_at"]
+            )
+            ShiftExchange.objects.bulk_create([
+                ShiftExchange(
+                    from_shift_id=from_id,
+                    to_shift_id=to_id,
+                    requested_by=user,
+                    approved=True,
+                    decided_by=user,
+                    decided_at=now,
+                    comment=comment,
+                )
+                for from_id, to_id in sorted(hops - covered)
+            ])
+
+            affected_dates = [sh.start for sh in chain]
+            transaction.on_commit(lambda: invalidate_schedule_weeks(affected_dates))
+    except IntegrityError as exc:
+        message = _shift_violation_message(exc)
+        if not message:
+            raise
+        return False, message
+
+    return True, ""
+
+
+@dataclass
+class ExchangeCycle:
+    shifts: List[Shift]
+    exchanges: List[ShiftExchange]
+
+
+def find_exchange_cycles(exchanges: Iterable[ShiftExchange], max_length: int = 4) -> List[ExchangeCycle]:
+    """Шукає короткі цикли серед запитів на обмін, що очікують рішення.
+
+    Кожен запит — ребро from_shift → to_shift («власник from_shift хоче to_shift»).
+    Цикл s0 → s1 → … → s0 задовольняє всі запити разом: агент зміни s[i]
+    отримує s[i + 1]. Ребра заздалегідь фільтруються правилами сумісності,
+    далі — пошук у глибину з обмеженням довжини та перевірка перетинів
+    для всіх знайдених циклів на одному наборі інтервалів.
+    """
+    exchanges = [ex for ex in exchanges if ex.approved is None]
+    shifts: Dict[int, Shift] = {}
+    for ex in exchanges:
+        shifts.setdefault(ex.from_shift_id, ex.from_shift)
+        shifts.setdefault(ex.to_shift_id, ex.to_shift)
+
+    graph: Dict[int, Dict[int, ShiftExchange]] = {}
+    for ex in exchanges:
+        giver = shifts[ex.from_shift_id]
+        taken = shifts[ex.to_shift_id]
+        if giver.agent_id == taken.agent_id or _chain_hop_error(giver, taken):
+            continue
+        graph.setdefault(giver.pk, {}).setdefault(taken.pk, ex)
+
+    found = []
+    seen = set()
+
+    def walk(path, agents):
+        tail = path[-1]
+        for nxt in graph.get(tail, {}):
+            if nxt == path[0] and len(path) >= 2:
+                key = tuple(path)
+                if key not in seen:
+                    seen.add(key)
+                    found.append(list(path))
+            elif nxt > path[0] and nxt not in path and len(path) < max_length:
+                agent_id = shifts[nxt].agent_id
+                if agent_id in agents:
+                    continue
+                walk(path + [nxt], agents | {agent_id})
+
+    # Цикл починаємо з найменшого ID, тож кожен цикл знаходиться рівно один раз
+    for start_id in sorted(graph):
+        walk([start_id], {shifts[start_id].agent_id})
+
+    if not found:
+        return []
+
+    involved = [shifts[pk] for pk in {pk for cycle in found for pk in cycle}]
+    intervals = _load_agent_intervals(
+        {sh.agent_id for sh in involved},
+        min(sh.start for sh in involved),
+        max(sh.end for sh in involved),
+    )
+    # Власність перевіряється під час створення запиту, тут — лише сумісність і перетини
+    neutral = PermissionSnapshot(user_id=None, groups=frozenset())
+    cycles = []
+    for cycle in found:
+        chain = [shifts[pk] for pk in cycle]
+        if _chain_error(chain, neutral, intervals):
+            continue
+        size = len(cycle)
+        cycles.append(ExchangeCycle(
+            shifts=chain,
+            exchanges=[graph[cycle[idx]][cycle[(idx + 1) % size]] for idx in range(size)],
+        ))
+    return cycles
@@ -0,0 +1,768 @@
+# core/shift_import.py
+"""Shift CSV import pipeline shared by the serial and parallel import paths.
+
+Rows are parsed and normalized into plain ``ShiftRow`` tuples (cheap to pickle
+between processes) and written by a single writer inside one transaction.
+"""
+import csv
+import io
+import itertools
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db import NotSupportedError, connection, transaction
+from django.utils import timezone
+
+from core import normalization
+from core.schedule_cache import invalidate_schedule_weeks
+
+REQUIRED_HEADERS = {"agent", "start", "end"}
+
+
+class ShiftRow(NamedTuple):
+    agent_id: int
+    start: datetime
+    end: datetime
+    direction: str
+    status: str
+    activity: str
+    comment: Optional[str]
+
+
+@dataclass
+class ImportStats:
+    processed: int = 0
+    created: int = 0
+    skipped_no_agent: int = 0
+    skipped_bad_time: int = 0
+    skipped_duplicate: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # (raw row, reason) pairs, collected only when keep_rejects is set
+    keep_rejects: bool = False
+    rejects: list = field(default_factory=list)
+    # (kind, raw value) -> rows, see core.normalization.warnings
+    warnings: Counter = field(default_factory=Counter)
+
+    def merge(self, other: "ImportStats") -> None:
+        self.processed += other.processed
+        self.created += other.created
+        self.skipped_no_agent += other.skipped_no_agent
+        self.skipped_bad_time += other.skipped_bad_time
+        self.skipped_duplicate += other.skipped_duplicate
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.rejects.extend(other.rejects)
+        self.warnings.update(other.warnings)
+
+
+def build_agent_map() -> Dict[str, int]:
+    """Normalized display name -> agent id, streamed to keep memory low."""
+    from core.models import Agent
+
+    agent_map: Dict[str, int] = {}
+    agents = Agent.objects.select_related("user").only(
+        "id", "user__first_name", "user__last_name", "user__username"
+    )
+    for agent in agents.iterator(chunk_size=5000):
+        display = normalization.clean_display_name(agent.user.get_full_name() or agent.user.username)
+        agent_map[normalization.normalize_name(display)] = agent.pk
+    return agent_map
+
+
+def parse_dt(value: str, tz):
+    if not value:
+        return None
+    s = str(value).strip()
+    # Try a few common formats quickly (no heavy parsers)
+    fmts = [
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%d %H:%M",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y-%m-%dT%H:%M",
+        "%d.%m.%Y %H:%M:%S",
+        "%d.%m.%Y %H:%M",
+    ]
+    for fmt in fmts:
+        try:
+            dt = datetime.strptime(s, fmt)
+            if timezone.is_naive(dt):
+                return timezone.make_aware(dt, tz)
+            return timezone.localtime(dt, tz)
+        except ValueError:
+            continue
+    # As last resort, try fromisoformat (Python 3.11 tolerant)
+    try:
+        dt = datetime.fromisoformat(s)
+        if timezone.is_naive(dt):
+            return timezone.make_aware(dt, tz)
+        return timezone.localtime(dt, tz)
+    except Exception:
+        return None
+
+
+_DMY_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})[ T](\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+
+class DateTimeParser:
+    """Datetime parser compiled for one import file.
+
+    The format is sniffed once from sample values; afterwards every value takes
+    a single fast path (``fromisoformat`` or regex slicing) and falls back to
+    the ``parse_dt`` cascade only when that fails. Naive values are localized
+    with a UTC offset cached per local date, so zone rules are consulted once
+    per day; DST transition days are still resolved through the zone itself.
+    """
+
+    ISO = "iso"
+    DMY = "dmy"
+
+    def __init__(self, tz, kind: Optional[str] = None):
+        self.tz = tz
+        self.kind = kind
+        self._offsets: Dict[date, Optional[dt_timezone]] = {}
+
+    @classmethod
+    def sniff(cls, values: Iterable, tz) -> "DateTimeParser":
+        votes = {cls.ISO: 0, cls.DMY: 0}
+        for value in values:
+            s = str(value or "").strip()
+            if not s:
+                continue
+            if _DMY_RE.match(s):
+                votes[cls.DMY] += 1
+                continue
+            try:
+                datetime.fromisoformat(s)
+            except ValueError:
+                continue
+            votes[cls.ISO] += 1
+        kind = max(votes, key=votes.get) if any(votes.values()) else None
+        return cls(tz, kind)
+
+    @classmethod
+    def from_file(cls, path: Path, delimiter: str, tz, sample_rows: int = 200) -> "DateTimeParser":
+        with path.open("r", encoding="utf-8-sig", newline="") as fh:
+            reader = csv.DictReader(fh, delimiter=delimiter)
+            reader.fieldnames = [h.strip() for h in (reader.fieldnames or [])]
+            values = []
+            for row in itertools.islice(reader, sample_rows):
+                values.extend((row.get("start"), row.get("end")))
+        return cls.sniff(values, tz)
+
+    def _parse_fast(self, s: str) -> datetime:
+        if self.kind == self.ISO:
+            return datetime.fromisoformat(s)
+        if self.kind == self.DMY:
+            match = _DMY_RE.match(s)
+            if match is None:
+                raise ValueError(s)
+            day, month, year, hour, minute, second = match.groups()
+            return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0))
+        raise ValueError(s)
+
+    def _fixed_offset(self, day: date) -> Optional[dt_timezone]:
+        # None marks a day with a DST transition: such values go through make_aware
+        try:
+            return self._offsets[day]
+        except KeyError:
+            pass
+        first = datetime.combine(day, time.min).replace(tzinfo=self.tz).utcoffset()
+        last = datetime.combine(day, time.max).replace(tzinfo=self.tz).utcoffset()
+        fixed = dt_timezone(first) if first == last else None
+        self._offsets[day] = fixed
+        return fixed
+
+    def localize(self, dt: datetime) -> datetime:
+        if timezone.is_aware(dt):
+            return timezone.localtime(dt, self.tz)
+        fixed = self._fixed_offset(dt.date())
+        if fixed is None:
+            return timezone.make_aware(dt, self.tz)
+        return dt.replace(tzinfo=fixed)
+
+    def __call__(self, value) -> Optional[datetime]:
+        if not value:
+            return None
+        s = str(value).strip()
+        try:
+            dt = self._parse_fast(s)
+        except ValueError:
+            return parse_dt(s, self.tz)
+        return self.localize(dt)
+
+
+def normalize_row(row: dict, agent_map: Dict[str, int], parse) -> Tuple[Optional[ShiftRow], Optional[str]]:
+    """Returns ``(ShiftRow, None)`` or ``(None, reason)`` where reason is a stats field name."""
+    agent_id = agent_map.get(normalization.normalize_name(row.get("agent")))
+    if not agent_id:
+        return None, "skipped_no_agent"
+
+    start_dt = parse(row.get("start"))
+    end_dt = parse(row.get("end"))
+    if not start_dt or not end_dt:
+        return None, "skipped_bad_time"
+    if end_dt <= start_dt:
+        # Assume overnight shift => add day
+        end_dt = end_dt + timedelta(days=1)
+
+    return ShiftRow(
+        agent_id=agent_id,
+        start=start_dt,
+        end=end_dt,
+        direction=normalization.normalize_direction(row.get("direction")),
+        status=normalization.normalize_status(row.get("status")),
+        activity=(row.get("activity") or "").strip(),
+        comment=(row.get("comment") or None),
+    ), None
+
+
+def rows_from_dataset(dataset, agent_map: Dict[str, int], tz, stats: ImportStats) -> List[ShiftRow]:
+    """Normalizes a whole tablib Dataset column by column (admin fast import).
+
+    Each column is read once and mapped in bulk: agents through ``agent_map``,
+    datetimes through one sniffed ``DateTimeParser`` (xlsx cells may already be
+    datetimes), direction/status through the cached normalization lookups.
+    """
+    headers = [str(header or "").strip().lower() for header in (dataset.headers or [])]
+    missing = REQUIRED_HEADERS - set(headers)
+    if missing:
+        raise ValueError(f"Missing required headers: {', '.join(sorted(missing))}")
+
+    size = len(dataset)
+
+    def column(name):
+        if name not in headers:
+            return [None] * size
+        return dataset.get_col(headers.index(name))
+
+    agents, starts, ends = column("agent"), column("start"), column("end")
+    parse = DateTimeParser.sniff(
+        [value for value in itertools.chain(starts[:200], ends[:200]) if not isinstance(value, datetime)], tz
+    )
+
+    def to_dt(value):
+        return parse.localize(value) if isinstance(value, datetime) else parse(value)
+
+    agent_ids = [agent_map.get(normalization.normalize_name(value)) for value in agents]
+    start_dts = [to_dt(value) for value in starts]
+    end_dts = [to_dt(value) for value in ends]
+    directions = [normalization.normalize_direction(value) for value in column("direction")]
+    statuses = [normalization.normalize_status(value) for value in column("status")]
+    activities = [str(value or "").strip() for value in column("activity")]
+    comments = [value or None for value in column("comment")]
+
+    rows = []
+    stats.processed += size
+    for idx in range(size):
+        agent_id, start_dt, end_dt = agent_ids[idx], start_dts[idx], end_dts[idx]
+        if not agent_id or not start_dt or not end_dt:
+            reason = "skipped_no_agent" if not agent_id else "skipped_bad_time"
+            setattr(stats, reason, getattr(stats, reason) + 1)
+            if stats.keep_rejects:
+                raw = dict(zip(headers, dataset[idx]))
+                stats.rejects.append((raw, reason.replace("skipped_", "")))
+            continue
+        if end_dt <= start_dt:
+            # Assume overnight shift => add day
+            end_dt = end_dt + timedelta(days=1)
+        rows.append(ShiftRow(
+            agent_id, start_dt, end_dt, directions[idx], statuses[idx], activities[idx], comments[idx]
+        ))
+    return rows
+
+
+def read_header(path: Path, delimiter: str) -> Tuple[List[str], int]:
+    """Returns the stripped header names and the byte offset where data rows begin."""
+    with path.open("rb") as fh:
+        raw = fh.readline()
+        data_start = fh.tell()
+    line = raw.decode("utf-8-sig")
+    headers = [h.strip() for h in next(csv.reader([line], delimiter=delimiter), [])]
+    missing = REQUIRED_HEADERS - set(headers)
+    if missing:
+        raise ValueError(f"CSV missing required headers: {', '.join(sorted(missing))}")
+    return headers, data_start
+
+
+def chunk_ranges(path: Path, data_start: int, parts: int) -> List[Tuple[int, int]]:
+    """Splits the data section into ``parts`` byte ranges aligned to line starts.
+
+    Assumes no quoted field spans several lines, which holds for schedule exports.
+    """
+    size = path.stat().st_size
+    if size <= data_start:
+        return []
+    step = max((size - data_start) // max(parts, 1), 1)
+    bounds = [data_start]
+    with path.open("rb") as fh:
+        for idx in range(1, parts):
+            target = data_start + idx * step
+            if target <= bounds[-1] or target >= size:
+                continue
+            # Move to the beginning of the next line
+            fh.seek(target - 1)
+            fh.readline()
+            position = fh.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _iter_rows(reader: Iterable[dict], agent_map, parse, stats: ImportStats) -> Iterator[ShiftRow]:
+    for row in reader:
+        stats.processed += 1
+        shift_row, reason = normalize_row(row, agent_map, parse)
+        if shift_row is None:
+            setattr(stats, reason, getattr(stats, reason) + 1)
+            if stats.keep_rejects:
+                stats.rejects.append((row, reason.replace("skipped_", "")))
+            continue
+        yield shift_row
+
+
+def iter_serial(path: Path, delimiter: str, agent_map, parse: DateTimeParser, stats: ImportStats,
+                batch_size: int = 5000) -> Iterator[List[ShiftRow]]:
+    """Streams the file in one process, yielding lists of ready rows."""
+    with path.open("r", encoding="utf-8-sig", newline="") as fh:
+        reader = csv.DictReader(fh, delimiter=delimiter)
+        reader.fieldnames = [h.strip() for h in (reader.fieldnames or [])]
+        batch: List[ShiftRow] = []
+        for shift_row in _iter_rows(reader, agent_map, parse, stats):
+            batch.append(shift_row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+# Worker state, filled once per process by _init_worker
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(path: str, delimiter: str, headers: List[str], agent_map: Dict[str, int],
+                 parse: DateTimeParser, keep_rejects: bool) -> None:
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    _WORKER_STATE.update(
+        path=path,
+        delimiter=delimiter,
+        headers=headers,
+        agent_map=agent_map,
+        parse=parse,
+        keep_rejects=keep_rejects,
+    )
+
+
+def _parse_chunk(byte_range: Tuple[int, int]) -> Tuple[List[ShiftRow], ImportStats]:
+    start, end = byte_range
+    with open(_WORKER_STATE["path"], "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    reader = csv.DictReader(
+        io.StringIO(data.decode("utf-8"), newline=""),
+        fieldnames=_WORKER_STATE["headers"],
+        delimiter=_WORKER_STATE["delimiter"],
+    )
+    stats = ImportStats(keep_rejects=_WORKER_STATE["keep_rejects"])
+    rows = list(_iter_rows(reader, _WORKER_STATE["agent_map"], _WORKER_STATE["parse"], stats))
+    # Worker-local counters travel back with the chunk result
+    stats.warnings = normalization.warnings.drain()
+    return rows, stats
+
+
+def iter_parallel(path: Path, delimiter: str, agent_map, parse: DateTimeParser, stats: ImportStats,
+                  workers: Optional[int] = None) -> Iterator[List[ShiftRow]]:
+    """Parses byte-range chunks in a process pool, yielding row lists in file order."""
+    workers = workers or os.cpu_count() or 1
+    headers, data_start = read_header(path, delimiter)
+    # A few chunks per worker keeps the pool busy when rows are uneven
+    ranges = chunk_ranges(path, data_start, workers * 4)
+    if not ranges:
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(str(path), delimiter, headers, agent_map, parse, stats.keep_rejects),
+    ) as pool:
+        for rows, chunk_stats in pool.map(_parse_chunk, ranges):
+            stats.merge(chunk_stats)
+            yield rows
+
+
+def iter_checkpointed(path: Path, delimiter: str, headers: List[str], start_offset: int, agent_map,
+                      parse: DateTimeParser, stats: ImportStats,
+                      batch_size: int = 5000) -> Iterator[Tuple[List[ShiftRow], int, int]]:
+    """Streams ``(rows, byte offset after the batch, raw lines in the batch)`` from ``start_offset``."""
+    from core.import_progress import iter_line_batches
+
+    for lines, end_offset in iter_line_batches(path, start_offset, batch_size):
+        reader = csv.DictReader(
+            io.StringIO(b"".join(lines).decode("utf-8"), newline=""),
+            fieldnames=headers,
+            delimiter=delimiter,
+        )
+        yield list(_iter_rows(reader, agent_map, parse, stats)), end_offset, len(lines)
+
+
+IMPORT_MODES = ("append", "upsert", "sync")
+# Modes handled row-by-batch by write_rows/copy_rows; "sync" goes through plan_diff
+WRITE_MODES = ("append", "upsert")
+# Fields rewritten when an upsert hits an existing (agent, start)
+UPSERT_FIELDS = ("end", "direction", "status", "activity", "comment")
+
+
+def _dedupe(rows: List[ShiftRow]) -> Dict[Tuple[int, datetime], ShiftRow]:
+    # Last row wins for repeated (agent, start) keys within a batch
+    return {(row.agent_id, row.start): row for row in rows}
+
+
+def _existing_by_key(keyed: Dict[Tuple[int, datetime], ShiftRow]) -> Dict[Tuple[int, datetime], tuple]:
+    """One range query per batch: (agent_id, start) -> current values of UPSERT_FIELDS."""
+    from core.models import Shift
+
+    if not keyed:
+        return {}
+    starts = [start for _, start in keyed]
+    existing = Shift.objects.filter(
+        agent_id__in={agent_id for agent_id, _ in keyed},
+        start__gte=min(starts),
+        start__lte=max(starts),
+    ).values_list("agent_id", "start", *UPSERT_FIELDS)
+    return {(values[0], values[1]): tuple(values[2:]) for values in existing}
+
+
+def write_rows(batches: Iterable[List[ShiftRow]], batch_size: int = 5000, mode: str = "append") -> ImportStats:
+    """Single writer: all batches are written inside one transaction.
+
+    ``append`` inserts rows whose (agent, start) is new and counts the rest as
+    duplicates. ``upsert`` additionally rewrites existing shifts whose values
+    differ, via ``bulk_create(update_conflicts=True)``; identical rows are not
+    touched. Schedule cache is bumped for the written weeks after commit.
+    """
+    from core.models import Shift
+
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unsupported import mode: {mode}")
+
+    stats = ImportStats()
+    touched_dates = set()
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cur:
+                cur.execute("SET LOCAL synchronous_commit = OFF")
+        for rows in batches:
+            keyed = _dedupe(rows)
+            stats.skipped_duplicate += len(rows) - len(keyed)
+            existing = _existing_by_key(keyed)
+
+            to_write = []
+            for key, row in keyed.items():
+                current = existing.get(key)
+                if current is None:
+                    stats.created += 1
+                elif mode == "append":
+                    stats.skipped_duplicate += 1
+                    continue
+                elif current == tuple(getattr(row, field) for field in UPSERT_FIELDS):
+                    stats.unchanged += 1
+                    continue
+                else:
+                    stats.updated += 1
+                to_write.append(Shift(**row._asdict()))
+                touched_dates.add(row.start.date())
+
+            if not to_write:
+                continue
+            # bulk_create avoids signals/history overhead => much faster and less memory
+            if mode == "upsert":
+                Shift.objects.bulk_create(
+                    to_write,
+                    batch_size=batch_size,
+                    update_conflicts=True,
+                    unique_fields=["agent", "start"],
+                    update_fields=list(UPSERT_FIELDS),
+                )
+            else:
+                Shift.objects.bulk_create(to_write, batch_size=batch_size)
+
+        if touched_dates:
+            transaction.on_commit(lambda: invalidate_schedule_weeks(touched_dates))
+    return stats
+
+
+def write_checkpointed(batches: Iterable[Tuple[List[ShiftRow], int, int]], checkpointer,
+                       batch_size: int = 5000, mode: str = "append", progress=None) -> ImportStats:
+    """Commits every batch separately, together with the checkpoint's byte offset.
+
+    A crash loses at most the batch in flight; ``--resume`` restarts right after
+    the last committed one. Used with ``iter_checkpointed``.
+    """
+    stats = ImportStats()
+    for rows, end_offset, line_count in batches:
+        with transaction.atomic():
+            stats.merge(write_rows([rows], batch_size=batch_size, mode=mode))
+            checkpointer.advance(line_count, end_offset)
+        if progress is not None:
+            progress.update(line_count, end_offset)
+    return stats
+
+
+COPY_COLUMNS = ("agent_id", "start", "end", "direction", "status", "activity", "comment")
+
+
+def _copy_values(rows: Iterable[ShiftRow]) -> Iterator[ShiftRow]:
+    """COPY bypasses the ORM, so direction/status are encoded to their smallint codes here."""
+    from core.models import Shift
+
+    encode_direction = Shift._meta.get_field("direction").get_prep_value
+    encode_status = Shift._meta.get_field("status").get_prep_value
+    for row in rows:
+        yield row._replace(direction=encode_direction(row.direction), status=encode_status(row.status))
+
+
+def _copy_into(cursor, table: str, rows: Iterable[ShiftRow]) -> None:
+    """Streams rows through ``COPY ... FROM STDIN`` (psycopg 3, falling back to psycopg2)."""
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(col) for col in COPY_COLUMNS)
+    raw = cursor.cursor
+    if hasattr(raw, "copy"):
+        with raw.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for row in _copy_values(rows):
+                copy.write_row(row)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in _copy_values(rows):
+        writer.writerow([
+            row.agent_id,
+            row.start.isoformat(),
+            row.end.isoformat(),
+            row.direction,
+            row.status,
+            row.activity,
+            r"\N" if row.comment is None else row.comment,
+        ])
+    buffer.seek(0)
+    raw.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def _staging_insert_sql(mode: str) -> str:
+    """INSERT ... SELECT from the staging table; the last file row wins per (agent, start).
+
+    COPY fills ``rownum`` in file order, so ``rownum DESC`` makes DISTINCT ON keep
+    the same row as ``write_rows`` (which dedupes with a dict, last row wins).
+    """
+    from core.models import Shift
+
+    qn = connection.ops.quote_name
+    target = qn(Shift._meta.db_table)
+    columns = ", ".join(qn(col) for col in COPY_COLUMNS)
+    staged_columns = ", ".join(f"s.{qn(col)}" for col in COPY_COLUMNS)
+    if mode == "upsert":
+        assignments = ", ".join(f"{qn(col)} = EXCLUDED.{qn(col)}" for col in UPSERT_FIELDS)
+        current = ", ".join(f"t.{qn(col)}" for col in UPSERT_FIELDS)
+        incoming = ", ".join(f"EXCLUDED.{qn(col)}" for col in UPSERT_FIELDS)
+        on_conflict = (
+            f"ON CONFLICT (agent_id, start) DO UPDATE SET {assignments} "
+            f"WHERE ({current}) IS DISTINCT FROM ({incoming})"
+        )
+    else:
+        on_conflict = "ON CONFLICT (agent_id, start) DO NOTHING"
+    # xmax = 0 only for freshly inserted tuples, so one statement reports both counts
+    return (
+        f"INSERT INTO {target} AS t ({columns}) "
+        f"SELECT DISTINCT ON (s.agent_id, s.start) {staged_columns} "
+        f"FROM shift_import_staging s "
+        f"ORDER BY s.agent_id, s.start, s.rownum DESC "
+        f"{on_conflict} "
+        f"RETURNING (t.xmax = 0) AS inserted, t.start"
+    )
+
+
+def copy_rows(batches: Iterable[List[ShiftRow]], mode: str = "append") -> ImportStats:
+    """PostgreSQL-only loader: COPY into a temp staging table, then one INSERT ... SELECT.
+
+    Repeated (agent, start) keys within the file are collapsed with DISTINCT ON
+    (last row in file order wins, as in ``write_rows``); conflicts with existing
+    shifts are resolved by ``ON CONFLICT`` — skipped in ``append`` mode,
+    rewritten (only when values differ) in ``upsert`` mode.
+    """
+    if connection.vendor != "postgresql":
+        raise NotSupportedError("COPY import requires PostgreSQL.")
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unsupported import mode: {mode}")
+
+    stats = ImportStats()
+    staged = 0
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("SET LOCAL synchronous_commit = OFF")
+        cur.execute(
+            "CREATE TEMP TABLE shift_import_staging ("
+            "agent_id bigint NOT NULL, start timestamptz NOT NULL, \"end\" timestamptz NOT NULL, "
+            "direction smallint NOT NULL, status smallint NOT NULL, "
+            "activity varchar(100) NOT NULL, comment text, "
+            "rownum bigint GENERATED ALWAYS AS IDENTITY"
+            ") ON COMMIT DROP"
+        )
+        for rows in batches:
+            _copy_into(cur, "shift_import_staging", rows)
+            staged += len(rows)
+        cur.execute("SELECT COUNT(DISTINCT (agent_id, start)) FROM shift_import_staging")
+        distinct = cur.fetchone()[0]
+        cur.execute(_staging_insert_sql(mode))
+        written = cur.fetchall()
+        touched_dates = {start.date() for _, start in written}
+        if touched_dates:
+            transaction.on_commit(lambda: invalidate_schedule_weeks(touched_dates))
+
+    stats.created = sum(1 for inserted, _ in written if inserted)
+    stats.updated = len(written) - stats.created
+    if mode == "upsert":
+        stats.unchanged = distinct - len(written)
+        stats.skipped_duplicate = staged - distinct
+    else:
+        stats.skipped_duplicate = staged - len(written)
+    return stats
+
+
+@dataclass
+class ImportPlan:
+    """Minimal write set that turns the stored schedule into the file's schedule."""
+
+    inserts: List[ShiftRow]
+    updates: List[tuple]  # (stored Shift, ShiftRow with new values)
+    deletes: list  # stored Shift instances
+    unchanged: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.inserts or self.updates or self.deletes)
+
+    def affected_dates(self) -> set:
+        dates = {row.start.date() for row in self.inserts}
+        for shift, row in self.updates:
+            dates.update((shift.start.date(), row.start.date()))
+        dates.update(shift.start.date() for shift in self.deletes)
+        return dates
+
+
+def plan_diff(rows: Iterable[ShiftRow], tz) -> ImportPlan:
+    """Diffs file rows against stored shifts in one query.
+
+    Scope is the file's local date range and the agents present in the file:
+    stored shifts in that scope missing from the file become deletes, rows
+    with a new (agent, start) become inserts, and rows whose values differ
+    become updates.
+    """
+    from core.models import Shift
+
+    keyed = _dedupe(list(rows))
+    if not keyed:
+        return ImportPlan(inserts=[], updates=[], deletes=[])
+
+    local_dates = [timezone.localtime(start, tz).date() for _, start in keyed]
+    range_start = timezone.make_aware(datetime.combine(min(local_dates), datetime.min.time()), tz)
+    range_end = timezone.make_aware(
+        datetime.combine(max(local_dates) + timedelta(days=1), datetime.min.time()), tz
+    )
+    existing = {
+        (shift.agent_id, shift.start): shift
+        for shift in Shift.objects.filter(
+            agent_id__in={agent_id for agent_id, _ in keyed},
+            start__gte=range_start,
+            start__lt=range_end,
+        ).only("id", "agent_id", "start", *UPSERT_FIELDS)
+    }
+
+    plan = ImportPlan(inserts=[], updates=[], deletes=[])
+    for key, row in keyed.items():
+        shift = existing.pop(key, None)
+        if shift is None:
+            plan.inserts.append(row)
+        elif tuple(getattr(shift, field) for field in UPSERT_FIELDS) == tuple(
+            getattr(row, field) for field in UPSERT_FIELDS
+        ):
+            plan.unchanged += 1
+        else:
+            plan.updates.append((shift, row))
+    plan.deletes = sorted(existing.values(), key=lambda shift: (shift.start, shift.agent_id))
+    return plan
+
+
+def plan_for_mode(rows: Iterable[ShiftRow], tz, mode: str) -> ImportPlan:
+    """``plan_diff`` trimmed to what ``mode`` writes: append only inserts, upsert never deletes."""
+    plan = plan_diff(rows, tz)
+    if mode != "sync":
+        plan.deletes = []
+    if mode == "append":
+        plan.unchanged += len(plan.updates)
+        plan.updates = []
+    return plan
+
+
+def format_plan(plan: ImportPlan, tz, limit: int = 20) -> List[str]:
+    """Human-readable preview: up to ``limit`` inserts (+), updates (~) and deletes (-)."""
+    def fmt(agent_id, start, end):
+        return (
+            f"agent={agent_id} {timezone.localtime(start, tz):%Y-%m-%d %H:%M}"
+            f"-{timezone.localtime(end, tz):%H:%M}"
+        )
+
+    lines = []
+    for row in plan.inserts[:limit]:
+        lines.append(f"  + {fmt(row.agent_id, row.start, row.end)} {row.direction}/{row.status}")
+    for shift, row in plan.updates[:limit]:
+        lines.append(
+            f"  ~ {fmt(shift.agent_id, shift.start, shift.end)} {shift.direction}/{shift.status}"
+            f" -> {fmt(row.agent_id, row.start, row.end)} {row.direction}/{row.status}"
+        )
+    for shift in plan.deletes[:limit]:
+        lines.append(f"  - {fmt(shift.agent_id, shift.start, shift.end)} {shift.direction}/{shift.status}")
+    return lines
+
+
+def apply_plan(plan: ImportPlan, batch_size: int = 5000) -> None:
+    """Applies a plan with bulk_create / bulk_update / one DELETE ... IN, in one transaction."""
+    from core.models import Shift
+
+    if plan.is_empty:
+        return
+    with transaction.atomic():
+        if plan.deletes:
+            Shift.objects.filter(pk__in=[shift.pk for shift in plan.deletes]).delete()
+        if plan.updates:
+            changed = []
+            for shift, row in plan.updates:
+                for field in UPSERT_FIELDS:
+                    setattr(shift, field, getattr(row, field))
+                changed.append(shift)
+            Shift.objects.bulk_update(changed, list(UPSERT_FIELDS), batch_size=batch_size)
+        if plan.inserts:
+            Shift.objects.bulk_create(
+                [Shift(**row._asdict()) for row in plan.inserts], batch_size=batch_size
+            )
+        dates = plan.affected_dates()
+        transaction.on_commit(lambda: invalidate_schedule_weeks(dates))
+
+
+def write_rejects(path: Path, rejects: List[Tuple[dict, str]], headers: List[str]) -> None:
+    """Writes rejected rows with their original values plus a ``reason`` column."""
+    with path.open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=[*headers, "reason"], extrasaction="ignore")
+        writer.writeheader()
+        for row, reason in rejects:
+            writer.writerow({**row, "reason": reason})
@@ -0,0 +1,572 @@
+# core/shift_mutations.py
+"""
+Спільна логіка правок розкладу для AJAX: розбір часу, права, валідація полів,
+перевірка перетинів і запис.
+
+edit_shifts застосовує пачку правок як одне ціле: зміни й агенти читаються
+одним запитом, перетини перевіряються разом (на PostgreSQL — обмеженням
+shift_no_overlap, деінде — одним запитом на всю пачку), запис — один
+bulk_update з історією та аудитом, кеш розкладу інвалідується раз на тиждень
+після коміту. Повертаються вже оновлені об'єкти — без повторного читання з БД.
+apply_operations робить те саме для змішаної пачки create/update/delete,
+clone_week — копіює тиждень розкладу на наступні тижні.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from . import audit
+from .models import NON_WORKING_STATUSES, Agent, AuditAction, Direction, Shift, ShiftStatus
+from .schedule_cache import invalidate_schedule_weeks
+from .services import ShiftOverlapError, overlap_check_deferred, park_claimed_starts
+
+VALID_STATUSES = frozenset(ShiftStatus.values)
+VALID_DIRECTIONS = frozenset(Direction.values)
+# Скільки правок/операцій приймає один пакетний запит
+MAX_BATCH_EDITS = 500
+
+
+class ShiftMutationError(Exception):
+    """Некоректна правка; status — HTTP-код відповіді."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class ShiftBatchError(Exception):
+    """Пачку не застосовано: помилка для кожної правки, що її зупинила."""
+
+    def __init__(self, errors: Dict[object, ShiftMutationError]):
+        super().__init__("; ".join(f"{key}: {error.message}" for key, error in errors.items()))
+        self.errors = errors
+
+    @property
+    def status(self) -> int:
+        statuses = {error.status for error in self.errors.values()}
+        return statuses.pop() if len(statuses) == 1 else 400
+
+    def as_dict(self) -> Dict[str, str]:
+        return {str(key): error.message for key, error in self.errors.items()}
+
+
+# --- Розбір часу ---
+
+def parse_hm(value) -> Optional[Tuple[int, int]]:
+    try:
+        hours, minutes = str(value).split(":", 1)
+        return int(hours), int(minutes)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_start_time(value) -> time:
+    hm = parse_hm(value)
+    if not hm or not (0 <= hm[0] < 24) or not (0 <= hm[1] < 60):
+        raise ShiftMutationError("Invalid start_time")
+    return time(*hm)
+
+
+def parse_end_time(value) -> Optional[time]:
+    """Кінець зміни 'HH:MM'; None означає 24:00."""
+    hm = parse_hm(value)
+    if not hm or not (0 <= hm[0] <= 24) or not (0 <= hm[1] < 60) or (hm[0] == 24 and hm[1] != 0):
+        raise ShiftMutationError("Invalid end_time")
+    return None if hm[0] == 24 else time(*hm)
+
+
+def parse_day(value) -> date:
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except ValueError:
+        raise ShiftMutationError("Invalid date")
+
+
+def local_interval(day: date, start_t: time, end_t: Optional[time], tz) -> Tuple[datetime, datetime]:
+    """[start, end) на локальну дату; кінець 24:00 або не пізніше початку — наступного дня."""
+    start = timezone.make_aware(datetime.combine(day, start_t), tz)
+    if end_t is None:
+        return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time(0)), tz)
+    end = timezone.make_aware(datetime.combine(day, end_t), tz)
+    if end <= start:
+        end = timezone.make_aware(datetime.combine(day + timedelta(days=1), end_t), tz)
+    return start, end
+
+
+def new_shift_interval(data: Mapping, day: date, tz) -> Tuple[datetime, datetime]:
+    """Інтервал нової зміни з start_time/end_time запиту (обидва обов'язкові)."""
+    start_time = data.get("start_time")
+    end_time = data.get("end_time")
+    if not start_time or not end_time:
+        raise ShiftMutationError("Missing time")
+    return local_interval(day, parse_start_time(start_time), parse_end_time(end_time), tz)
+
+
+def choice_or_default(value, valid, default):
+    return value if value in valid else default
+
+
+# --- Права ---
+
+def _is_team_lead(user, agent) -> bool:
+    return bool(agent is not None and agent.team_lead_id and agent.team_lead_id == user.id)
+
+
+def user_can_edit(user, agent) -> bool:
+    """Редагувати/видаляти: суперкористувач, персонал, core.change_shift або тімлід агента."""
+    if user.is_superuser or user.is_staff or user.has_perm("core.change_shift"):
+        return True
+    return _is_team_lead(user, agent)
+
+
+def user_can_add(user, agent) -> bool:
+    """Додавати зміни: суперкористувач, персонал, core.add_shift або тімлід агента."""
+    if user.is_superuser or user.is_staff or user.has_perm("core.add_shift"):
+        return True
+    return _is_team_lead(user, agent)
+
+
+# --- Валідація правок ---
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def clean_edit(shift: Shift, data: Mapping, tz, agents: Optional[Mapping[int, Agent]] = None) -> dict:
+    """
+    Поля для оновлення зміни з даних запиту: status, direction, comment, start_time, end_time,
+    а для перетягування в сітці ще date і agent_id. Порожні значення ігноруються.
+
+    Без end_time кінець лишається тим самим моментом; при перенесенні на іншу дату
+    зберігається тривалість зміни.
+    """
+    updates = {}
+    status = data.get("status")
+    if status is not None and status != "":
+        if status not in VALID_STATUSES:
+            raise ShiftMutationError("Invalid status")
+        updates["status"] = status
+
+    direction = data.get("direction")
+    if direction is not None and direction != "":
+        if direction not in VALID_DIRECTIONS:
+            raise ShiftMutationError("Invalid direction")
+        updates["direction"] = direction
+
+    if "comment" in data:
+        raw_comment = data.get("comment")
+        updates["comment"] = raw_comment if (raw_comment is None or isinstance(raw_comment, str)) else str(raw_comment)
+
+    raw_agent = data.get("agent_id")
+    if raw_agent is not None and raw_agent != "":
+        agent = (agents or {}).get(_int_or_none(raw_agent))
+        if agent is None:
+            raise ShiftMutationError("Agent not found", status=404)
+        if agent.pk != shift.agent_id:
+            updates["agent"] = agent
+
+    start_time = data.get("start_time")
+    end_time = data.get("end_time")
+    raw_day = data.get("date")
+    if start_time or end_time or raw_day:
+        start_local = timezone.localtime(shift.start, tz)
+        day = parse_day(raw_day) if raw_day else start_local.date()
+        start_t = parse_start_time(start_time) if start_time else start_local.time()
+        if end_time:
+            new_start, new_end = local_interval(day, start_t, parse_end_time(end_time), tz)
+        else:
+            new_start = timezone.make_aware(datetime.combine(day, start_t), tz)
+            new_end = new_start + (shift.end - shift.start) if raw_day else timezone.localtime(shift.end, tz)
+        if not new_start < new_end:
+            raise ShiftMutationError("Start must be before end")
+        updates["start"] = new_start
+        updates["end"] = new_end
+    return updates
+
+
+# --- Перетини ---
+
+def find_conflicts(shifts: Sequence[Shift], ignore_ids: Iterable[int] = ()) -> List[Tuple[Shift, Shift]]:
+    """
+    Пари (зміна з пачки, зміна того самого агента, з якою вона конфліктує):
+    перетин двох робочих змін (shift_no_overlap) або однаковий початок будь-яких
+    змін (uniq_shift_agent_start). Збережені зміни читаються одним запитом на всю
+    пачку; конфлікти всередині пачки теж враховуються. ignore_ids — зміни, яких
+    після пачки вже не буде (видалені).
+    """
+    if not shifts:
+        return []
+    stored = (
+        Shift.objects.filter(agent_id__in={sh.agent_id for sh in shifts})
+        .overlapping(min(sh.start for sh in shifts), max(sh.end for sh in shifts))
+        .exclude(pk__in=[*ignore_ids, *(sh.pk for sh in shifts if sh.pk is not None)])
+        .only("id", "agent_id", "start", "end", "status")
+    )
+    pending = {id(sh) for sh in shifts}
+    by_agent = defaultdict(list)
+    for sh in [*stored, *shifts]:
+        by_agent[sh.agent_id].append(sh)
+
+    conflicts = []
+    for agent_shifts in by_agent.values():
+        agent_shifts.sort(key=lambda sh: sh.start)
+        for idx, sh in enumerate(agent_shifts):
+            for other in agent_shifts[idx + 1:]:
+                if other.start >= sh.end:
+                    break
+                both_working = sh.status not in NON_WORKING_STATUSES and other.status not in NON_WORKING_STATUSES
+                if not both_working and other.start != sh.start:
+                    continue
+                # Конфлікт двох змін з пачки — помилка для обох
+                if id(sh) in pending:
+                    conflicts.append((sh, other))
+                if id(other) in pending:
+                    conflicts.append((other, sh))
+    return conflicts
+
+
+def _raise_conflicts(conflicts, key: Callable[[Shift], object]) -> None:
+    errors = {}
+    for shift, conflict in conflicts:
+        errors.setdefault(key(shift), ShiftMutationError(ShiftOverlapError(conflict, shift).message()))
+    if errors:
+        raise ShiftBatchError(errors)
+
+
+# --- Запис ---
+
+def _stage_update(shift: Shift, updates: dict) -> dict:
+    """Застосовує оновлення до об'єкта в пам'яті; повертає знімок полів для аудиту."""
+    before = audit.field_values(shift)
+    for name, value in updates.items():
+        setattr(shift, name, value)
+    return before
+
+
+def _write(
+    changed: Sequence[Tuple[Shift, dict]],
+    fields: Iterable[str],
+    created: Sequence[Shift],
+    deleted: Sequence[Shift],
+    touched: Iterable[datetime],
+    user,
+    key: Callable[[Shift], object],
+    batch_size: Optional[int] = None,
+    prechecked: bool = False,
+) -> None:
+    """
+    Записує пачку в одній транзакції: видалення, один bulk_update і один bulk_create
+    з історією, аудит двома INSERT, інвалідація кешу раз на тиждень після коміту.
+    changed — пари (зміна з уже застосованими оновленнями, знімок до них);
+    prechecked — перетини вже перевірені викликачем.
+    """
+    pending = [shift for shift, _before in changed] + list(created)
+    deleted_ids = [shift.pk for shift in deleted]
+    if connection.vendor != "postgresql" and not prechecked:
+        _raise_conflicts(find_conflicts(pending, deleted_ids), key)
+    try:
+        with transaction.atomic():
+            with overlap_check_deferred():
+                if deleted_ids:
+                    Shift.objects.filter(pk__in=deleted_ids).delete()
+                if changed:
+                    updated = [shift for shift, _before in changed]
+                    # Зсув суміжних змін: ключі (agent, start) переходять між змінами пачки
+                    if park_claimed_starts(updated):
+                        fields = {*fields, "start"}
+                    bulk_update_with_history(
+                        updated,
+                        Shift,
+                        sorted(fields),
+                        batch_size=batch_size,
+                        default_user=user,
+                    )
+                if created:
+                    bulk_create_with_history(created, Shift, batch_size=batch_size, default_user=user)
+            audit.log_bulk(AuditAction.UPDATE, [(shift, audit.diff_values(before, shift)) for shift, before in changed])
+            audit.log_bulk(AuditAction.CREATE, [(shift, audit.creation_changes(shift)) for shift in created])
+            # Старий і новий тиждень кожної зміни — один раз після коміту
+            touched = list(touched)
+            transaction.on_commit(lambda: invalidate_schedule_weeks(touched))
+    except IntegrityError:
+        conflicts = find_conflicts(pending, deleted_ids)
+        if not conflicts:
+            raise
+        _raise_conflicts(conflicts, key)
+
+
+def _loaded_shift(shifts: Mapping[int, Shift], raw_id, seen: set, user) -> Shift:
+    shift = shifts.get(_int_or_none(raw_id))
+    if shift is None:
+        raise ShiftMutationError("Shift not found", status=404)
+    if shift.pk in seen:
+        raise ShiftMutationError("Duplicate shift in batch")
+    seen.add(shift.pk)
+    if not user_can_edit(user, shift.agent):
+        raise ShiftMutationError("Forbidden", status=403)
+    return shift
+
+
+def _clean_update(shift: Shift, data: Mapping, user, tz, agents: Mapping[int, Agent]) -> dict:
+    updates = clean_edit(shift, data, tz, agents)
+    if "agent" in updates and not user_can_edit(user, updates["agent"]):
+        raise ShiftMutationError("Forbidden", status=403)
+    return updates
+
+
+def _clean_create(data: Mapping, user, tz, agents: Mapping[int, Agent]) -> Shift:
+    agent = agents.get(_int_or_none(data.get("agent_id")))
+    if agent is None:
+        raise ShiftMutationError("Agent not found", status=404)
+    if not user_can_add(user, agent):
+        raise ShiftMutationError("Forbidden", status=403)
+    if not data.get("date"):
+        raise ShiftMutationError("date is required")
+    start, end = new_shift_interval(data, parse_day(data["date"]), tz)
+    return Shift(
+        agent=agent,
+        start=start,
+        end=end,
+        direction=choice_or_default(data.get("direction"), VALID_DIRECTIONS, Direction.CALLS),
+        status=choice_or_default(data.get("status"), VALID_STATUSES, ShiftStatus.WORK),
+        comment=data.get("comment"),
+    )
+
+
+def _load_agents(items: Iterable[Mapping]) -> Dict[int, Agent]:
+    agent_ids = {_int_or_none(data.get("agent_id")) for data in items if data.get("agent_id")}
+    agent_ids.discard(None)
+    return Agent.objects.in_bulk(agent_ids) if agent_ids else {}
+
+
+def _edit_loaded(shifts: Mapping[int, Shift], edits: Sequence[Tuple[int, Mapping]], user, tz) -> List[Shift]:
+    agents = _load_agents(data for _shift_id, data in edits)
+    errors = {}
+    changed = []
+    fields = set()
+    touched = []
+    seen = set()
+    for shift_id, data in edits:
+        try:
+            shift = _loaded_shift(shifts, shift_id, seen, user)
+            updates = _clean_update(shift, data, user, tz, agents)
+        except ShiftMutationError as exc:
+            errors[shift_id] = exc
+            continue
+        if not updates:
+            continue
+        touched.append(shift.start)
+        changed.append((shift, _stage_update(shift, updates)))
+        touched.append(shift.start)
+        fields.update(updates)
+    if errors:
+        raise ShiftBatchError(errors)
+    if changed:
+        _write(changed, fields, [], [], touched, user, key=lambda sh: sh.pk)
+    return [shift for shift, _before in changed]
+
+
+def edit_shifts(edits: Sequence[Tuple[int, Mapping]], user, tz=None) -> List[Shift]:
+    """
+    Пакетна правка [(shift_id, дані), ...]: або всі правки, або жодної (ShiftBatchError
+    з помилкою для кожної зміни). Повертає змінені об'єкти.
+    """
+    tz = tz or timezone.get_current_timezone()
+    shifts = Shift.objects.select_related("agent").in_bulk([shift_id for shift_id, _data in edits])
+    return _edit_loaded(shifts, edits, user, tz)
+
+
+def edit_shift(shift: Shift, data: Mapping, user, tz=None) -> bool:
+    """Одна правка вже завантаженої зміни; False — змінювати нічого."""
+    tz = tz or timezone.get_current_timezone()
+    return bool(_edit_loaded({shift.pk: shift}, [(shift.pk, data)], user, tz))
+
+
+def apply_operations(ops: Sequence[Mapping], user, tz=None) -> List[Tuple[str, Shift]]:
+    """
+    Пакет операцій сітки розкладу в одній транзакції:
+      {"op": "create", "agent_id", "date", "start_time", "end_time", ...}
+      {"op": "update", "id", ...поля як у clean_edit}
+      {"op": "delete", "id"}
+    Зміни й агенти читаються двома запитами, перетини перевіряються одним проходом
+    для всієї пачки (з урахуванням видалених і нових змін). Або всі операції, або
+    жодної: ShiftBatchError з ключами — індексами операцій. Повертає (op, зміна)
+    у порядку операцій; для create — вже з id.
+    """
+    tz = tz or timezone.get_current_timezone()
+    shift_ids = {_int_or_none(op.get("id")) for op in ops if op.get("op") in ("update", "delete")}
+    shift_ids.discard(None)
+    shifts = Shift.objects.select_related("agent").in_bulk(shift_ids) if shift_ids else {}
+    agents = _load_agents(ops)
+
+    errors = {}
+    results = []
+    index_of = {}
+    changed, fields, created, deleted, touched = [], set(), [], [], []
+    seen = set()
+    for idx, op in enumerate(ops):
+        kind = op.get("op")
+        try:
+            if kind == "create":
+                shift = _clean_create(op, user, tz, agents)
+                created.append(shift)
+            elif kind in ("update", "delete"):
+                shift = _loaded_shift(shifts, op.get("id"), seen, user)
+                touched.append(shift.start)
+                if kind == "delete":
+                    deleted.append(shift)
+                else:
+                    updates = _clean_update(shift, op, user, tz, agents)
+                    if updates:
+                        changed.append((shift, _stage_update(shift, updates)))
+                        fields.update(updates)
+            else:
+                raise ShiftMutationError("Unknown op")
+        except ShiftMutationError as exc:
+            errors[idx] = exc
+            continue
+        touched.append(shift.start)
+        index_of[id(shift)] = idx
+        results.append((kind, shift))
+    if errors:
+        raise ShiftBatchError(errors)
+    if changed or created or deleted:
+        _write(changed, fields, created, deleted, touched, user, key=lambda sh: index_of[id(sh)])
+    return results
+
+
+# --- Клонування тижня ---
+
+# Розмір пачки INSERT при клонуванні
+CLONE_BATCH_SIZE = 1000
+# Скільки тижнів можна заповнити за один раз
+MAX_CLONE_WEEKS = 26
+
+
+@dataclass
+class CloneResult:
+    created: List[Shift]
+    # (копія, зміна, з якою вона конфліктує; None — збіг за агентом і початком)
+    skipped: List[Tuple[Shift, Optional[Shift]]]
+    weeks: List[date]
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _shift_wall_clock(value: datetime, days: int, tz) -> datetime:
+    """Той самий місцевий час через days днів — з урахуванням переходу на літній/зимовий час."""
+    local = timezone.localtime(value, tz).replace(tzinfo=None)
+    return timezone.make_aware(local + timedelta(days=days), tz)
+
+
+def _clone_key(shift: Shift, tz) -> str:
+    # Агент і місцевий початок: кілька змін агента за день (діапазони з графіка) — окремі ключі
+    return f"{shift.agent_id}:{timezone.localtime(shift.start, tz):%Y-%m-%dT%H:%M}"
+
+
+def clone_week(
+    source: date,
+    targets: Iterable[date],
+    shifts=None,
+    user=None,
+    tz=None,
+    skip_conflicts: bool = True,
+    dry_run: bool = False,
+) -> CloneResult:
+    """
+    Копіює зміни тижня source на тижні targets (будь-які дати всередині тижнів).
+
+    shifts — queryset-джерело (наприклад, ShiftFilter(...).qs), за замовчуванням усі зміни.
+    Зсув за місцевим часом: 09:00–17:00 лишається 09:00–17:00 і після переходу годинника.
+    Копії, що перетинаються з робочими змінами агента (правила shift_no_overlap) або
+    збігаються з наявною зміною за агентом і початком, пропускаються; з
+    skip_conflicts=False операція зупиняється (ShiftBatchError, ключі
+    "agent_id:YYYY-MM-DDTHH:MM" — місцевий початок копії).
+    Запис — bulk_create пачками по CLONE_BATCH_SIZE з історією й аудитом, кеш
+    інвалідується раз на тиждень.
+    """
+    tz = tz or timezone.get_current_timezone()
+    source = week_start(source)
+    weeks = sorted({week_start(day) for day in targets} - {source})
+    if not weeks:
+        return CloneResult([], [], [])
+
+    week_lo = timezone.make_aware(datetime.combine(source, time(0)), tz)
+    week_hi = timezone.make_aware(datetime.combine(source + timedelta(days=7), time(0)), tz)
+    base = shifts if shifts is not None else Shift.objects.all()
+    originals = list(base.filter(start__gte=week_lo, start__lt=week_hi).order_by("agent_id", "start"))
+
+    clones = []
+    for target in weeks:
+        days = (target - source).days
+        for original in originals:
+            clones.append(Shift(
+                agent_id=original.agent_id,
+                start=_shift_wall_clock(original.start, days, tz),
+                end=_shift_wall_clock(original.end, days, tz),
+                direction=original.direction,
+                status=original.status,
+                activity=original.activity,
+                comment=original.comment,
+            ))
+    if not clones:
+        return CloneResult([], [], weeks)
+
+    # Конфлікти: перетини — одним запитом у find_conflicts, збіги (агент, початок) — ще одним
+    conflicts = {}
+    for clone, other in find_conflicts(clones):
+        conflicts.setdefault(id(clone), (clone, other))
+    taken = set(
+        Shift.objects.filter(
+            agent_id__in={clone.agent_id for clone in clones},
+            start__gte=min(clone.start for clone in clones),
+            start__lte=max(clone.start for clone in clones),
+        ).values_list("agent_id", "start")
+    )
+    for clone in clones:
+        if (clone.agent_id, clone.start) in taken:
+            conflicts.setdefault(id(clone), (clone, None))
+
+    skipped = list(conflicts.values())
+    if skipped and not skip_conflicts:
+        raise ShiftBatchError({
+            _clone_key(clone, tz): ShiftMutationError(ShiftOverlapError(other, clone).message(tz))
+            for clone, other in skipped
+        })
+    created = [clone for clone in clones if id(clone) not in conflicts]
+    if created and not dry_run:
+        _write(
+            [], [], created, [], weeks, user,
+            key=lambda sh: _clone_key(sh, tz),
+            batch_size=CLONE_BATCH_SIZE,
+            prechecked=True,
+        )
+    return CloneResult(created, skipped, weeks)
+
+
+def shift_payload(shift: Shift, tz=None) -> dict:
+    """Клітинка розкладу для відповіді AJAX — з об'єкта в пам'яті, без повторного запиту."""
+    tz = tz or timezone.get_current_timezone()
+    start_local = timezone.localtime(shift.start, tz)
+    end_local = timezone.localtime(shift.end, tz)
+    return {
+        "id": shift.id,
+        "agent_id": shift.agent_id,
+        "date": start_local.date().isoformat(),
+        "status": shift.status,
+        "direction": shift.direction,
+        "start_time": start_local.strftime("%H:%M"),
+        "end_time": end_local.strftime("%H:%M"),
+        "comment": shift.comment or "",
+    }
@@ -0,0 +1,149 @@
+import csv
+import importlib.util
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+import openpyxl
+from django.test import SimpleTestCase
+
+import converter
+
+ROWS = [
+    {
+        "agent": "Іван Петренко",
+        "team_lead": "Марія",
+        "start": datetime(2025, 3, 29, 22, 0),
+        "end": datetime(2025, 3, 30, 6, 0),
+        "direction": "chats",
+        "status": "work",
+        "activity": "",
+    },
+    {
+        "agent": "Олена Коваль",
+        "team_lead": "Марія",
+        "start": datetime(2025, 3, 30, 0, 0),
+        "end": datetime(2025, 3, 31, 0, 0),
+        "direction": "calls",
+        "status": "day_off",
+        "activity": "",
+    },
+]
+
+
+def expected_rows():
+    return [
+        [
+            "", row["agent"], row["team_lead"],
+            row["start"].strftime("%Y-%m-%d %H:%M"), row["end"].strftime("%Y-%m-%d %H:%M"),
+            row["direction"], row["status"], row["activity"], "",
+        ]
+        for row in ROWS
+    ]
+
+
+class OutputWriterRoundTripTests(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.basename = str(Path(tmp_dir.name) / "export")
+
+    def _write(self, output_format):
+        writer = converter.OutputWriter(output_format, self.basename)
+        for row in ROWS:
+            writer.write_row(row)
+        writer.close()
+        self.assertEqual(writer.rows_written, len(ROWS))
+        return writer.filepath
+
+    def test_xlsx_round_trip(self):
+        path = self._write("xlsx")
+
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        rows = [["" if value is None else value for value in row] for row in workbook["export"].iter_rows(values_only=True)]
+        workbook.close()
+        self.assertEqual(rows, [converter.HEADERS] + expected_rows())
+
+    def test_csv_round_trip(self):
+        path = self._write("csv")
+
+        with open(path, encoding="utf-8-sig", newline="") as fh:
+            rows = list(csv.reader(fh, delimiter=converter.CSV_DELIMITER))
+        self.assertEqual(rows, [converter.HEADERS] + expected_rows())
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+
+        path = self._write("parquet")
+
+        table = pq.read_table(path)
+        self.assertEqual(table.column_names, converter.HEADERS)
+        self.assertEqual([list(row.values()) for row in table.to_pylist()], expected_rows())
+
+
+class SheetWorkerTests(SimpleTestCase):
+    def test_worker_streams_shifts_through_a_temp_file(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["TL", "Напрям", "Агент", datetime(2025, 3, 29), datetime(2025, 3, 30)])
+        workbook.active.append(["Марія", "Чати", "Іван Петренко", "09:00-13:00, 14:00-18:00", "OFF"])
+        path = str(Path(tmp_dir.name) / "march.xlsx")
+        workbook.save(path)
+
+        result = converter._convert_sheet((path, workbook.active.title, tmp_dir.name))
+
+        self.assertEqual(result.shift_count, 3)
+        self.assertTrue(Path(result.shifts_file).exists())
+        shifts = list(converter._read_sheet_shifts(result))
+        self.assertEqual(
+            [(shift.start, shift.end, shift.status) for shift in shifts],
+            [
+                (datetime(2025, 3, 29, 9), datetime(2025, 3, 29, 13), "work"),
+                (datetime(2025, 3, 29, 14), datetime(2025, 3, 29, 18), "work"),
+                (datetime(2025, 3, 30), datetime(2025, 3, 31), "day_off"),
+            ],
+        )
+        self.assertFalse(Path(result.shifts_file).exists())
+
+
+@unittest.skipUnless(importlib.util.find_spec("unidecode"), "unidecode is not installed")
+class ConvertBatchTests(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp = Path(tmp_dir.name)
+
+    def _workbook(self, name, agent, shift):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["TL", "Напрям", "Агент", datetime(2025, 3, 29), datetime(2025, 3, 30)])
+        sheet.append(["Марія", "Чати", agent, shift, "OFF"])
+        path = self.tmp / name
+        workbook.save(path)
+        return str(path)
+
+    def test_two_files_are_written_in_input_order(self):
+        first = self._workbook("march.xlsx", "Іван Петренко", "09:00-18:00")
+        second = self._workbook("april.xlsx", "Олена Коваль", "22:00-06:00")
+        basename = str(self.tmp / "batch")
+
+        with redirect_stdout(StringIO()):
+            converter.convert_batch([first, second], basename, output_format="csv", workers=1)
+
+        with open(f"{basename}.csv", encoding="utf-8-sig", newline="") as fh:
+            rows = list(csv.DictReader(fh, delimiter=converter.CSV_DELIMITER))
+        self.assertEqual(
+            [(row["agent"], row["start"], row["end"], row["status"]) for row in rows],
+            [
+                ("Іван Петренко", "2025-03-29 09:00", "2025-03-29 18:00", "work"),
+                ("Іван Петренко", "2025-03-30 00:00", "2025-03-31 00:00", "day_off"),
+                ("Олена Коваль", "2025-03-29 22:00", "2025-03-30 06:00", "work"),
+                ("Олена Коваль", "2025-03-30 00:00", "2025-03-31 00:00", "day_off"),
+            ],
+        )
+        self.assertEqual({row["direction"] for row in rows}, {"chats"})
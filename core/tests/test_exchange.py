@@ -78,7 +78,32 @@ class ExchangeTests(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn("не належить", form.errors.get("from_shift", [""])[0])
 
-    def test_view_exchanges_shifts_successfully(self):
+    def test_view_creates_pending_exchange(self):
+        self.client.login(username="exchanger", password="pass1234")
+        response = self.client.post(
+            reverse("exchange_create"),
+            data={
+                "from_agent": self.agent_a.pk,
+                "from_shift": self.shift_a.pk,
+                "to_agent": self.agent_b.pk,
+                "to_shift": self.shift_b.pk,
+            },
+            follow=True,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.shift_a.refresh_from_db()
+        self.shift_b.refresh_from_db()
+        self.assertEqual(self.shift_a.agent, self.agent_a)
+        self.assertEqual(self.shift_b.agent, self.agent_b)
+
+        exchange = ShiftExchange.objects.latest("created_at")
+        self.assertIsNone(exchange.approved)
+        self.assertEqual(exchange.from_shift, self.shift_a)
+        self.assertEqual(exchange.to_shift, self.shift_b)
+
+    def test_view_exchanges_shifts_for_approver(self):
+        self.user_with_perm.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
         self.client.login(username="exchanger", password="pass1234")
         response = self.client.post(
             reverse("exchange_create"),
@@ -99,8 +124,127 @@ class ExchangeTests(TestCase):
 
         exchange = ShiftExchange.objects.latest("created_at")
         self.assertTrue(exchange.approved)
-        self.assertEqual(exchange.from_shift, self.shift_a)
-        self.assertEqual(exchange.to_shift, self.shift_b)
+        self.assertEqual(exchange.decided_by, self.user_with_perm)
+
+    def test_failed_auto_approval_leaves_no_pending_request(self):
+        from unittest import mock
+
+        from core import views
+        from core.services import ExchangeDecision
+
+        self.user_with_perm.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
+        self.client.login(username="exchanger", password="pass1234")
+        data = {
+            "from_agent": self.agent_a.pk,
+            "from_shift": self.shift_a.pk,
+            "to_agent": self.agent_b.pk,
+            "to_shift": self.shift_b.pk,
+        }
+
+        def failing(exchange_ids, user, approve):
+            exchange = ShiftExchange.objects.get(pk=list(exchange_ids)[0])
+            return ExchangeDecision(approved=[], rejected=[], failed=[(exchange, "Зміну вже змінено.")])
+
+        with mock.patch.object(views, "decide_exchanges", side_effect=failing):
+            response = self.client.post(reverse("exchange_create"), data=data, follow=True)
+        self.assertContains(response, "Зміну вже змінено.")
+        self.assertFalse(ShiftExchange.objects.exists())
+
+        with mock.patch.object(views, "decide_exchanges", side_effect=RuntimeError("boom")):
+            response = self.client.post(reverse("exchange_create"), data=data, follow=True)
+        self.assertContains(response, "Не вдалося виконати обмін")
+        self.assertFalse(ShiftExchange.objects.exists())
+
+    def test_same_start_conflict_fails_the_decision(self):
+        approver = User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        approver.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
+        # Вихідний агента A з тим самим початком, що й зміна B: забрати її A не може
+        Shift.objects.create(
+            agent=self.agent_a, start=self.shift_b.start, end=self.shift_b.end, status=ShiftStatus.DAY_OFF
+        )
+        exchange = ShiftExchange.objects.create(
+            from_shift=self.shift_a, to_shift=self.shift_b, requested_by=self.user_with_perm
+        )
+        self.client.login(username="lead", password="pass1234")
+
+        response = self.client.post(
+            reverse("exchange_queue"), data={"action": "approve", "exchange_ids": [exchange.pk]}, follow=True
+        )
+
+        self.assertContains(response, "таким самим початком")
+        exchange.refresh_from_db()
+        self.assertIsNone(exchange.approved)
+        self.shift_b.refresh_from_db()
+        self.assertEqual(self.shift_b.agent, self.agent_b)
+
+        exchange.delete()
+        self.client.login(username="exchanger", password="pass1234")
+        self.user_with_perm.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
+        response = self.client.post(
+            reverse("exchange_create"),
+            data={
+                "from_agent": self.agent_a.pk,
+                "from_shift": self.shift_a.pk,
+                "to_agent": self.agent_b.pk,
+                "to_shift": self.shift_b.pk,
+            },
+            follow=True,
+        )
+
+        self.assertContains(response, "таким самим початком")
+        self.assertFalse(ShiftExchange.objects.exists())
+        self.shift_a.refresh_from_db()
+        self.assertEqual(self.shift_a.agent, self.agent_a)
+
+    def test_queue_bulk_approve_and_reject(self):
+        approver = User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        approver.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
+        to_approve = ShiftExchange.objects.create(
+            from_shift=self.shift_a, to_shift=self.shift_b, requested_by=self.user_with_perm
+        )
+        to_reject = ShiftExchange.objects.create(
+            from_shift=self.shift_b, to_shift=self.shift_a, requested_by=self.user_with_perm
+        )
+        self.client.login(username="lead", password="pass1234")
+
+        response = self.client.get(reverse("exchange_queue"))
+        self.assertContains(response, f'value="{to_approve.pk}"')
+
+        self.client.post(reverse("exchange_queue"), data={"action": "reject", "exchange_ids": [to_reject.pk]})
+        self.client.post(reverse("exchange_queue"), data={"action": "approve", "exchange_ids": [to_approve.pk]})
+
+        to_approve.refresh_from_db()
+        to_reject.refresh_from_db()
+        self.assertTrue(to_approve.approved)
+        self.assertFalse(to_reject.approved)
+        self.shift_a.refresh_from_db()
+        self.assertEqual(self.shift_a.agent, self.agent_b)
+
+    def test_queue_approves_same_start_exchange(self):
+        approver = User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        approver.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
+        Shift.objects.filter(pk=self.shift_b.pk).update(start=self.shift_a.start, end=self.shift_a.end)
+        exchange = ShiftExchange.objects.create(
+            from_shift=self.shift_a, to_shift=self.shift_b, requested_by=self.user_with_perm
+        )
+        self.client.login(username="lead", password="pass1234")
+
+        response = self.client.post(
+            reverse("exchange_queue"), data={"action": "approve", "exchange_ids": [exchange.pk]}
+        )
+
+        self.assertEqual(response.status_code, 302)
+        exchange.refresh_from_db()
+        self.assertTrue(exchange.approved)
+        self.shift_a.refresh_from_db()
+        self.shift_b.refresh_from_db()
+        self.assertEqual((self.shift_a.agent, self.shift_b.agent), (self.agent_b, self.agent_a))
+        self.assertEqual(self.shift_a.start, self.shift_b.start)
+
+    def test_queue_requires_approve_permission(self):
+        self.client.login(username="exchanger", password="pass1234")
+        response = self.client.get(reverse("exchange_queue"))
+        self.assertEqual(response.status_code, 403)
 
     def test_view_prevents_invalid_swap(self):
         self.client.login(username="exchanger", password="pass1234")
@@ -138,3 +282,254 @@ class ExchangeTests(TestCase):
             },
         )
         self.assertEqual(response.status_code, 403)
+
+
+class SwapCandidateTests(TestCase):
+    def setUp(self):
+        tz = timezone.get_current_timezone()
+        self.base_start = timezone.make_aware(
+            datetime.combine(timezone.localdate() + timedelta(days=1), time(9, 0)), tz
+        )
+        self.staff = User.objects.create_user(username="planner", password="pass1234", is_staff=True)
+        self.agent_a = Agent.objects.create(user=User.objects.create_user(username="cand_a"), skills=["calls"])
+        self.agent_b = Agent.objects.create(user=User.objects.create_user(username="cand_b"), skills=["calls"])
+        self.agent_c = Agent.objects.create(user=User.objects.create_user(username="cand_c"), skills=["chats"])
+
+        self.source = self._shift(self.agent_a, days=0, direction="calls")
+        self.compatible = self._shift(self.agent_b, days=1, direction="calls")
+
+    def _shift(self, agent, days, direction="calls", status=ShiftStatus.WORK, hours=8):
+        start = self.base_start + timedelta(days=days)
+        return Shift.objects.create(
+            agent=agent,
+            start=start,
+            end=start + timedelta(hours=hours),
+            direction=direction,
+            status=status,
+        )
+
+    def test_finds_compatible_shift(self):
+        from core.services import find_swap_candidates
+
+        ids = [sh.id for sh in find_swap_candidates(self.source, self.staff)]
+        self.assertEqual(ids, [self.compatible.id])
+
+    def test_default_window_follows_source_shift(self):
+        from core.services import find_swap_candidates
+
+        source = self._shift(self.agent_a, days=120)
+        near = self._shift(self.agent_b, days=121)
+        self._shift(self.agent_b, days=200)
+
+        ids = [sh.id for sh in find_swap_candidates(source, self.staff)]
+        self.assertEqual(ids, [near.id])
+
+    def test_same_start_candidate_can_be_swapped(self):
+        from core.services import decide_exchanges, find_swap_candidates
+
+        same_start = self._shift(self.agent_b, days=0)
+
+        # Зміну з днем 1 B віддати вже не може: тоді він мав би дві зміни в день 0
+        ids = [sh.id for sh in find_swap_candidates(self.source, self.staff)]
+        self.assertEqual(ids, [same_start.id])
+
+        exchange = ShiftExchange.objects.create(from_shift=self.source, to_shift=same_start, requested_by=self.staff)
+        decision = decide_exchanges([exchange.pk], self.staff, approve=True)
+        self.assertEqual(decision.approved, [exchange])
+        self.source.refresh_from_db()
+        same_start.refresh_from_db()
+        self.assertEqual((self.source.agent, same_start.agent), (self.agent_b, self.agent_a))
+
+    def test_skips_incompatible_and_conflicting_shifts(self):
+        from core.services import find_swap_candidates
+
+        # Інший напрям і жодного спільного скіла
+        self._shift(self.agent_c, days=2, direction="chats")
+        # Заборонений статус
+        self._shift(self.agent_b, days=3, status=ShiftStatus.VACATION)
+        # Агент A вже працює в цей час — забрати цю зміну не зможе
+        self._shift(self.agent_a, days=4)
+        self._shift(self.agent_b, days=4)
+
+        ids = [sh.id for sh in find_swap_candidates(self.source, self.staff)]
+        self.assertEqual(ids, [self.compatible.id])
+
+    def test_endpoint_returns_candidates(self):
+        self.client.login(username="planner", password="pass1234")
+        response = self.client.get(reverse("ajax_exchange_candidates"), {"shift_id": self.source.pk})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIsNone(data["error"])
+        self.assertEqual([c["id"] for c in data["candidates"]], [self.compatible.id])
+
+
+class SkillMaskTests(TestCase):
+    def test_mask_follows_skills_and_filters_in_sql(self):
+        calls = Agent.objects.create(user=User.objects.create_user(username="m_calls"), skills=["calls"])
+        both = Agent.objects.create(user=User.objects.create_user(username="m_both"), skills=["chats", "tickets"])
+        self.assertNotEqual(calls.skills_mask, 0)
+
+        both.skills = ["calls"]
+        both.save(update_fields=["skills"])
+        both.refresh_from_db()
+        self.assertEqual(both.skills_mask, calls.skills_mask)
+
+        found = set(Agent.objects.with_any_skills(["calls", "chats"]).values_list("id", flat=True))
+        self.assertEqual(found, {calls.id, both.id})
+        self.assertFalse(Agent.objects.with_any_skills(["tickets"]).exists())
+
+
+class BatchSwapValidationTests(TestCase):
+    def test_can_swap_many_uses_one_query_for_shifts(self):
+        from django.contrib.auth.models import Group
+        from core.services import can_swap_many
+
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), time(9, 0)), tz)
+        user = User.objects.create_user(username="batch_agent")
+        user.groups.add(Group.objects.create(name="Agent"))
+        own = Agent.objects.create(user=user, skills=["calls"])
+        other = Agent.objects.create(user=User.objects.create_user(username="batch_other"), skills=["calls"])
+        third = Agent.objects.create(user=User.objects.create_user(username="batch_third"), skills=["calls"])
+        mine = Shift.objects.create(agent=own, start=start, end=start + timedelta(hours=8))
+        theirs = Shift.objects.create(agent=other, start=start, end=start + timedelta(hours=8))
+        foreign = Shift.objects.create(agent=third, start=start, end=start + timedelta(hours=8))
+
+        # 1 запит на групи користувача + 1 запит на всі зміни з агентами
+        with self.assertNumQueries(2):
+            results = can_swap_many([(mine.pk, theirs.pk), (theirs, foreign), (mine.pk, 0)], user)
+
+        self.assertEqual(results[0], (True, ""))
+        self.assertEqual(results[1], (False, "Можна міняти лише власні зміни."))
+        self.assertFalse(results[2][0])
+
+
+class ChainExchangeTests(TestCase):
+    def setUp(self):
+        tz = timezone.get_current_timezone()
+        base = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time(9, 0)), tz)
+        self.lead = User.objects.create_user(username="chain_lead", password="pass1234", is_staff=True)
+        self.lead.user_permissions.add(Permission.objects.get(codename="approve_exchange"))
+        self.agents = [
+            Agent.objects.create(user=User.objects.create_user(username=f"chain_{idx}"), skills=["calls"])
+            for idx in range(3)
+        ]
+        self.shifts = [
+            Shift.objects.create(
+                agent=agent,
+                start=base + timedelta(days=idx),
+                end=base + timedelta(days=idx, hours=8),
+                direction="calls",
+            )
+            for idx, agent in enumerate(self.agents)
+        ]
+        # A хоче зміну B, B — зміну C, C — зміну A
+        self.exchanges = [
+            ShiftExchange.objects.create(
+                from_shift=self.shifts[idx], to_shift=self.shifts[(idx + 1) % 3], requested_by=self.lead
+            )
+            for idx in range(3)
+        ]
+
+    def test_finds_cycle_among_pending_requests(self):
+        from core.services import find_exchange_cycles
+
+        pending = ShiftExchange.objects.select_related("from_shift__agent", "to_shift__agent")
+        cycles = find_exchange_cycles(pending)
+        self.assertEqual(len(cycles), 1)
+        self.assertEqual([sh.pk for sh in cycles[0].shifts], [sh.pk for sh in self.shifts])
+
+    def test_execute_chain_rotates_agents_and_approves_requests(self):
+        self.client.login(username="chain_lead", password="pass1234")
+        response = self.client.get(reverse("exchange_queue"))
+        self.assertContains(response, "Ланцюгові обміни")
+
+        self.client.post(reverse("exchange_queue"), data={
+            "action": "chain",
+            "chain": ",".join(str(sh.pk) for sh in self.shifts),
+            "exchange_ids": [ex.pk for ex in self.exchanges],
+        })
+
+        for idx, shift in enumerate(self.shifts):
+            shift.refresh_from_db()
+            self.assertEqual(shift.agent, self.agents[idx - 1])
+        self.assertFalse(ShiftExchange.objects.filter(approved__isnull=True).exists())
+        self.assertEqual(ShiftExchange.objects.count(), 3)
+
+    def test_queue_chain_requires_a_request_for_every_hop(self):
+        outsider = Agent.objects.create(user=User.objects.create_user(username="chain_outsider"), skills=["calls"])
+        outsider_shift = Shift.objects.create(
+            agent=outsider,
+            start=self.shifts[0].start + timedelta(days=5),
+            end=self.shifts[0].end + timedelta(days=5),
+            direction="calls",
+        )
+        self.client.login(username="chain_lead", password="pass1234")
+
+        # Лише один справжній запит (0 -> 1); кроки 1 -> outsider -> 0 ніхто не просив
+        self.client.post(reverse("exchange_queue"), data={
+            "action": "chain",
+            "chain": ",".join(str(pk) for pk in (self.shifts[0].pk, self.shifts[1].pk, outsider_shift.pk)),
+            "exchange_ids": [self.exchanges[0].pk],
+        })
+
+        outsider_shift.refresh_from_db()
+        self.assertEqual(outsider_shift.agent, outsider)
+        self.assertEqual(ShiftExchange.objects.count(), 3)
+        self.assertFalse(ShiftExchange.objects.filter(approved=True).exists())
+
+    def test_execute_chain_with_same_start_shifts(self):
+        from core.services import execute_chain
+
+        start, end = self.shifts[0].start, self.shifts[0].end
+        Shift.objects.filter(pk__in=[sh.pk for sh in self.shifts]).update(start=start, end=end)
+
+        ok, msg = execute_chain([sh.pk for sh in self.shifts], self.lead)
+
+        self.assertTrue(ok, msg)
+        for idx, shift in enumerate(self.shifts):
+            shift.refresh_from_db()
+            self.assertEqual((shift.agent, shift.start, shift.end), (self.agents[idx - 1], start, end))
+        self.assertEqual(shift.history.first().start, start)
+
+    def test_chain_reports_same_start_conflict(self):
+        from unittest import mock
+
+        from core.services import execute_chain
+
+        # Вихідний агента 0 з тим самим початком, що й зміна агента 1, яку він мав би забрати
+        Shift.objects.create(
+            agent=self.agents[0], start=self.shifts[1].start, end=self.shifts[1].end, status=ShiftStatus.DAY_OFF
+        )
+        self.client.login(username="chain_lead", password="pass1234")
+
+        response = self.client.post(reverse("exchange_queue"), data={
+            "action": "chain",
+            "chain": ",".join(str(sh.pk) for sh in self.shifts),
+            "exchange_ids": [ex.pk for ex in self.exchanges],
+        }, follow=True)
+
+        self.assertContains(response, "Ланцюговий обмін не виконано")
+        self.assertFalse(ShiftExchange.objects.filter(approved=True).exists())
+
+        # Вихідний з'явився вже після перевірки інтервалів — ловить обмеження БД
+        with mock.patch("core.services._load_agent_intervals", return_value={}):
+            ok, msg = execute_chain([sh.pk for sh in self.shifts], self.lead)
+        self.assertFalse(ok)
+        self.assertIn("таким самим початком", msg)
+        for idx, shift in enumerate(self.shifts):
+            shift.refresh_from_db()
+            self.assertEqual(shift.agent, self.agents[idx])
+
+    def test_chain_rejects_overlap(self):
+        from core.services import execute_chain
+
+        # Агент 0 уже працює під час зміни агента 1 — ланцюжок не виконується повністю
+        Shift.objects.create(
+            agent=self.agents[0], start=self.shifts[1].start, end=self.shifts[1].end, direction="calls"
+        )
+        ok, msg = execute_chain([sh.pk for sh in self.shifts], self.lead)
+        self.assertFalse(ok)
+        self.assertIn("перетинається", msg)
+        self.shifts[0].refresh_from_db()
+        self.assertEqual(self.shifts[0].agent, self.agents[0])
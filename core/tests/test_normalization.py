@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase
+
+from core import normalization
+from core.models import Direction, ShiftStatus
+from core.resources import ShiftResource
+
+
+class NormalizationTests(SimpleTestCase):
+    def setUp(self):
+        normalization.warnings.drain()
+
+    def test_values_match_model_choices(self):
+        self.assertEqual(normalization.STATUS_VALUES, set(ShiftStatus.values))
+        self.assertEqual(normalization.DIRECTION_VALUES, set(Direction.values))
+
+    def test_aliases_and_resource_delegation(self):
+        self.assertEqual(ShiftResource._normalize_status("Відпустка"), ShiftStatus.VACATION)
+        self.assertEqual(ShiftResource._normalize_status(" day off "), ShiftStatus.DAY_OFF)
+        self.assertEqual(ShiftResource._normalize_status(""), ShiftStatus.WORK)
+        self.assertEqual(ShiftResource._normalize_direction("  Тікети "), "tickets")
+        self.assertEqual(ShiftResource._normalize_name("  Іван   Петренко "), "іван петренко")
+        self.assertEqual(normalization.grid_status("OFF"), "day_off")
+        self.assertIsNone(normalization.grid_status("09:00-18:00"))
+
+    def test_unknown_values_are_counted_not_printed(self):
+        for _ in range(3):
+            self.assertEqual(normalization.normalize_direction("email"), normalization.DEFAULT_DIRECTION)
+        normalization.normalize_status("holiday")
+
+        counts = normalization.warnings.drain()
+        self.assertEqual(counts[("direction", "email")], 3)
+        self.assertEqual(counts[("status", "holiday")], 1)
+        lines = normalization.NormalizationWarnings.format(counts)
+        self.assertEqual(len(lines), 2)
+        self.assertFalse(normalization.warnings.counts)
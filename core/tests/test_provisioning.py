@@ -0,0 +1,102 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from core.models import Agent
+from core.provisioning import ProvisionState, Roster, provision_roster
+from core.usernames import UsernameAllocator
+
+
+class ProvisionRosterTests(TestCase):
+    def test_bulk_provisioning_uses_constant_number_of_queries(self):
+        existing = Agent.objects.create(user=User.objects.create_user(username="old", first_name="Старий", last_name="Агент"))
+        roster = Roster()
+        roster.add("Старий Агент", "Марія Лідер")
+        for idx in range(50):
+            roster.add(f"Агент Номер{idx}", "Марія Лідер" if idx % 2 else "Петро Лідер")
+
+        # Кількість запитів не залежить від розміру roster
+        with self.assertNumQueries(20):
+            result = provision_roster(roster, password="secret")
+
+        self.assertEqual(result.created_team_leads, 2)
+        self.assertEqual(result.created_agents, 50)
+        self.assertEqual(result.assigned_team_leads, 51)
+
+        lead = User.objects.get(first_name="Марія")
+        self.assertTrue(lead.is_staff)
+        self.assertTrue(lead.groups.filter(name="TL").exists())
+        existing.refresh_from_db()
+        self.assertEqual(existing.team_lead, lead)
+        self.assertEqual(Agent.objects.filter(team_lead=lead).count(), 26)
+        self.assertTrue(User.objects.get(first_name="Агент", last_name="Номер7").check_password("secret"))
+
+        # Повторний запуск нічого не створює і не оновлює
+        again = provision_roster(roster)
+        self.assertEqual((again.created_team_leads, again.created_agents, again.assigned_team_leads), (0, 0, 0))
+
+    def test_command_creates_users_from_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "users.csv"
+            path.write_text(
+                "agent,team_lead\nОля Сидоренко,Ірина Головна\nОля Сидоренко,Ірина Головна\nНазар Ткач,\n",
+                encoding="utf-8",
+            )
+            call_command("import_users_from_csv", str(path), verbosity=0, stdout=open(Path(tmp_dir) / "out", "w"))
+
+        self.assertEqual(Agent.objects.count(), 2)
+        self.assertEqual(Group.objects.get(name="TL").user_set.count(), 1)
+        olya = Agent.objects.get(user__first_name="Оля")
+        self.assertEqual(olya.team_lead.get_full_name(), "Ірина Головна")
+        self.assertTrue(olya.user.check_password("temp_password123"))
+
+
+class UsernameAllocatorTests(SimpleTestCase):
+    def test_continues_after_highest_existing_suffix(self):
+        allocator = UsernameAllocator(["ivan", "ivan_1", "ivan_7", "petro"])
+
+        self.assertEqual(allocator.allocate("ivan"), "ivan_8")
+        self.assertEqual(allocator.allocate("ivan"), "ivan_9")
+        self.assertEqual(allocator.allocate("maria"), "maria")
+        self.assertEqual(allocator.allocate("maria"), "maria_1")
+        self.assertEqual(allocator.allocate(""), "user")
+
+    def test_suffix_respects_max_length(self):
+        allocator = UsernameAllocator(["a" * 10], max_length=10)
+
+        allocated = allocator.allocate("a" * 10)
+
+        self.assertLessEqual(len(allocated), 10)
+        self.assertNotIn(allocated, {"a" * 10})
+        self.assertEqual(len({allocator.allocate("a" * 10) for _ in range(20)}), 20)
+
+
+class CheckpointedUserImportTests(TestCase):
+    def test_checkpointed_import_commits_per_batch(self):
+        from io import StringIO
+
+        from django.contrib.contenttypes.models import ContentType
+
+        from core.models import ImportCheckpoint
+
+        # Provisioning warms the ContentType cache; keep query counts in other tests stable
+        self.addCleanup(ContentType.objects.clear_cache)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "users.csv"
+            lines = ["agent,team_lead"] + [f"Агент Номер{idx},Марія Лідер" for idx in range(7)]
+            path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            # Users/agents and usernames are loaded once for the whole file, not once per batch
+            with mock.patch.object(ProvisionState, "load", wraps=ProvisionState.load) as load, \
+                    mock.patch.object(UsernameAllocator, "from_db", wraps=UsernameAllocator.from_db) as from_db:
+                call_command("import_users_from_csv", str(path), checkpoint=True, batch_size=3, stdout=StringIO())
+            self.assertEqual((load.call_count, from_db.call_count), (1, 1))
+
+        checkpoint = ImportCheckpoint.objects.get(kind="users")
+        self.assertEqual(checkpoint.status, ImportCheckpoint.Status.DONE)
+        self.assertEqual((checkpoint.rows_done, checkpoint.batches_done), (7, 3))
+        self.assertEqual(Agent.objects.filter(team_lead__first_name="Марія").count(), 7)
+        self.assertEqual(User.objects.filter(first_name="Марія").count(), 1)
@@ -0,0 +1,431 @@
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Agent, Shift
+from core.shift_import import chunk_ranges, read_header
+
+
+class ShiftCsvImportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="ivan", first_name="Іван", last_name="Петренко")
+        self.agent = Agent.objects.create(user=user)
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8")
+        with tmp:
+            tmp.write("agent,start,end,direction,status,activity,comment\n")
+            for day in range(1, 29):
+                tmp.write(f"Іван Петренко,2025-02-{day:02d} 09:00,2025-02-{day:02d} 17:00,Дзвінки,,,\n")
+            tmp.write("Невідомий Агент,2025-02-01 09:00,2025-02-01 17:00,calls,,,\n")
+            tmp.write("Іван Петренко,not-a-date,2025-02-01 17:00,calls,,,\n")
+        self.path = Path(tmp.name)
+        self.addCleanup(self.path.unlink)
+
+    def test_chunks_cover_data_on_line_boundaries(self):
+        _, data_start = read_header(self.path, ",")
+        ranges = chunk_ranges(self.path, data_start, 7)
+        self.assertEqual(ranges[0][0], data_start)
+        self.assertEqual(ranges[-1][1], self.path.stat().st_size)
+        raw = self.path.read_bytes()
+        for start, end in ranges:
+            self.assertEqual(raw[start - 1:start], b"\n")
+            self.assertTrue(raw[start:end].endswith(b"\n"))
+
+    def test_serial_and_parallel_imports_match(self):
+        call_command("import_shifts_from_csv", str(self.path), verbosity=0)
+        serial = list(Shift.objects.order_by("start").values_list("start", "end", "direction"))
+        Shift.objects.all().delete()
+
+        call_command("import_shifts_from_csv", str(self.path), workers=2, verbosity=0)
+        parallel = list(Shift.objects.order_by("start").values_list("start", "end", "direction"))
+
+        self.assertEqual(len(serial), 28)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(serial[0][2], "calls")
+
+    def test_copy_mode_requires_postgresql(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaisesMessage(CommandError, "PostgreSQL"):
+            call_command("import_shifts_from_csv", str(self.path), copy=True, verbosity=0)
+        self.assertFalse(Shift.objects.exists())
+
+    def test_copy_keeps_the_last_duplicate_row(self):
+        from core.shift_import import _staging_insert_sql
+
+        for mode in ("append", "upsert"):
+            self.assertIn("ORDER BY s.agent_id, s.start, s.rownum DESC", _staging_insert_sql(mode))
+
+        if connection.vendor != "postgresql":
+            return
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write("Іван Петренко,2025-02-01 09:00,2025-02-01 12:00,Чати,,,\n")
+        call_command("import_shifts_from_csv", str(self.path), copy=True, verbosity=0)
+        shift = Shift.objects.get(agent=self.agent, start__date="2025-02-01")
+        self.assertEqual((shift.end - shift.start, shift.direction), (timedelta(hours=3), "chats"))
+
+    def test_upsert_reimport_touches_only_changed_rows(self):
+        from io import StringIO
+
+        call_command("import_shifts_from_csv", str(self.path), verbosity=0)
+        original = self.path.read_text(encoding="utf-8")
+        self.path.write_text(
+            original.replace("2025-02-03 17:00,Дзвінки", "2025-02-03 18:00,Дзвінки"), encoding="utf-8"
+        )
+
+        out = StringIO()
+        call_command("import_shifts_from_csv", str(self.path), mode="upsert", stdout=out)
+        self.assertIn("created=0", out.getvalue())
+        self.assertIn("updated=1 unchanged=27", out.getvalue())
+        self.assertEqual(Shift.objects.count(), 28)
+        self.assertEqual(Shift.objects.get(start__day=3).end.hour, 18 - 2)  # Europe/Kyiv, UTC+2 взимку
+
+        out = StringIO()
+        call_command("import_shifts_from_csv", str(self.path), stdout=out)
+        self.assertIn("created=0", out.getvalue())
+        self.assertIn("skipped_duplicate=28", out.getvalue())
+
+
+class ShiftResourceNaturalKeyTests(TestCase):
+    def test_reimport_without_id_updates_existing_shift(self):
+        import tablib
+        from core.resources import ShiftResource
+
+        user = User.objects.create_user(username="olena", first_name="Олена", last_name="Коваль")
+        Agent.objects.create(user=user)
+        headers = ("agent", "team_lead", "start", "end", "direction", "status")
+        first = tablib.Dataset(("Олена Коваль", "", "2025-03-03 09:00:00", "2025-03-03 17:00:00", "calls", "work"), headers=headers)
+        second = tablib.Dataset(("Олена Коваль", "", "2025-03-03 09:00:00", "2025-03-03 17:00:00", "chats", "work"), headers=headers)
+
+        ShiftResource().import_data(first, raise_errors=True)
+        result = ShiftResource().import_data(second, raise_errors=True)
+
+        self.assertEqual(result.totals["update"], 1)
+        self.assertEqual(Shift.objects.count(), 1)
+        self.assertEqual(Shift.objects.get().direction, "chats")
+
+
+class ShiftSyncImportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="taras", first_name="Тарас", last_name="Бойко")
+        self.agent = Agent.objects.create(user=user)
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8")
+        tmp.close()
+        self.path = Path(tmp.name)
+        self.addCleanup(self.path.unlink)
+
+    def _write(self, days):
+        lines = ["agent,start,end,direction,status"]
+        lines += [f"Тарас Бойко,2025-04-{day:02d} 09:00,2025-04-{day:02d} {end},calls," for day, end in days]
+        self.path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def test_sync_applies_minimal_diff_and_dry_run_writes_nothing(self):
+        from io import StringIO
+
+        self._write([(1, "17:00"), (2, "17:00"), (3, "17:00")])
+        call_command("import_shifts_from_csv", str(self.path), mode="sync", verbosity=0)
+        untouched_id = Shift.objects.get(start__day=1).pk
+        # Поза діапазоном дат файлу — не чіпаємо
+        Shift.objects.create(
+            agent=self.agent,
+            start=timezone.make_aware(datetime(2025, 4, 20, 9, 0)),
+            end=timezone.make_aware(datetime(2025, 4, 20, 17, 0)),
+        )
+
+        self._write([(1, "17:00"), (2, "18:00"), (4, "17:00")])
+        out = StringIO()
+        call_command("import_shifts_from_csv", str(self.path), mode="sync", dry_run=True, stdout=out)
+        self.assertIn("inserts=1 updates=1 deletes=1 unchanged=1", out.getvalue())
+        self.assertEqual(Shift.objects.count(), 4)
+
+        call_command("import_shifts_from_csv", str(self.path), mode="sync", stdout=StringIO())
+        days = sorted(timezone.localtime(sh.start).day for sh in Shift.objects.all())
+        self.assertEqual(days, [1, 2, 4, 20])
+        self.assertEqual(Shift.objects.get(start__day=1).pk, untouched_id)
+        self.assertEqual(timezone.localtime(Shift.objects.get(start__day=2).end).hour, 18)
+
+
+class DateTimeParserTests(TestCase):
+    def test_sniffs_format_and_handles_dst_days(self):
+        from zoneinfo import ZoneInfo
+        from core.shift_import import DateTimeParser, parse_dt
+
+        tz = ZoneInfo("Europe/Kyiv")
+        parse = DateTimeParser.sniff(["30.03.2025 09:00", "31.03.2025 17:30:15"], tz)
+        self.assertEqual(parse.kind, DateTimeParser.DMY)
+
+        # 30.03.2025 — перехід на літній час; сусідні дні мають фіксований зсув
+        for value in ("29.03.2025 09:00", "30.03.2025 02:30", "30.03.2025 09:00", "31.03.2025 17:30:15"):
+            self.assertEqual(parse(value), parse_dt(value, tz))
+        # Інший формат у тому ж файлі — повільний, але коректний шлях
+        self.assertEqual(parse("2025-03-31 09:00"), parse_dt("2025-03-31 09:00", tz))
+        self.assertIsNone(parse("not-a-date"))
+
+    def test_reject_file_lists_bad_rows(self):
+        import csv as csv_module
+
+        Agent.objects.create(user=User.objects.create_user(username="rej", first_name="Ріна", last_name="Лис"))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = Path(tmp_dir) / "shifts.csv"
+            rejects = Path(tmp_dir) / "rejects.csv"
+            source.write_text(
+                "agent,start,end\n"
+                "Ріна Лис,2025-05-01 09:00,2025-05-01 17:00\n"
+                "Хтось Інший,2025-05-01 09:00,2025-05-01 17:00\n"
+                "Ріна Лис,вчора,2025-05-02 17:00\n",
+                encoding="utf-8",
+            )
+            call_command("import_shifts_from_csv", str(source), reject_file=str(rejects), verbosity=0)
+            with rejects.open(encoding="utf-8") as fh:
+                rows = list(csv_module.DictReader(fh))
+
+        self.assertEqual(Shift.objects.count(), 1)
+        self.assertEqual([row["reason"] for row in rows], ["no_agent", "bad_time"])
+        self.assertEqual(rows[1]["start"], "вчора")
+
+
+class ScheduleGridImportTests(TestCase):
+    def setUp(self):
+        import openpyxl
+
+        user = User.objects.create_user(username="ivan", first_name="Іван", last_name="Петренко")
+        self.agent = Agent.objects.create(user=user)
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["TL", "Напрям", "Агент", datetime(2025, 3, 29), "30.03.2025", "31.03.2025"])
+        sheet.append(["Марія", "Чати", "Іван Петренко", "22:00-06:00", "OFF", "09:00-12:00, 13:00-18:00"])
+        sheet.append(["Марія", "", "Невідомий Агент", "09:00-18:00", None, None])
+        sheet.append(["Марія", "", "Іван Петренко ", None, None, None])
+        sheet.cell(row=2, column=7, value="???")
+        tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+        tmp.close()
+        workbook.save(tmp.name)
+        self.path = Path(tmp.name)
+        self.addCleanup(self.path.unlink)
+
+    def test_grid_imports_directly_and_dry_run_reports_diff(self):
+        from io import StringIO
+
+        out = StringIO()
+        call_command("import_schedule_grid", str(self.path), dry_run=True, stdout=out)
+        self.assertFalse(Shift.objects.exists())
+        self.assertIn("planned: inserts=4", out.getvalue())
+        self.assertIn("skipped_no_agent=1", out.getvalue())
+
+        call_command("import_schedule_grid", str(self.path), verbosity=0, stdout=StringIO())
+        shifts = list(Shift.objects.order_by("start"))
+        self.assertEqual(len(shifts), 4)
+        self.assertEqual([s.status for s in shifts], ["work", "day_off", "work", "work"])
+        self.assertEqual(shifts[0].direction, "chats")
+        # Нічна зміна через перехід на літній час (30.03) триває 7 годин
+        self.assertEqual(shifts[0].end - shifts[0].start, timezone.timedelta(hours=7))
+
+        out = StringIO()
+        call_command("import_schedule_grid", str(self.path), dry_run=True, stdout=out)
+        self.assertIn("planned: inserts=0 updates=0 deletes=0 unchanged=4", out.getvalue())
+
+
+class ShiftAdminFastImportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="ivan", first_name="Іван", last_name="Петренко")
+        self.agent = Agent.objects.create(user=user)
+        admin_user = User.objects.create_superuser(username="admin", password="pass1234", email="a@example.com")
+        self.client.force_login(admin_user)
+
+    def test_upload_preview_and_confirm(self):
+        from django.contrib import admin
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from import_export.formats.base_formats import CSV
+
+        url = reverse("admin:core_shift_fast_import")
+        csv_format = str(admin.site._registry[Shift].get_import_formats().index(CSV))
+        content = (
+            "agent,start,end,direction,status\n"
+            "Іван Петренко,2025-02-01 09:00,2025-02-01 17:00,Чати,\n"
+            "Іван Петренко,2025-02-02 22:00,2025-02-02 06:00,,\n"
+            "Хтось Інший,2025-02-01 09:00,2025-02-01 17:00,,\n"
+        ).encode("utf-8")
+
+        response = self.client.post(url, {
+            "import_file": SimpleUploadedFile("shifts.csv", content),
+            "format": csv_format,
+            "mode": "upsert",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Буде додано: <strong>2</strong>")
+        self.assertContains(response, "Хтось Інший")
+        self.assertFalse(Shift.objects.exists())
+
+        confirm = response.context["confirm_form"].initial
+        response = self.client.post(url, {**confirm, "confirm": "1"})
+        self.assertRedirects(response, reverse("admin:core_shift_changelist"))
+        shifts = list(Shift.objects.order_by("start"))
+        self.assertEqual(len(shifts), 2)
+        self.assertEqual(shifts[0].direction, "chats")
+        self.assertEqual(shifts[1].end - shifts[1].start, timezone.timedelta(hours=8))
+
+    def test_unreadable_upload_removes_temp_file(self):
+        import os
+        from unittest import mock
+
+        from django.contrib import admin
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from import_export.formats.base_formats import CSV
+
+        shift_admin = admin.site._registry[Shift]
+        csv_format = str(shift_admin.get_import_formats().index(CSV))
+        storages = []
+        write = shift_admin.write_to_tmp_storage
+
+        def capture(*args, **kwargs):
+            storages.append(write(*args, **kwargs))
+            return storages[-1]
+
+        with mock.patch.object(shift_admin, "write_to_tmp_storage", side_effect=capture):
+            response = self.client.post(reverse("admin:core_shift_fast_import"), {
+                "import_file": SimpleUploadedFile("shifts.csv", "who,when\nx,y\n".encode("utf-8")),
+                "format": csv_format,
+                "mode": "upsert",
+            })
+
+        self.assertContains(response, "Не вдалося прочитати файл")
+        self.assertEqual(len(storages), 1)
+        self.assertFalse(os.path.exists(storages[0].get_full_path()))
+
+    def test_confirm_rejects_tampered_file_name_and_format(self):
+        from django.urls import reverse
+
+        url = reverse("admin:core_shift_fast_import")
+        outside_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(outside_dir.cleanup)
+        outside = Path(outside_dir.name) / "secret.csv"
+        outside.write_text("agent,start,end\n", encoding="utf-8")
+        confirm = {"original_file_name": "x.csv", "mode": "upsert", "confirm": "1"}
+
+        response = self.client.post(url, {**confirm, "import_file_name": str(outside), "format": "0"})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        # Шлях обрізано до імені в тимчасовому сховищі: сторонній файл не прочитано й не видалено
+        self.assertTrue(outside.exists())
+
+        response = self.client.post(url, {**confirm, "import_file_name": "shifts.csv", "format": "999"})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+
+class ShiftExportTests(TestCase):
+    def setUp(self):
+        lead = User.objects.create_user(username="lead", first_name="Марія", last_name="Лідер")
+        for idx in range(5):
+            user = User.objects.create_user(username=f"agent{idx}", first_name="Агент", last_name=str(idx))
+            agent = Agent.objects.create(user=user, team_lead=lead)
+            for day in range(1, 4):
+                start = timezone.make_aware(datetime(2025, 2, day, 9, 0))
+                Shift.objects.create(agent=agent, start=start, end=start + timedelta(hours=8))
+        admin_user = User.objects.create_superuser(username="admin", password="pass1234", email="a@example.com")
+        self.client.force_login(admin_user)
+
+    def test_resource_export_does_not_query_per_row(self):
+        from core.resources import ShiftResource
+
+        with self.assertNumQueries(1):
+            dataset = ShiftResource().export(Shift.objects.all())
+        self.assertEqual(len(dataset), 15)
+        self.assertEqual(set(dataset["team_lead"]), {"Марія Лідер"})
+
+    def test_admin_streams_filtered_csv(self):
+        from django.urls import reverse
+
+        response = self.client.get(reverse("admin:core_shift_export_csv"), {"start__day": "1"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(lines[0], "id,agent,team_lead,start,end,direction,status")
+        self.assertEqual(len(lines), 1 + 5)
+        self.assertTrue(all("Марія Лідер" in line for line in lines[1:]))
+
+
+class CheckpointedImportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="ivan", first_name="Іван", last_name="Петренко")
+        Agent.objects.create(user=user)
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8")
+        with tmp:
+            tmp.write("agent,start,end\n")
+            for day in range(1, 29):
+                tmp.write(f"Іван Петренко,2025-02-{day:02d} 09:00,2025-02-{day:02d} 17:00\n")
+        self.path = Path(tmp.name)
+        self.addCleanup(self.path.unlink)
+
+    def test_resume_continues_after_last_committed_batch(self):
+        from io import StringIO
+        from unittest import mock
+
+        from core import shift_import
+        from core.models import ImportCheckpoint
+
+        real_write_rows = shift_import.write_rows
+        calls = []
+
+        def crash_on_third_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError("boom")
+            return real_write_rows(*args, **kwargs)
+
+        with mock.patch.object(shift_import, "write_rows", side_effect=crash_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                call_command("import_shifts_from_csv", str(self.path), checkpoint=True, batch_size=10,
+                             stdout=StringIO())
+
+        checkpoint = ImportCheckpoint.objects.get(kind="shifts")
+        self.assertEqual(checkpoint.status, ImportCheckpoint.Status.FAILED)
+        self.assertEqual(checkpoint.rows_done, 20)
+        self.assertEqual(Shift.objects.count(), 20)
+
+        out = StringIO()
+        call_command("import_shifts_from_csv", str(self.path), resume=True, batch_size=10, stdout=out)
+        self.assertIn("resuming", out.getvalue())
+        self.assertIn("created=8", out.getvalue())
+        self.assertEqual(Shift.objects.count(), 28)
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.status, ImportCheckpoint.Status.DONE)
+        self.assertEqual(checkpoint.rows_done, 28)
+        self.assertEqual(checkpoint.byte_offset, self.path.stat().st_size)
+
+        out = StringIO()
+        call_command("import_shifts_from_csv", str(self.path), resume=True, stdout=out)
+        self.assertIn("already imported", out.getvalue())
+
+
+class ShiftCodedFieldsTests(TestCase):
+    def test_status_and_direction_are_stored_as_codes(self):
+        from django.db import connection
+
+        from core.models import DIRECTION_CODES, SHIFT_STATUS_CODES
+
+        user = User.objects.create_user(username="ivan", first_name="Іван", last_name="Петренко")
+        agent = Agent.objects.create(user=user)
+        start = timezone.make_aware(datetime(2025, 3, 3, 9, 0))
+        shift = Shift.objects.create(
+            agent=agent, start=start, end=start + timedelta(hours=8), status="sick", direction="chats"
+        )
+
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT status, direction FROM {Shift._meta.db_table} WHERE id = %s", [shift.pk])
+            self.assertEqual(cur.fetchone(), (SHIFT_STATUS_CODES["sick"], DIRECTION_CODES["chats"]))
+
+        shift = Shift.objects.get(pk=shift.pk)
+        self.assertEqual((shift.status, shift.direction), ("sick", "chats"))
+        self.assertEqual(shift.get_status_display(), "Лікарняний")
+        self.assertEqual(Shift.objects.filter(status__in=["sick", "vacation"], direction="chats").count(), 1)
+
+        shift.status = "vacation"
+        Shift.objects.bulk_update([shift], ["status"])
+        self.assertEqual(Shift.objects.values_list("status", flat=True).get(), "vacation")
+        with self.assertRaises(ValueError):
+            Shift.objects.filter(status="unknown").exists()
@@ -1,13 +1,17 @@
+import json
 from datetime import datetime, timedelta, time
+from io import StringIO
 
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 
-from core.models import Agent, Shift, ShiftStatus, SickLeaveProof
+from core.models import Agent, AuditAction, AuditLog, Direction, Shift, ShiftStatus, SickLeaveProof
 
 
 class SickLeaveViewTests(TestCase):
@@ -134,3 +138,372 @@ class SickLeaveViewTests(TestCase):
         self.assertTrue(proof.attachment.name.endswith("evidence.png"))
 
 
+
+
+class ShiftPeriodQueryTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="period", first_name="Ada", last_name="Lovelace")
+        agent = Agent.objects.create(user=user)
+        self.base = timezone.make_aware(datetime(2025, 3, 3, 9, 0))
+        for offset, status in ((0, ShiftStatus.WORK), (8, ShiftStatus.SICK), (16, ShiftStatus.WORK)):
+            start = self.base + timedelta(hours=offset)
+            Shift.objects.create(agent=agent, start=start, end=start + timedelta(hours=8), status=status)
+
+    def test_period_lookups_match_plain_comparisons(self):
+        for moment in (self.base, self.base + timedelta(hours=8), self.base + timedelta(hours=23, minutes=59)):
+            self.assertEqual(
+                set(Shift.objects.working().active_at(moment)),
+                set(Shift.objects.filter(start__lte=moment, end__gt=moment).exclude(status=ShiftStatus.SICK)),
+            )
+        window = (self.base + timedelta(hours=8), self.base + timedelta(hours=16))
+        self.assertEqual(Shift.objects.overlapping(*window).count(), 1)
+        self.assertFalse(Shift.objects.working().overlapping(*window).exists())
+
+    def test_benchmark_compare_restores_indexes(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+        from django.db import connection
+
+        def index_names():
+            with connection.cursor() as cur:
+                return set(connection.introspection.get_constraints(cur, Shift._meta.db_table))
+
+        indexes = index_names()
+        out = StringIO()
+        call_command("benchmark_shift_queries", compare=True, repeat=1, at="2025-03-03 12:00", stdout=out)
+
+        self.assertIn("[before] now", out.getvalue())
+        self.assertIn("[after] week_status", out.getvalue())
+        self.assertEqual(index_names(), indexes)
+
+
+class ShiftOverlapViewTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        user = User.objects.create_user(username="overlap_agent", first_name="Grace", last_name="Hopper")
+        self.agent = Agent.objects.create(user=user)
+        self.client.login(username="lead", password="pass1234")
+        self.day = datetime(2025, 3, 3).date()
+        start = timezone.make_aware(datetime.combine(self.day, time(9)))
+        self.shift = Shift.objects.create(agent=self.agent, start=start, end=start + timedelta(hours=8))
+
+    def _create(self, start_time, end_time, status=ShiftStatus.WORK):
+        return self.client.post(
+            reverse("ajax_create_shift"),
+            {
+                "agent_id": self.agent.pk,
+                "date": self.day.isoformat(),
+                "start_time": start_time,
+                "end_time": end_time,
+                "status": status,
+            },
+        )
+
+    def test_overlapping_working_shift_is_rejected(self):
+        response = self._create("16:00", "20:00")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Перетин із існуючою зміною: 03.03 09:00–17:00", response.json()["error"])
+        self.assertEqual(Shift.objects.count(), 1)
+
+    def test_adjacent_and_non_working_shifts_are_allowed(self):
+        self.assertEqual(self._create("17:00", "20:00").status_code, 200)
+        self.assertEqual(self._create("12:00", "13:00", status=ShiftStatus.SICK).status_code, 200)
+        self.assertEqual(Shift.objects.count(), 3)
+
+    def test_edit_into_overlap_is_rejected(self):
+        self._create("18:00", "22:00")
+        later = Shift.objects.exclude(pk=self.shift.pk).get()
+
+        response = self.client.post(
+            reverse("ajax_edit_shift", args=[later.pk]), {"start_time": "15:00", "end_time": "22:00"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        later.refresh_from_db()
+        self.assertEqual(timezone.localtime(later.start).hour, 18)
+
+
+class ShiftBatchEditViewTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        user = User.objects.create_user(username="batch_agent", first_name="Ada", last_name="Lovelace")
+        self.agent = Agent.objects.create(user=user)
+        self.client.login(username="lead", password="pass1234")
+        self.monday = datetime(2025, 3, 3).date()
+        self.first = self._shift(self.monday, 9)
+        self.second = self._shift(self.monday + timedelta(days=1), 9)
+
+    def _shift(self, day, hour, hours=8):
+        start = timezone.make_aware(datetime.combine(day, time(hour)))
+        return Shift.objects.create(agent=self.agent, start=start, end=start + timedelta(hours=hours))
+
+    def _batch(self, edits):
+        return self.client.post(
+            reverse("ajax_batch_edit_shifts"), json.dumps({"edits": edits}), content_type="application/json"
+        )
+
+    def test_moves_shifts_and_returns_patched_cells(self):
+        response = self._batch([
+            {"id": self.first.pk, "date": "2025-03-05"},
+            {"id": self.second.pk, "date": "2025-03-06", "start_time": "10:00", "end_time": "18:00"},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        cells = {cell["id"]: cell for cell in response.json()["shifts"]}
+        self.assertEqual(cells[self.first.pk]["date"], "2025-03-05")
+        self.assertEqual(cells[self.first.pk]["start_time"], "09:00")
+        self.assertEqual(cells[self.first.pk]["end_time"], "17:00")
+        self.assertEqual(cells[self.second.pk]["start_time"], "10:00")
+        self.first.refresh_from_db()
+        self.assertEqual(timezone.localtime(self.first.start).date().isoformat(), "2025-03-05")
+        self.assertEqual(
+            AuditLog.objects.filter(action=AuditAction.UPDATE, model="shift").count(), 2
+        )
+        self.assertEqual(self.first.history.count(), 2)
+
+    def test_shift_can_take_a_slot_vacated_in_the_same_batch(self):
+        response = self._batch([
+            {"id": self.first.pk, "date": "2025-03-04", "start_time": "12:00", "end_time": "20:00"},
+            {"id": self.second.pk, "date": "2025-03-05"},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.first.refresh_from_db()
+        self.assertEqual(timezone.localtime(self.first.start).date().isoformat(), "2025-03-04")
+
+    def test_contiguous_block_moves_by_one_slot(self):
+        block = [self._shift(self.monday + timedelta(days=2), hour, hours=1) for hour in (9, 10, 11)]
+
+        def shifted(first_hour):
+            return [
+                {"id": shift.pk, "start_time": f"{first_hour + idx:02d}:00", "end_time": f"{first_hour + idx + 1:02d}:00"}
+                for idx, shift in enumerate(block)
+            ]
+
+        # Перетягування вниз: кожна зміна займає початок наступної, в будь-якому порядку правок
+        self.assertEqual(self._batch(shifted(10)).status_code, 200)
+        self.assertEqual(self._batch(shifted(11)[::-1]).status_code, 200)
+
+        hours = [timezone.localtime(Shift.objects.get(pk=shift.pk).start).hour for shift in block]
+        self.assertEqual(hours, [11, 12, 13])
+        self.assertEqual(block[0].history.count(), 3)
+
+    def test_overlap_rejects_whole_batch(self):
+        response = self._batch([
+            {"id": self.first.pk, "start_time": "08:00", "end_time": "16:00"},
+            {"id": self.second.pk, "date": "2025-03-03", "start_time": "15:00", "end_time": "20:00"},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.second.pk), response.json()["errors"])
+        self.first.refresh_from_db()
+        self.assertEqual(timezone.localtime(self.first.start).hour, 9)
+        self.assertFalse(AuditLog.objects.filter(action=AuditAction.UPDATE).exists())
+
+    def test_day_off_onto_same_start_is_rejected(self):
+        first_off = self._shift(self.monday + timedelta(days=5), 0, hours=24)
+        second_off = self._shift(self.monday + timedelta(days=6), 0, hours=24)
+        Shift.objects.filter(pk__in=[first_off.pk, second_off.pk]).update(status=ShiftStatus.DAY_OFF)
+
+        response = self.client.post(reverse("ajax_edit_shift", args=[second_off.pk]), {"date": "2025-03-08"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Перетин із існуючою зміною", response.json()["error"])
+
+        response = self._batch([{"id": second_off.pk, "date": "2025-03-08"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(second_off.pk), response.json()["errors"])
+        second_off.refresh_from_db()
+        self.assertEqual(timezone.localtime(second_off.start).day, 9)
+
+    def test_invalid_edit_is_reported_per_shift(self):
+        response = self._batch([
+            {"id": self.first.pk, "status": "nope"},
+            {"id": self.second.pk + 100, "date": "2025-03-05"},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            {str(self.first.pk): "Invalid status", str(self.second.pk + 100): "Shift not found"},
+        )
+
+    def test_requires_edit_permission(self):
+        User.objects.create_user(username="viewer", password="pass1234")
+        self.client.login(username="viewer", password="pass1234")
+
+        response = self._batch([{"id": self.first.pk, "date": "2025-03-05"}])
+
+        self.assertEqual(response.status_code, 403)
+
+
+class ShiftBulkOperationsViewTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        user = User.objects.create_user(username="bulk_agent", first_name="Edsger", last_name="Dijkstra")
+        self.agent = Agent.objects.create(user=user)
+        self.client.login(username="lead", password="pass1234")
+        start = timezone.make_aware(datetime(2025, 3, 3, 9))
+        self.monday = Shift.objects.create(agent=self.agent, start=start, end=start + timedelta(hours=8))
+        self.tuesday = Shift.objects.create(
+            agent=self.agent, start=start + timedelta(days=1), end=start + timedelta(days=1, hours=8)
+        )
+
+    def _bulk(self, ops):
+        return self.client.post(reverse("ajax_bulk_shifts"), json.dumps({"ops": ops}), content_type="application/json")
+
+    def _create_op(self, day, start_time="09:00", end_time="17:00", **extra):
+        return {"op": "create", "agent_id": self.agent.pk, "date": day, "start_time": start_time,
+                "end_time": end_time, **extra}
+
+    def test_mixed_operations_apply_in_one_request(self):
+        response = self._bulk([
+            {"op": "delete", "id": self.monday.pk},
+            self._create_op("2025-03-03", "10:00", "18:00"),
+            {"op": "update", "id": self.tuesday.pk, "status": ShiftStatus.TRAINING},
+            self._create_op("2025-03-10", status=ShiftStatus.DAY_OFF),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["op"] for result in results], ["delete", "create", "update", "create"])
+        self.assertEqual(results[0]["id"], self.monday.pk)
+        self.assertEqual(results[1]["shift"]["start_time"], "10:00")
+        self.assertEqual(results[2]["shift"]["status"], ShiftStatus.TRAINING)
+        self.assertFalse(Shift.objects.filter(pk=self.monday.pk).exists())
+        self.assertEqual(Shift.objects.count(), 3)
+        created = Shift.objects.get(pk=results[1]["shift"]["id"])
+        self.assertEqual(created.history.count(), 1)
+        created_pks = [str(results[1]["shift"]["id"]), str(results[3]["shift"]["id"])]
+        self.assertEqual(
+            AuditLog.objects.filter(action=AuditAction.CREATE, model="shift", object_pk__in=created_pks).count(), 2
+        )
+
+    def test_created_shift_may_reuse_a_deleted_slot_but_not_overlap(self):
+        response = self._bulk([
+            self._create_op("2025-03-04", "12:00", "20:00"),
+            self._create_op("2025-03-05"),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["errors"]), ["0"])
+        self.assertEqual(Shift.objects.count(), 2)
+
+        response = self._bulk([
+            {"op": "delete", "id": self.tuesday.pk},
+            self._create_op("2025-03-04", "12:00", "20:00"),
+        ])
+        self.assertEqual(response.status_code, 200)
+
+    def test_block_shift_with_a_new_shift_in_the_vacated_slot(self):
+        day = timezone.make_aware(datetime(2025, 3, 6))
+        block = [
+            Shift.objects.create(agent=self.agent, start=day + timedelta(hours=hour), end=day + timedelta(hours=hour + 1))
+            for hour in (9, 10, 11)
+        ]
+
+        response = self._bulk([
+            self._create_op("2025-03-06", "09:00", "10:00", status=ShiftStatus.MEETING),
+            *[
+                {"op": "update", "id": shift.pk, "start_time": f"{hour + 1:02d}:00", "end_time": f"{hour + 2:02d}:00"}
+                for shift, hour in zip(block[::-1], (11, 10, 9))
+            ],
+        ])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        starts = Shift.objects.filter(start__date="2025-03-06").order_by("start").values_list("start", "status")
+        self.assertEqual(
+            [(timezone.localtime(start).hour, status) for start, status in starts],
+            [(9, ShiftStatus.MEETING), (10, ShiftStatus.WORK), (11, ShiftStatus.WORK), (12, ShiftStatus.WORK)],
+        )
+
+    def test_invalid_operations_are_reported_by_index(self):
+        response = self._bulk([
+            {"op": "update", "id": self.monday.pk, "direction": "fax"},
+            {"op": "rename", "id": self.monday.pk},
+            self._create_op("2025-03-05", end_time="24:30"),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            {"0": "Invalid direction", "1": "Unknown op", "2": "Invalid end_time"},
+        )
+        self.assertEqual(Shift.objects.count(), 2)
+
+
+class CloneWeekTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="lead", password="pass1234", is_staff=True)
+        self.calls_agent = Agent.objects.create(user=User.objects.create_user(username="clone_calls"))
+        self.chats_agent = Agent.objects.create(user=User.objects.create_user(username="clone_chats"))
+        self.client.login(username="lead", password="pass1234")
+        # Тиждень перед переходом на літній час (Europe/Kyiv, 30.03.2025)
+        self._shift(self.calls_agent, datetime(2025, 3, 25, 9), hours=8)
+        self._shift(self.calls_agent, datetime(2025, 3, 29, 22), hours=8)
+        self._shift(self.chats_agent, datetime(2025, 3, 26, 10), hours=6, direction=Direction.CHATS)
+
+    def _shift(self, agent, local_start, hours, **extra):
+        start = timezone.make_aware(local_start)
+        return Shift.objects.create(agent=agent, start=start, end=start + timedelta(hours=hours), **extra)
+
+    def _clone(self, **data):
+        return self.client.post(reverse("ajax_clone_week"), {"week": "2025-03-24", **data})
+
+    def _local_hours(self, agent, day):
+        shift = Shift.objects.get(agent=agent, start__date=day)
+        return timezone.localtime(shift.start).strftime("%H:%M"), timezone.localtime(shift.end).strftime("%H:%M")
+
+    def test_clone_keeps_local_times_across_dst(self):
+        response = self._clone(weeks=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["weeks"], ["2025-03-31", "2025-04-07"])
+        self.assertEqual(response.json()["created"], 6)
+        self.assertEqual(self._local_hours(self.calls_agent, datetime(2025, 4, 1).date()), ("09:00", "17:00"))
+        self.assertEqual(self._local_hours(self.calls_agent, datetime(2025, 4, 8).date()), ("09:00", "17:00"))
+        # Нічна зміна через перехід годинника: 22:00–06:00 за місцевим часом
+        self.assertEqual(self._local_hours(self.calls_agent, datetime(2025, 4, 5).date()), ("22:00", "06:00"))
+
+    def test_clone_respects_schedule_filters(self):
+        response = self._clone(direction=Direction.CHATS)
+
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(Shift.objects.filter(start__gte=timezone.make_aware(datetime(2025, 3, 31))).get().agent,
+                         self.chats_agent)
+
+    def test_conflicting_copies_are_skipped_or_abort(self):
+        self._shift(self.calls_agent, datetime(2025, 4, 1, 12), hours=8)
+
+        response = self._clone(skip_conflicts="false")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["errors"]), [f"{self.calls_agent.pk}:2025-04-01T09:00"])
+        self.assertEqual(Shift.objects.count(), 4)
+
+        response = self._clone()
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(response.json()["skipped"][0]["date"], "2025-04-01")
+        self.assertEqual(Shift.objects.count(), 6)
+
+    def test_each_conflicting_copy_of_a_day_is_reported(self):
+        # Два діапазони одного дня (09:00–13:00, 14:00–18:00) і зайнятий день у цільовому тижні
+        self._shift(self.chats_agent, datetime(2025, 3, 27, 9), hours=4)
+        self._shift(self.chats_agent, datetime(2025, 3, 27, 14), hours=4)
+        self._shift(self.chats_agent, datetime(2025, 4, 3, 8), hours=11)
+
+        with self.assertRaisesMessage(CommandError, "2 copies conflict"):
+            call_command("clone_week", "2025-03-26", "--fail-on-conflict", stdout=StringIO(), stderr=StringIO())
+
+        response = self._clone(skip_conflicts="false")
+        self.assertEqual(
+            sorted(response.json()["errors"]),
+            [f"{self.chats_agent.pk}:2025-04-03T09:00", f"{self.chats_agent.pk}:2025-04-03T14:00"],
+        )
+
+    def test_command_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command("clone_week", "2025-03-26", "--weeks", "3", "--dry-run", stdout=out)
+
+        self.assertIn("would create 9, skipped 0", out.getvalue())
+        self.assertEqual(Shift.objects.count(), 3)
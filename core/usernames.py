@@ -0,0 +1,61 @@
+# core/usernames.py
+"""
+Розподіл унікальних username-ів для масового створення користувачів.
+
+Наявні імена читаються один раз; для кожного префікса (base) тримається
+максимальний використаний числовий суфікс `base_N`, тож наступне вільне ім'я
+видається за O(1) без повторних запитів і без перебору base_1, base_2, ...
+
+Модуль не залежить від Django (крім from_db), щоб converter.py міг
+використовувати той самий розподільник як окремий скрипт.
+"""
+import re
+from typing import Dict, Iterable, Set
+
+_SUFFIX_RE = re.compile(r"^(?P<base>.+)_(?P<n>[1-9][0-9]*)$")
+
+# Обмеження довжини поля django.contrib.auth.models.User.username
+USERNAME_MAX_LENGTH = 150
+
+
+class UsernameAllocator:
+    """Видає вільні username-и: base, далі base_<max+1>."""
+
+    def __init__(self, existing: Iterable[str] = (), max_length: int = USERNAME_MAX_LENGTH):
+        self.max_length = max_length
+        self.taken: Set[str] = set()
+        self._max_suffix: Dict[str, int] = {}
+        for username in existing:
+            self._remember(username)
+
+    @classmethod
+    def from_db(cls, max_length: int = USERNAME_MAX_LENGTH) -> "UsernameAllocator":
+        """Один запит на всю таблицю користувачів."""
+        from django.contrib.auth.models import User
+
+        return cls(User.objects.values_list("username", flat=True).iterator(chunk_size=5000), max_length)
+
+    def _remember(self, username: str) -> None:
+        self.taken.add(username)
+        match = _SUFFIX_RE.match(username)
+        if match:
+            base, number = match.group("base"), int(match.group("n"))
+            if number > self._max_suffix.get(base, 0):
+                self._max_suffix[base] = number
+
+    def allocate(self, base: str, fallback: str = "user") -> str:
+        base = (base or "").strip()[: self.max_length] or fallback
+        candidate = base
+        while candidate in self.taken:
+            number = self._max_suffix.get(base, 0) + 1
+            suffix = f"_{number}"
+            # Якщо base_N не влазить у max_length — обрізаємо base, лічильник ведемо для обрізаного
+            trimmed = base[: self.max_length - len(suffix)]
+            if trimmed != base:
+                base = trimmed
+                candidate = base
+                continue
+            candidate = f"{base}{suffix}"
+            self._max_suffix[base] = number
+        self._remember(candidate)
+        return candidate
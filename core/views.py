@@ -31,13 +31,39 @@ from .forms import (
     SickLeaveProofUploadForm,
 )
 from django.contrib import messages
-from .services import can_swap
+from .services import (
+    ShiftOverlapError,
+    can_swap,
+    decide_exchanges,
+    execute_chain,
+    find_exchange_cycles,
+    find_swap_candidates,
+    save_shift,
+)
+from .shift_mutations import (
+    MAX_BATCH_EDITS,
+    MAX_CLONE_WEEKS,
+    VALID_STATUSES,
+    ShiftBatchError,
+    ShiftMutationError,
+    apply_operations,
+    choice_or_default,
+    clone_week,
+    edit_shift,
+    edit_shifts,
+    new_shift_interval,
+    parse_day,
+    shift_payload,
+    user_can_add,
+    user_can_edit,
+    week_start,
+)
+from .schedule_cache import (
+    CACHE_VERSION_KEY,
+    invalidate_schedule_cache as _invalidate_schedule_cache,
+    invalidate_schedule_weeks,
+)
 
-NON_WORKING_STATUSES = {
-    ShiftStatus.VACATION,
-    ShiftStatus.SICK,
-    ShiftStatus.DAY_OFF,
-}
 DIRECTION_LABELS = dict(Direction.choices)
 STATUS_LABELS = dict(ShiftStatus.choices)
 VALID_DIRECTIONS = set(DIRECTION_LABELS.keys())
@@ -59,51 +85,6 @@ def _monday(dt):
     return dt - timedelta(days=dt.weekday())
 
 
-def _invalidate_schedule_cache(shift_date=None):
-    """Інвалідує кеш розкладу для конкретної дати або всіх дат.
-    
-    Використовує версійність кешу: зберігає версію для кожного тижня,
-    і збільшує її при інвалідації. Це автоматично інвалідує всі ключі
-    кешу для цього тижня без необхідності знати всі можливі комбінації фільтрів.
-    """
-    tz = timezone.get_current_timezone()
-    
-    if shift_date:
-        # Визначаємо тиждень, до якого належить дата
-        if isinstance(shift_date, datetime):
-            shift_date = shift_date.date()
-        elif hasattr(shift_date, 'date'):
-            shift_date = shift_date.date()
-        
-        # Створюємо datetime з timezone для правильного розрахунку понеділка
-        dt = datetime.combine(shift_date, datetime.min.time())
-        if timezone.is_naive(dt):
-            dt = timezone.make_aware(dt, tz)
-        week_start = _monday(dt)
-        week_key = week_start.date().isoformat()
-        
-        # Інвалідуємо кеш для поточного тижня та сусідніх (на випадок, якщо зміна перетинає тижні)
-        weeks_to_invalidate = set()
-        for week_offset in [-7, 0, 7]:
-            check_date = week_start.date() + timedelta(days=week_offset)
-            check_dt = datetime.combine(check_date, datetime.min.time())
-            if timezone.is_naive(check_dt):
-                check_dt = timezone.make_aware(check_dt, tz)
-            check_week = _monday(check_dt)
-            week_param = check_week.date().isoformat()
-            weeks_to_invalidate.add(week_param)
-        
-        # Інвалідуємо кеш для всіх залучених тижнів
-        for week_param in weeks_to_invalidate:
-            cache_version_key = f"schedule_cache_version:{week_param}"
-            current_version = cache.get(cache_version_key, 0)
-            # Збільшуємо версію - це автоматично інвалідує всі ключі кешу з цією версією
-            cache.set(cache_version_key, current_version + 1, timeout=86400 * 7)  # 7 днів
-    else:
-        # Інвалідуємо всі тижні - не підтримується напряму, тому просто очищаємо
-        # ключі версій для останніх кількох тижнів (на практиці це рідко потрібно)
-        pass
-
 def _weeks_of_year(year: int, tz):
     # Знаходимо перший понеділок року
     d = datetime(year, 1, 1, tzinfo=tz)
@@ -201,7 +182,7 @@ def schedule_week(request):
     week_key = week_start.date().isoformat()
     
     # Отримуємо версію кешу для цього тижня
-    cache_version_key = f"schedule_cache_version:{week_key}"
+    cache_version_key = CACHE_VERSION_KEY.format(week=week_key)
     cache_version = cache.get(cache_version_key, 0)
     
     cache_key = f"schedule_week:{week_key}:{filter_hash}:v{cache_version}"
@@ -415,6 +396,16 @@ def schedule_week(request):
     return response
 
 
+def _request_data(request):
+    """JSON або form-дані запиту; None — некоректний JSON."""
+    if request.content_type and "application/json" in request.content_type:
+        try:
+            return json.loads(request.body.decode("utf-8")) if request.body else {}
+        except json.JSONDecodeError:
+            return None
+    return request.POST
+
+
 @login_required
 def edit_shift_ajax(request, shift_id: int):
     """Supports fetching and updating shift details via AJAX."""
@@ -425,170 +416,172 @@ def edit_shift_ajax(request, shift_id: int):
     except Shift.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Shift not found"}, status=404)
 
-    user = request.user
-
-    def _user_can_edit() -> bool:
-        if user.is_superuser:
-            return True
-        if user.has_perm("core.change_shift"):
-            return True
-        if user.is_staff:
-            return True
-        agent = getattr(shift, "agent", None)
-        if agent and agent.team_lead_id and agent.team_lead_id == user.id:
-            return True
-        return False
-
     tz = timezone.get_current_timezone()
-    start_local = timezone.localtime(shift.start, tz)
-    end_local = timezone.localtime(shift.end, tz)
 
     if request.method == "GET":
         # Anyone who can view the schedule already knows about this shift.
         # Still, restrict to users allowed to edit to keep endpoint tight.
-        if not _user_can_edit():
+        if not user_can_edit(request.user, shift.agent):
             return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
-
-        payload = {
-            "ok": True,
-            "shift": {
-                "id": shift.id,
-                "status": shift.status,
-                "direction": shift.direction,
-                "start_time": start_local.strftime("%H:%M"),
-                "end_time": end_local.strftime("%H:%M"),
-                "comment": shift.comment or "",
-            },
-        }
-        return JsonResponse(payload)
+        return JsonResponse({"ok": True, "shift": shift_payload(shift, tz)})
 
     if request.method != "POST":
         return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
 
-    if not _user_can_edit():
+    if not user_can_edit(request.user, shift.agent):
         return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
-    # Parse data (JSON or form)
-    if request.content_type and "application/json" in request.content_type:
-        try:
-            data = json.loads(request.body.decode("utf-8")) if request.body else {}
-        except json.JSONDecodeError:
-            return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
-    else:
-        data = request.POST
-
-    updates = {}
-    status = data.get("status")
-    if status is not None and status != "":
-        valid_statuses = {k for k, _ in ShiftStatus.choices}
-        if status not in valid_statuses:
-            return JsonResponse({"ok": False, "error": "Invalid status"}, status=400)
-        updates["status"] = status
-
-    direction = data.get("direction")
-    if direction is not None and direction != "":
-        valid_dirs = {k for k, _ in Direction.choices}
-        if direction not in valid_dirs:
-            return JsonResponse({"ok": False, "error": "Invalid direction"}, status=400)
-        updates["direction"] = direction
-
-    if "comment" in data:
-        raw_comment = data.get("comment")
-        updates["comment"] = raw_comment if (raw_comment is None or isinstance(raw_comment, str)) else str(raw_comment)
-
-    start_time_str = data.get("start_time")
-    end_time_str = data.get("end_time")
-
-    def _parse_hm(hm: str):
-        try:
-            h, m = hm.split(":", 1)
-            return int(h), int(m)
-        except Exception:
-            return None
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
 
-    new_start_local = start_local
-    new_end_local = end_local
-    if start_time_str:
-        hm = _parse_hm(start_time_str)
-        if not hm or not (0 <= hm[0] < 24) or not (0 <= hm[1] < 60):
-            return JsonResponse({"ok": False, "error": "Invalid start_time"}, status=400)
-        new_start_local = start_local.replace(hour=hm[0], minute=hm[1], second=0, microsecond=0)
-    if end_time_str:
-        hm = _parse_hm(end_time_str)
-        # allow 24:00 only for end time
-        if not hm or not (0 <= hm[0] <= 24) or not (0 <= hm[1] < 60):
-            return JsonResponse({"ok": False, "error": "Invalid end_time"}, status=400)
-        if hm[0] == 24:
-            if hm[1] != 0:
-                return JsonResponse({"ok": False, "error": "Invalid end_time"}, status=400)
-            same_day_end = new_start_local.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-        else:
-            same_day_end = new_start_local.replace(hour=hm[0], minute=hm[1], second=0, microsecond=0)
-        if same_day_end <= new_start_local:
-            same_day_end = same_day_end + timedelta(days=1)
-        new_end_local = same_day_end
-
-    if (start_time_str or end_time_str) and not (new_start_local < new_end_local):
-        return JsonResponse({"ok": False, "error": "Start must be before end"}, status=400)
-
-    if start_time_str or end_time_str:
-        updates["start"] = new_start_local
-        updates["end"] = new_end_local
-
-        # Prevent overlap with other shifts of the same agent
-        overlap_qs = (
-            Shift.objects.filter(
-                agent_id=shift.agent_id,
-                start__lt=new_end_local,
-                end__gt=new_start_local,
-            )
-            .exclude(pk=shift.pk)
-        )
-        if overlap_qs.exists():
-            # Provide readable conflicting interval
-            tz = timezone.get_current_timezone()
-            conflict = overlap_qs.order_by("start").first()
-            c_start = timezone.localtime(conflict.start, tz)
-            c_end = timezone.localtime(conflict.end, tz)
-            return JsonResponse(
-                {
-                    "ok": False,
-                    "error": f"Перетин із існуючою зміною: {c_start:%d.%m %H:%M}–{c_end:%H:%M}",
-                },
-                status=400,
-            )
+    # Перетин з іншими змінами агента відсікає БД (shift_no_overlap); кеш інвалідує сервіс
+    try:
+        updated = edit_shift(shift, data, request.user, tz)
+    except ShiftBatchError as exc:
+        error = exc.errors[shift.pk]
+        return JsonResponse({"ok": False, "error": error.message}, status=error.status)
 
-    if not updates:
+    if not updated:
         return JsonResponse({"ok": True, "updated": False})
+    return JsonResponse({"ok": True, "updated": True, "shift": shift_payload(shift, tz)})
+
+
+@login_required
+def batch_edit_shifts_ajax(request):
+    """Apply several shift edits at once (multi-cell drag in the week grid).
+
+    POST JSON: {"edits": [{"id": <shift id>, "date": "YYYY-MM-DD", "agent_id": ...,
+    "start_time": "HH:MM", "end_time": "HH:MM", "status": ..., "direction": ..., "comment": ...}, ...]}
+    Every field except id is optional and has the same meaning as in edit_shift_ajax.
+    All edits are applied or none: on failure the response maps shift id -> error.
+    """
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
+
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
+    raw_edits = data.get("edits") if isinstance(data, dict) else None
+    if not isinstance(raw_edits, list) or not raw_edits:
+        return JsonResponse({"ok": False, "error": "edits is required"}, status=400)
+    if len(raw_edits) > MAX_BATCH_EDITS:
+        return JsonResponse({"ok": False, "error": f"At most {MAX_BATCH_EDITS} edits per request"}, status=400)
+
+    edits = []
+    for item in raw_edits:
+        try:
+            edits.append((int(item["id"]), item))
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({"ok": False, "error": "Each edit needs an integer id"}, status=400)
 
     tz = timezone.get_current_timezone()
-    shift_date = timezone.localtime(shift.start, tz).date()
-    
-    with transaction.atomic():
-        for field, value in updates.items():
-            setattr(shift, field, value)
-        shift.save(update_fields=list(updates.keys()))
-        
-        # Інвалідуємо кеш розкладу для тижня, до якого належить зміна
-        _invalidate_schedule_cache(shift_date)
+    try:
+        changed = edit_shifts(edits, request.user, tz)
+    except ShiftBatchError as exc:
+        return JsonResponse({"ok": False, "errors": exc.as_dict()}, status=exc.status)
 
-    refreshed_shift = Shift.objects.select_related("agent").get(pk=shift.pk)
-    start_local = timezone.localtime(refreshed_shift.start, tz)
-    end_local = timezone.localtime(refreshed_shift.end, tz)
-    response_payload = {
-        "ok": True,
-        "updated": True,
-        "shift": {
-            "id": refreshed_shift.id,
-            "status": refreshed_shift.status,
-            "direction": refreshed_shift.direction,
-            "start_time": start_local.strftime("%H:%M"),
-            "end_time": end_local.strftime("%H:%M"),
-            "comment": refreshed_shift.comment or "",
-        },
-    }
+    return JsonResponse({"ok": True, "shifts": [shift_payload(shift, tz) for shift in changed]})
+
+
+@login_required
+def bulk_shifts_ajax(request):
+    """Apply a batch of create/update/delete operations from the week grid in one transaction.
+
+    POST JSON: {"ops": [
+        {"op": "create", "agent_id": ..., "date": "YYYY-MM-DD", "start_time": "HH:MM", "end_time": "HH:MM",
+         "status": ..., "direction": ..., "comment": ...},
+        {"op": "update", "id": ..., <fields as in batch_edit_shifts_ajax>},
+        {"op": "delete", "id": ...},
+    ]}
+    Returns one result per operation, in order: the patched cell for create/update, the id for delete.
+    All operations are applied or none: on failure the response maps operation index -> error.
+    """
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
+
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
+    ops = data.get("ops") if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops or not all(isinstance(op, dict) for op in ops):
+        return JsonResponse({"ok": False, "error": "ops is required"}, status=400)
+    if len(ops) > MAX_BATCH_EDITS:
+        return JsonResponse({"ok": False, "error": f"At most {MAX_BATCH_EDITS} operations per request"}, status=400)
+
+    tz = timezone.get_current_timezone()
+    try:
+        applied = apply_operations(ops, request.user, tz)
+    except ShiftBatchError as exc:
+        return JsonResponse({"ok": False, "errors": exc.as_dict()}, status=exc.status)
+
+    results = [
+        {"op": kind, "id": shift.pk} if kind == "delete" else {"op": kind, "shift": shift_payload(shift, tz)}
+        for kind, shift in applied
+    ]
+    return JsonResponse({"ok": True, "results": results})
+
+
+@login_required
+def clone_week_ajax(request):
+    """Copy the shifts of one week to the following weeks.
 
-    return JsonResponse(response_payload)
+    POST JSON/form fields:
+      - week: 'YYYY-MM-DD', any date inside the source week
+      - weeks: number of following weeks to fill (1..MAX_CLONE_WEEKS), default 1
+      - team_lead / agent / direction / status: optional, same as the schedule filters
+      - skip_conflicts: optional, default true; false aborts if any copy conflicts
+
+    Team leads without core.add_shift can only clone shifts of their own agents.
+    """
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
+
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
+
+    user = request.user
+    shifts = Shift.objects.all()
+    if not (user.is_superuser or user.is_staff or user.has_perm("core.add_shift")):
+        if not Agent.objects.filter(team_lead=user).exists():
+            return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
+        shifts = shifts.filter(agent__team_lead=user)
+
+    try:
+        source = parse_day(data.get("week"))
+        weeks = int(data.get("weeks") or 1)
+    except (ShiftMutationError, TypeError, ValueError):
+        return JsonResponse({"ok": False, "error": "week and weeks are required"}, status=400)
+    if not 1 <= weeks <= MAX_CLONE_WEEKS:
+        return JsonResponse({"ok": False, "error": f"weeks must be between 1 and {MAX_CLONE_WEEKS}"}, status=400)
+
+    filter_params = {key: data.get(key) for key in ("team_lead", "agent", "direction", "status") if data.get(key)}
+    shift_filter = ShiftFilter(filter_params, queryset=shifts)
+    if not shift_filter.is_valid():
+        return JsonResponse({"ok": False, "error": "Invalid filter"}, status=400)
+
+    skip_conflicts = str(data.get("skip_conflicts", "true")).lower() not in ("0", "false", "no")
+    first = week_start(source) + timedelta(days=7)
+    tz = timezone.get_current_timezone()
+    try:
+        result = clone_week(
+            source,
+            [first + timedelta(days=7 * offset) for offset in range(weeks)],
+            shifts=shift_filter.qs,
+            user=user,
+            tz=tz,
+            skip_conflicts=skip_conflicts,
+        )
+    except ShiftBatchError as exc:
+        return JsonResponse({"ok": False, "errors": exc.as_dict()}, status=exc.status)
+
+    return JsonResponse({
+        "ok": True,
+        "weeks": [week.isoformat() for week in result.weeks],
+        "created": len(result.created),
+        "skipped": [shift_payload(clone, tz) for clone, _other in result.skipped],
+    })
 
 
 @login_required
@@ -606,19 +599,7 @@ def delete_shift_ajax(request, shift_id: int):
     except Shift.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Shift not found"}, status=404)
 
-    user = request.user
-
-    def _user_can_edit() -> bool:
-        if user.is_superuser or user.is_staff:
-            return True
-        if user.has_perm("core.change_shift"):
-            return True
-        agent = getattr(shift, "agent", None)
-        if agent and agent.team_lead_id and agent.team_lead_id == user.id:
-            return True
-        return False
-
-    if not _user_can_edit():
+    if not user_can_edit(request.user, shift.agent):
         return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
     tz = timezone.get_current_timezone()
@@ -633,6 +614,20 @@ def delete_shift_ajax(request, shift_id: int):
     return JsonResponse({"ok": True, "deleted": True})
 
 
+def _create_shift_response(new_shift: Shift, tz):
+    try:
+        with transaction.atomic():
+            # Перетин з іншими змінами агента відсікає БД (shift_no_overlap)
+            save_shift(new_shift)
+
+            # Інвалідуємо кеш розкладу для тижня, до якого належить зміна
+            _invalidate_schedule_cache(timezone.localtime(new_shift.start, tz).date())
+    except ShiftOverlapError as exc:
+        return JsonResponse({"ok": False, "error": exc.message(tz)}, status=400)
+
+    return JsonResponse({"ok": True, "created": True, "id": new_shift.id, "shift": shift_payload(new_shift, tz)})
+
+
 @login_required
 def add_shift_hours_ajax(request, shift_id: int):
     """Create an additional shift for the same agent/day as the base shift.
@@ -653,110 +648,28 @@ def add_shift_hours_ajax(request, shift_id: int):
     except Shift.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Shift not found"}, status=404)
 
-    user = request.user
-    allowed = user.is_superuser or user.is_staff or (
-        base.agent and base.agent.team_lead_id == user.id
-    ) or user.has_perm("core.add_shift")
-    if not allowed:
+    if not user_can_add(request.user, base.agent):
         return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
-    if request.content_type and "application/json" in request.content_type:
-        try:
-            data = json.loads(request.body.decode("utf-8")) if request.body else {}
-        except json.JSONDecodeError:
-            return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
-    else:
-        data = request.POST
-
-    def _parse_hm(hm: str):
-        try:
-            h, m = hm.split(":", 1)
-            return int(h), int(m)
-        except Exception:
-            return None
-
-    start_time_str = data.get("start_time")
-    end_time_str = data.get("end_time")
-    if not start_time_str or not end_time_str:
-        return JsonResponse({"ok": False, "error": "Missing time"}, status=400)
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
 
     tz = timezone.get_current_timezone()
-    base_start_local = timezone.localtime(base.start, tz)
-    base_day = base_start_local.date()
-
-    start_hm = _parse_hm(start_time_str)
-    if not start_hm or not (0 <= start_hm[0] < 24) or not (0 <= start_hm[1] < 60):
-        return JsonResponse({"ok": False, "error": "Invalid start_time"}, status=400)
-
-    end_hm = _parse_hm(end_time_str)
-    if not end_hm or not (0 <= end_hm[0] <= 24) or not (0 <= end_hm[1] < 60):
-        return JsonResponse({"ok": False, "error": "Invalid end_time"}, status=400)
-    if end_hm[0] == 24 and end_hm[1] != 0:
-        return JsonResponse({"ok": False, "error": "Invalid end_time"}, status=400)
-
-    # Build aware datetimes
-    start_dt = timezone.make_aware(
-        datetime.combine(base_day, time(start_hm[0], start_hm[1])), tz
-    )
-    if end_hm[0] == 24:
-        end_dt = timezone.make_aware(
-            datetime.combine(base_day, time(0, 0)), tz
-        ) + timedelta(days=1)
-    else:
-        end_dt = timezone.make_aware(
-            datetime.combine(base_day, time(end_hm[0], end_hm[1])), tz
-        )
-    if end_dt <= start_dt:
-        end_dt = end_dt + timedelta(days=1)
-
-    # Prevent overlap with other shifts of the same agent
-    overlap_qs = Shift.objects.filter(
-        agent_id=base.agent_id,
-        start__lt=end_dt,
-        end__gt=start_dt,
+    try:
+        start_dt, end_dt = new_shift_interval(data, timezone.localtime(base.start, tz).date(), tz)
+    except ShiftMutationError as exc:
+        return JsonResponse({"ok": False, "error": exc.message}, status=exc.status)
+
+    new_shift = Shift(
+        agent=base.agent,
+        start=start_dt,
+        end=end_dt,
+        direction=choice_or_default(data.get("direction"), VALID_DIRECTIONS, base.direction),
+        status=choice_or_default(data.get("status"), VALID_STATUSES, ShiftStatus.WORK),
+        comment=data.get("comment"),
     )
-    if overlap_qs.exists():
-        tz = timezone.get_current_timezone()
-        conflict = overlap_qs.order_by("start").first()
-        c_start = timezone.localtime(conflict.start, tz)
-        c_end = timezone.localtime(conflict.end, tz)
-        return JsonResponse(
-            {
-                "ok": False,
-                "error": f"Перетин із існуючою зміною: {c_start:%d.%m %H:%M}–{c_end:%H:%M}",
-            },
-            status=400,
-        )
-
-    status = data.get("status") or ShiftStatus.WORK
-    valid_statuses = {k for k, _ in ShiftStatus.choices}
-    if status not in valid_statuses:
-        status = ShiftStatus.WORK
-
-    direction = data.get("direction") or base.direction
-    valid_dirs = {k for k, _ in Direction.choices}
-    if direction not in valid_dirs:
-        direction = base.direction
-
-    comment = data.get("comment")
-
-    tz = timezone.get_current_timezone()
-    shift_date = timezone.localtime(start_dt, tz).date()
-    
-    with transaction.atomic():
-        new_shift = Shift.objects.create(
-            agent=base.agent,
-            start=start_dt,
-            end=end_dt,
-            direction=direction,
-            status=status,
-            comment=comment,
-        )
-        
-        # Інвалідуємо кеш розкладу для тижня, до якого належить зміна
-        _invalidate_schedule_cache(shift_date)
-
-    return JsonResponse({"ok": True, "created": True, "id": new_shift.id})
+    return _create_shift_response(new_shift, tz)
 
 
 @login_required
@@ -775,14 +688,9 @@ def create_shift_ajax(request):
     if request.method != "POST":
         return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
 
-    # Parse input
-    if request.content_type and "application/json" in request.content_type:
-        try:
-            data = json.loads(request.body.decode("utf-8")) if request.body else {}
-        except json.JSONDecodeError:
-            return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
-    else:
-        data = request.POST
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
 
     try:
         agent_id = int(data.get("agent_id"))
@@ -794,95 +702,28 @@ def create_shift_ajax(request):
     except Agent.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Agent not found"}, status=404)
 
-    user = request.user
-    allowed = user.is_superuser or user.is_staff or user.has_perm("core.add_shift") or (
-        agent.team_lead_id == user.id if agent.team_lead_id else False
-    )
-    if not allowed:
+    if not user_can_add(request.user, agent):
         return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
     date_str = data.get("date")
     if not date_str:
         return JsonResponse({"ok": False, "error": "date is required"}, status=400)
-    try:
-        base_date = datetime.fromisoformat(date_str).date()
-    except Exception:
-        return JsonResponse({"ok": False, "error": "Invalid date"}, status=400)
-
-    def _parse_hm(hm: str):
-        try:
-            h, m = hm.split(":", 1)
-            return int(h), int(m)
-        except Exception:
-            return None
-
-    start_time_str = data.get("start_time")
-    end_time_str = data.get("end_time")
-    if not start_time_str or not end_time_str:
-        return JsonResponse({"ok": False, "error": "Missing time"}, status=400)
-
-    start_hm = _parse_hm(start_time_str)
-    end_hm = _parse_hm(end_time_str)
-    if not start_hm or not (0 <= start_hm[0] < 24) or not (0 <= start_hm[1] < 60):
-        return JsonResponse({"ok": False, "error": "Invalid start_time"}, status=400)
-    if not end_hm or not (0 <= end_hm[0] <= 24) or not (0 <= end_hm[1] < 60):
-        return JsonResponse({"ok": False, "error": "Invalid end_time"}, status=400)
-    if end_hm[0] == 24 and end_hm[1] != 0:
-        return JsonResponse({"ok": False, "error": "Invalid end_time"}, status=400)
 
     tz = timezone.get_current_timezone()
-    start_dt = timezone.make_aware(datetime.combine(base_date, time(start_hm[0], start_hm[1])), tz)
-    if end_hm[0] == 24:
-        end_dt = timezone.make_aware(datetime.combine(base_date, time(0, 0)), tz) + timedelta(days=1)
-    else:
-        end_dt = timezone.make_aware(datetime.combine(base_date, time(end_hm[0], end_hm[1])), tz)
-    if end_dt <= start_dt:
-        end_dt = end_dt + timedelta(days=1)
-
-    # Overlap protection
-    overlap_qs = Shift.objects.filter(
-        agent_id=agent.id,
-        start__lt=end_dt,
-        end__gt=start_dt,
+    try:
+        start_dt, end_dt = new_shift_interval(data, parse_day(date_str), tz)
+    except ShiftMutationError as exc:
+        return JsonResponse({"ok": False, "error": exc.message}, status=exc.status)
+
+    new_shift = Shift(
+        agent=agent,
+        start=start_dt,
+        end=end_dt,
+        direction=choice_or_default(data.get("direction"), VALID_DIRECTIONS, Direction.CALLS),
+        status=choice_or_default(data.get("status"), VALID_STATUSES, ShiftStatus.WORK),
+        comment=data.get("comment"),
     )
-    if overlap_qs.exists():
-        conflict = overlap_qs.order_by("start").first()
-        c_start = timezone.localtime(conflict.start, tz)
-        c_end = timezone.localtime(conflict.end, tz)
-        return JsonResponse(
-            {"ok": False, "error": f"Перетин із існуючою зміною: {c_start:%d.%m %H:%M}–{c_end:%H:%M}"},
-            status=400,
-        )
-
-    status = data.get("status") or ShiftStatus.WORK
-    valid_statuses = {k for k, _ in ShiftStatus.choices}
-    if status not in valid_statuses:
-        status = ShiftStatus.WORK
-
-    direction = data.get("direction") or Direction.CALLS
-    valid_dirs = {k for k, _ in Direction.choices}
-    if direction not in valid_dirs:
-        direction = Direction.CALLS
-
-    comment = data.get("comment")
-
-    tz = timezone.get_current_timezone()
-    shift_date = timezone.localtime(start_dt, tz).date()
-    
-    with transaction.atomic():
-        new_shift = Shift.objects.create(
-            agent=agent,
-            start=start_dt,
-            end=end_dt,
-            direction=direction,
-            status=status,
-            comment=comment,
-        )
-        
-        # Інвалідуємо кеш розкладу для тижня, до якого належить зміна
-        _invalidate_schedule_cache(shift_date)
-
-    return JsonResponse({"ok": True, "created": True, "id": new_shift.id})
+    return _create_shift_response(new_shift, tz)
 
 
 def _prepare_agent_entries(shifts_qs, tz, window=None):
@@ -970,9 +811,9 @@ def dashboard(request):
         window_direction_filter = current_direction_filter
 
     current_base_qs = (
-        Shift.objects.select_related("agent", "agent__user")
-        .filter(start__lte=now, end__gt=now)
-        .exclude(status__in=NON_WORKING_STATUSES)
+        Shift.objects.working()
+        .active_at(now)
+        .select_related("agent", "agent__user")
         .order_by("agent__user__last_name", "agent__user__first_name", "start")
     )
     current_direction_counts = _direction_counts(current_base_qs)
@@ -1007,9 +848,9 @@ def dashboard(request):
         )
 
         window_base_qs = (
-            Shift.objects.select_related("agent", "agent__user")
-            .filter(start__lt=window_end, end__gt=window_start)
-            .exclude(status__in=NON_WORKING_STATUSES)
+            Shift.objects.working()
+            .overlapping(window_start, window_end)
+            .select_related("agent", "agent__user")
             .order_by("agent__user__last_name", "agent__user__first_name", "start")
         )
 
@@ -1152,8 +993,7 @@ def request_sick_leave(request):
             
             # Інвалідуємо кеш розкладу після завершення транзакції
             # для всіх залучених дат
-            for date in affected_dates:
-                _invalidate_schedule_cache(date)
+            invalidate_schedule_weeks(affected_dates)
             
             if attach_later:
                 messages.warning(
@@ -1247,37 +1087,133 @@ def exchange_create(request):
             messages.error(request, msg)
         else:
             comment = form.cleaned_data.get("comment", "")
-            agent_a_before = sh1.agent
-            agent_b_before = sh2.agent
-            shift_a_label = _format_shift_label(sh1, agent_a_before)
-            shift_b_label = _format_shift_label(sh2, agent_b_before)
+            shift_a_label = _format_shift_label(sh1, sh1.agent)
+            shift_b_label = _format_shift_label(sh2, sh2.agent)
             try:
                 with transaction.atomic():
-                    ShiftExchange.objects.create(
+                    exchange = ShiftExchange.objects.create(
                         from_shift=sh1,
                         to_shift=sh2,
                         requested_by=request.user,
                         comment=comment,
-                        approved=True,
                     )
-                    sh1.agent, sh2.agent = agent_b_before, agent_a_before
-                    sh1.save(update_fields=["agent"])
-                    sh2.save(update_fields=["agent"])
+                    # Той, хто сам може погоджувати, не чекає на чергу
+                    decision = None
+                    if request.user.has_perm("core.approve_exchange"):
+                        decision = decide_exchanges([exchange.pk], request.user, approve=True)
+                        if decision.failed:
+                            # Невдале автопогодження не лишає запиту в черзі
+                            transaction.set_rollback(True)
             except Exception as exc:
                 messages.error(
                     request,
                     f"Не вдалося виконати обмін. Помилка: {exc}",
                 )
             else:
-                messages.success(
-                    request,
-                    f"Обмін виконано: {shift_a_label} ⇄ {shift_b_label}.",
-                )
+                if decision is None:
+                    messages.success(
+                        request,
+                        f"Запит на обмін створено й передано на погодження: {shift_a_label} ⇄ {shift_b_label}.",
+                    )
+                elif decision.failed:
+                    messages.error(request, decision.failed[0][1])
+                else:
+                    messages.success(
+                        request,
+                        f"Обмін виконано: {shift_a_label} ⇄ {shift_b_label}.",
+                    )
                 form = ExchangeCreateForm(request.user)
 
     return render(request, "exchange_form.html", {"form": form})
 
 
+@login_required
+@permission_required("core.approve_exchange", raise_exception=True)
+def exchange_queue(request):
+    """Черга запитів на обмін, що очікують рішення, з масовим погодженням/відхиленням."""
+    pending_qs = (
+        ShiftExchange.objects.filter(approved__isnull=True)
+        .select_related(
+            "from_shift__agent__user",
+            "to_shift__agent__user",
+            "requested_by",
+        )
+        .order_by("created_at")
+    )
+    user = request.user
+    if not (user.is_superuser or user.is_staff):
+        # Тімлід бачить лише обміни, де бере участь хоча б один агент його команди
+        pending_qs = pending_qs.filter(
+            Q(from_shift__agent__team_lead=user) | Q(to_shift__agent__team_lead=user)
+        )
+
+    if request.method == "POST":
+        action = request.POST.get("action")
+        raw_ids = request.POST.getlist("exchange_ids")
+        try:
+            requested_ids = {int(value) for value in raw_ids}
+        except ValueError:
+            requested_ids = set()
+        allowed = list(pending_qs.filter(pk__in=requested_ids).values_list("pk", "from_shift_id", "to_shift_id"))
+        allowed_ids = [pk for pk, _from_id, _to_id in allowed]
+
+        if action == "chain":
+            try:
+                chain_ids = [int(value) for value in request.POST.get("chain", "").split(",") if value]
+            except ValueError:
+                chain_ids = []
+            # Кожен крок ланцюжка (зміна i -> зміна i+1) мусить бути доступним користувачу запитом
+            allowed_hops = {(from_id, to_id) for _pk, from_id, to_id in allowed}
+            chain_hops = {
+                (chain_ids[idx], chain_ids[(idx + 1) % len(chain_ids)]) for idx in range(len(chain_ids))
+            }
+            if len(chain_ids) < 2 or len(set(chain_ids)) != len(chain_ids):
+                messages.warning(request, "Не обрано ланцюжок обмінів.")
+            elif not chain_hops <= allowed_hops:
+                messages.error(request, "Ланцюговий обмін не виконано: не для всіх кроків є запит на обмін.")
+            else:
+                ok, msg = execute_chain(chain_ids, user, exchange_ids=allowed_ids, require_requests=True)
+                if ok:
+                    messages.success(request, f"Ланцюговий обмін виконано: {len(chain_ids)} змін.")
+                else:
+                    messages.error(request, f"Ланцюговий обмін не виконано: {msg}")
+        elif action not in {"approve", "reject"}:
+            messages.error(request, "Невідома дія.")
+        elif not allowed_ids:
+            messages.warning(request, "Не обрано жодного запиту на обмін.")
+        else:
+            decision = decide_exchanges(allowed_ids, user, approve=(action == "approve"))
+            if decision.approved:
+                messages.success(request, f"Погоджено обмінів: {len(decision.approved)}.")
+            if decision.rejected:
+                messages.info(request, f"Відхилено обмінів: {len(decision.rejected)}.")
+            for exchange, reason in decision.failed:
+                messages.error(request, f"Обмін #{exchange.pk} не виконано: {reason}")
+        return redirect("exchange_queue")
+
+    tz = timezone.get_current_timezone()
+    pending = list(pending_qs)
+    rows = []
+    for exchange in pending:
+        rows.append({
+            "exchange": exchange,
+            "from_label": _format_shift_label(exchange.from_shift, exchange.from_shift.agent),
+            "to_label": _format_shift_label(exchange.to_shift, exchange.to_shift.agent),
+            "created_at": timezone.localtime(exchange.created_at, tz),
+        })
+
+    # Запити, що разом утворюють цикл (A→B→C→A), можна виконати одним ланцюговим обміном
+    cycles = []
+    for cycle in find_exchange_cycles(pending):
+        cycles.append({
+            "chain": ",".join(str(sh.pk) for sh in cycle.shifts),
+            "exchange_ids": [ex.pk for ex in cycle.exchanges],
+            "labels": [_format_shift_label(sh, sh.agent) for sh in cycle.shifts],
+        })
+
+    return render(request, "exchange_queue.html", {"rows": rows, "cycles": cycles})
+
+
 @login_required
 def tools(request):
     form = ToolsHoursForm(request.GET or None, user=request.user)
@@ -1473,3 +1409,32 @@ def get_agent_shifts_for_month(request):
             error_message = "Внутрішня помилка сервера при отриманні змін."
 
     return JsonResponse({"shifts": shifts_data, "error": error_message})
+
+
+@login_required
+def get_exchange_candidates(request):
+    """Повертає зміни інших агентів, з якими можна обміняти обрану зміну."""
+    shift_id = request.GET.get("shift_id")
+    candidates = []
+    error_message = None
+
+    if not shift_id:
+        error_message = "Не надано ID зміни."
+    else:
+        try:
+            shift = Shift.objects.select_related("agent").get(pk=int(shift_id))
+        except (Shift.DoesNotExist, ValueError):
+            error_message = f"Зміну з ID {shift_id} не знайдено."
+        else:
+            tz = timezone.get_current_timezone()
+            for candidate in find_swap_candidates(shift, request.user):
+                start_local = timezone.localtime(candidate.start, tz)
+                end_local = timezone.localtime(candidate.end, tz)
+                candidates.append({
+                    "id": candidate.id,
+                    "agent_id": candidate.agent_id,
+                    "agent": str(candidate.agent),
+                    "text": f"{start_local:%d.%m %H:%M}–{end_local:%H:%M} · {candidate.get_direction_display()}",
+                })
+
+    return JsonResponse({"candidates": candidates, "error": error_message})